@@ -1,3 +1,5 @@
+import imagecodecs
+import numpy as np
 import pytest
 import requests
 import shutil
@@ -43,3 +45,95 @@ def raw_path(tmp_path_factory):
     _download_and_extract_asset(tmp_dir_path, 'https://github.com/BodenmillerGroup/TestData/releases/download/v1.0.1/210308_ImcTestData_raw.tar.gz')
     yield tmp_dir_path / 'datasets' / '210308_ImcTestData' / 'raw'
     shutil.rmtree(tmp_dir_path)
+
+
+_MCD_CHANNELS = [('Ag107', 'Ag(107)', '107Ag'), ('Pr141', 'Pr(141)', 'CD45'), ('Ir191', 'Ir(191)', 'DNA1')]
+
+
+def _create_mcd(name: str, n_acquisitions: int):
+    """Raw data and XML metadata of a small synthetic MCD file"""
+    rng = np.random.default_rng(0)
+    data = bytearray(b'\x00' * 161)
+    panorama = imagecodecs.png_encode(rng.integers(0, 255, size=(10, 10, 3), dtype=np.uint8))
+    data += panorama
+    xml = [
+        f'<Slide><ID>0</ID><UID>0</UID><Description>Slide</Description><Filename>{name}.mcd</Filename>'
+        '<SlideType>Glass</SlideType><WidthUm>75000</WidthUm><HeightUm>25000</HeightUm>'
+        '<ImageStartOffset>0</ImageStartOffset><ImageEndOffset>0</ImageEndOffset><ImageFile></ImageFile>'
+        '<SwVersion>7.0</SwVersion></Slide>',
+        '<Panorama><ID>1</ID><SlideID>0</SlideID><Description>Panorama</Description>'
+        '<SlideX1PosUm>0</SlideX1PosUm><SlideY1PosUm>1000</SlideY1PosUm><SlideX2PosUm>1000</SlideX2PosUm>'
+        '<SlideY2PosUm>1000</SlideY2PosUm><SlideX3PosUm>1000</SlideX3PosUm><SlideY3PosUm>0</SlideY3PosUm>'
+        '<SlideX4PosUm>0</SlideX4PosUm><SlideY4PosUm>0</SlideY4PosUm>'
+        f'<ImageStartOffset>0</ImageStartOffset><ImageEndOffset>{len(data)}</ImageEndOffset>'
+        '<PixelWidth>10</PixelWidth><PixelHeight>10</PixelHeight><ImageFormat>PNG</ImageFormat>'
+        '<Type>Imported</Type><RotationAngle>0</RotationAngle></Panorama>',
+    ]
+    images = dict()
+    channel_id = 0
+    for acquisition_id in range(1, n_acquisitions + 1):
+        width, height = 10 + 5 * acquisition_id, 8 + 3 * acquisition_id
+        img = rng.poisson(5, size=(len(_MCD_CHANNELS), height, width)).astype(np.float32)
+        images[acquisition_id] = img
+        ys, xs = np.divmod(np.arange(width * height), width)
+        rows = np.column_stack([xs, ys, np.zeros(width * height), img.reshape(len(_MCD_CHANNELS), -1).T])
+        start = len(data)
+        data += rows.astype(np.float32).tobytes()
+        xml.append(
+            f'<AcquisitionROI><ID>{acquisition_id}</ID><PanoramaID>1</PanoramaID><ROIType>0</ROIType>'
+            '</AcquisitionROI>'
+        )
+        xml.append(
+            f'<Acquisition><ID>{acquisition_id}</ID><Description>ROI_{acquisition_id}</Description>'
+            '<AblationPower>0</AblationPower><AblationDistanceBetweenShotsX>1</AblationDistanceBetweenShotsX>'
+            '<AblationDistanceBetweenShotsY>1</AblationDistanceBetweenShotsY><AblationFrequency>200</AblationFrequency>'
+            f'<AcquisitionROIID>{acquisition_id}</AcquisitionROIID><OrderNumber>{acquisition_id}</OrderNumber>'
+            '<SignalType>Dual</SignalType><DualCountStart>0</DualCountStart>'
+            f'<DataStartOffset>{start}</DataStartOffset><DataEndOffset>{len(data) - 1}</DataEndOffset>'
+            f'<StartTimeStamp>2021-03-05T10:0{acquisition_id}:00.000+01:00</StartTimeStamp>'
+            f'<EndTimeStamp>2021-03-05T10:1{acquisition_id}:00.000+01:00</EndTimeStamp>'
+            '<AfterAblationImageStartOffset>0</AfterAblationImageStartOffset>'
+            '<AfterAblationImageEndOffset>0</AfterAblationImageEndOffset>'
+            '<BeforeAblationImageStartOffset>0</BeforeAblationImageStartOffset>'
+            '<BeforeAblationImageEndOffset>0</BeforeAblationImageEndOffset>'
+            f'<ROIStartXPosUm>{100000 * acquisition_id}</ROIStartXPosUm><ROIStartYPosUm>200000</ROIStartYPosUm>'
+            f'<ROIEndXPosUm>{100 * acquisition_id + width}</ROIEndXPosUm><ROIEndYPosUm>{200 - height}</ROIEndYPosUm>'
+            '<MovementType>XRaster</MovementType><SegmentDataFormat>Float</SegmentDataFormat>'
+            f'<ValueBytes>4</ValueBytes><MaxY>{height}</MaxY><MaxX>{width}</MaxX>'
+            '<PlumeStart>0</PlumeStart><PlumeEnd>0</PlumeEnd><Template></Template></Acquisition>'
+        )
+        channels = [('X', 'X', 'X'), ('Y', 'Y', 'Y'), ('Z', 'Z', 'Z')] + _MCD_CHANNELS
+        for order_number, (_, channel_name, label) in enumerate(channels):
+            xml.append(
+                f'<AcquisitionChannel><ID>{channel_id}</ID><ChannelName>{channel_name}</ChannelName>'
+                f'<OrderNumber>{order_number}</OrderNumber><AcquisitionID>{acquisition_id}</AcquisitionID>'
+                f'<ChannelLabel>{label}</ChannelLabel></AcquisitionChannel>'
+            )
+            channel_id += 1
+    xml = '<MCDSchema xmlns="http://www.fluidigm.com/IMC/MCDSchema_V2_0.xsd">' + ''.join(xml) + '</MCDSchema>'
+    return bytes(data), xml.encode('utf-16-le'), images
+
+
+@pytest.fixture
+def write_mcd():
+    """Writes a small synthetic MCD file and returns its acquisition images (channel, y, x) by acquisition ID.
+
+    Rewriting an existing file with more acquisitions only appends the new acquisition data and rewrites the trailing
+    XML metadata, like the acquisition software does while acquiring.
+    """
+
+    def write(path: Path, n_acquisitions: int = 2):
+        data, xml, images = _create_mcd(path.stem, n_acquisitions)
+        content = data + xml
+        if path.exists():
+            with open(path, 'r+b') as f:
+                old_content = f.read()
+                start = next((i for i, (a, b) in enumerate(zip(old_content, content)) if a != b), len(old_content))
+                f.seek(start)
+                f.write(content[start:])
+                f.truncate()
+        else:
+            path.write_bytes(content)
+        return images
+
+    return write
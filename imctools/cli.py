@@ -4,14 +4,25 @@ import argparse
 
 from imctools.converters import (
     export_acquisition_csv,
+    follow_mcdfile_to_imcfolder,
+    imcfolders_to_previews,
+    mcdfolder_to_analysisfolder,
+    mcdfiles_to_imcfolders,
     mcdfolder_to_imcfolder,
+    merge_imcfolder_shards,
     omefile_2_analysisfolder,
     omefile_to_histocatfolder,
     omefile_to_tifffolder,
     omefolder_to_histocatfolder,
     v1_to_v2,
+    watch_inbox_to_imcfolders,
 )
 from imctools.converters.exportacquisitioncsv import AC_META
+from imctools.io.cache import AcquisitionCache
+from imctools.io.imc.catalog import Catalog
+from imctools.io.thumbnails import DEFAULT_THUMBNAIL_SIZE, ThumbnailSettings
+from imctools.io.tileserver import TileCache, TileServer
+from imctools.io.utils import parse_timestamp
 
 
 def main():
@@ -21,12 +32,20 @@ def main():
     subparsers = parser.add_subparsers(help="Sub-command help.")
 
     _add_mcdfolder2imcfolder_parser(subparsers)
+    _add_mcdfiles2imcfolders_parser(subparsers)
+    _add_merge_shards_parser(subparsers)
+    _add_watch_mcd_parser(subparsers)
+    _add_watch_parser(subparsers)
+    _add_mcdfolder2analysisfolder_parser(subparsers)
     _add_omefolder2histocatfolder_parser(subparsers)
     _add_omefile2histocatfolder_parser(subparsers)
     _add_omefile2tifffolder_parser(subparsers)
     _add_omefile2analysisfolder_parser(subparsers)
     _add_exportacquisitioncsv_parser(subparsers)
     _add_v1_to_v2_parser(subparsers)
+    _add_catalog_parser(subparsers)
+    _add_preview_parser(subparsers)
+    _add_serve_parser(subparsers)
 
     # main entry point
     args = parser.parse_args()
@@ -38,7 +57,10 @@ def main():
 
 def _add_mcdfolder2imcfolder_parser(subparsers: argparse._SubParsersAction):
     def func(args):
-        mcdfolder_to_imcfolder(args.input, args.output_folder, args.zip, args.parse_txt)
+        thumbnails = _get_thumbnail_settings(args) if args.thumbnails else None
+        mcdfolder_to_imcfolder(
+            args.input, args.output_folder, args.zip, args.parse_txt, not args.force, args.shard, thumbnails
+        )
 
     parser = subparsers.add_parser(
         "mcdfolder-to-imcfolder",
@@ -51,6 +73,172 @@ def _add_mcdfolder2imcfolder_parser(subparsers: argparse._SubParsersAction):
     parser.add_argument(
         "--parse_txt", action="store_true", help="Always use TXT files if present to get acquisition image data."
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert all acquisitions, ignoring results of previous (interrupted) runs.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=_parse_shard,
+        help="Convert only shard i of N (e.g. 0/4), for conversions spread over several nodes.",
+    )
+    parser.add_argument("--thumbnails", action="store_true", help="Whether to write PNG thumbnails.")
+    _add_thumbnail_arguments(parser)
+    parser.set_defaults(func=func)
+
+
+def _add_mcdfiles2imcfolders_parser(subparsers: argparse._SubParsersAction):
+    def func(args):
+        memory_budget = args.memory_budget * 1024 ** 2 if args.memory_budget is not None else None
+        summary = mcdfiles_to_imcfolders(
+            args.inputs,
+            args.output_folder,
+            args.zip,
+            args.parse_txt,
+            not args.force,
+            args.workers,
+            memory_budget,
+            args.shard,
+        )
+        print(summary)
+
+    parser = subparsers.add_parser(
+        "mcdfiles-to-imcfolders",
+        description="Converts many raw data files (.mcd or zipped raw data folders) to IMC folders in parallel.",
+        help="Converts many raw data files (.mcd or zipped raw data folders) to IMC folders in parallel.",
+    )
+    parser.add_argument("inputs", nargs="+", help="Folder to search for raw data files, or a list of .mcd/.zip files.")
+    parser.add_argument("output_folder", help="Path to the output folder.")
+    parser.add_argument("--zip", action="store_true", help="Whether to create an output as .zip file.")
+    parser.add_argument(
+        "--parse_txt", action="store_true", help="Always use TXT files if present to get acquisition image data."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert all acquisitions, ignoring results of previous (interrupted) runs.",
+    )
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: number of CPUs).")
+    parser.add_argument("--memory-budget", type=int, help="Approximate memory budget per worker (in MB).")
+    parser.add_argument(
+        "--shard",
+        type=_parse_shard,
+        help="Convert only shard i of N (e.g. 0/4), for conversions spread over several nodes.",
+    )
+    parser.set_defaults(func=func)
+
+
+def _add_merge_shards_parser(subparsers: argparse._SubParsersAction):
+    def func(args):
+        merge_imcfolder_shards(args.output_folder, args.zip)
+
+    parser = subparsers.add_parser(
+        "merge-shards",
+        description="Assembles session files of IMC folders converted in shards.",
+        help="Assembles session files of IMC folders converted in shards.",
+    )
+    parser.add_argument("output_folder", help="Output folder used for the sharded conversion.")
+    parser.add_argument("--zip", action="store_true", help="Whether to create an output as .zip file.")
+    parser.set_defaults(func=func)
+
+
+def _add_watch_mcd_parser(subparsers: argparse._SubParsersAction):
+    def func(args):
+        idle_timeout = args.idle_timeout if args.idle_timeout > 0 else None
+        follow_mcdfile_to_imcfolder(args.mcd_file, args.output_folder, args.interval, idle_timeout)
+
+    parser = subparsers.add_parser(
+        "watch-mcd",
+        description="Converts acquisitions of an MCD file that is still being acquired as soon as they are finished.",
+        help="Converts acquisitions of an MCD file that is still being acquired as soon as they are finished.",
+    )
+    parser.add_argument("mcd_file", help="Path to the MCD file being acquired.")
+    parser.add_argument("output_folder", help="Path to the output folder.")
+    parser.add_argument("--interval", type=float, default=10.0, help="Polling interval (in seconds).")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=600.0,
+        help="Stop once the MCD file hasn't changed for this many seconds (0 to watch until interrupted).",
+    )
+    parser.set_defaults(func=func)
+
+
+def _add_watch_parser(subparsers: argparse._SubParsersAction):
+    def func(args):
+        watch_inbox_to_imcfolders(
+            args.inbox,
+            args.output_folder,
+            args.zip,
+            args.parse_txt,
+            n_workers=args.workers,
+            settle_time=args.settle_time,
+            interval=args.interval,
+            max_retries=args.retries,
+            queue_path=args.queue,
+        )
+
+    parser = subparsers.add_parser(
+        "watch",
+        description="Watches an inbox folder and converts raw data folders/zip files copied into it to IMC folders.",
+        help="Watches an inbox folder and converts raw data folders/zip files copied into it to IMC folders.",
+    )
+    parser.add_argument("inbox", help="Path to the inbox folder.")
+    parser.add_argument("output_folder", help="Path to the output folder.")
+    parser.add_argument("--zip", action="store_true", help="Whether to create an output as .zip file.")
+    parser.add_argument(
+        "--parse_txt", action="store_true", help="Always use TXT files if present to get acquisition image data."
+    )
+    parser.add_argument("--workers", type=int, help="Number of worker processes (defaults to the number of CPUs).")
+    parser.add_argument(
+        "--settle-time",
+        type=float,
+        default=60.0,
+        help="Time an inbox entry has to stay unchanged before it is converted (in seconds).",
+    )
+    parser.add_argument("--interval", type=float, default=10.0, help="Polling interval (in seconds).")
+    parser.add_argument("--retries", type=int, default=2, help="Number of retries of failed conversions.")
+    parser.add_argument("--queue", help="Job queue database path (defaults to a hidden file in the output folder).")
+    parser.set_defaults(func=func)
+
+
+def _add_mcdfolder2analysisfolder_parser(subparsers: argparse._SubParsersAction):
+    def func(args):
+        analysis_stacks = args.stack if args.stack is not None else [("ilastik", "_ilastik"), ("full", "_full")]
+        mcdfolder_to_analysisfolder(
+            args.input,
+            args.output_folder,
+            args.panel_csv_file,
+            analysis_stacks,
+            metalcolumn=args.metalcolumn,
+            histocat_folder=args.histocat_folder,
+            imc_folder=args.imc_folder,
+            parse_txt=args.parse_txt,
+            n_writers=args.writers,
+        )
+
+    parser = subparsers.add_parser(
+        "mcdfolder-to-analysisfolder",
+        description="Converts a folder or zip file of raw data directly to analysis stacks, reading the MCD file once.",
+        help="Converts a folder or zip file of raw data directly to analysis stacks, reading the MCD file once.",
+    )
+    parser.add_argument("input", help="Path to the folder/zip archive containing the IMC raw data.")
+    parser.add_argument("output_folder", help="Output folder for the analysis stacks.")
+    parser.add_argument("panel_csv_file", help="Name of the CSV file that contains the channels to be written out.")
+    parser.add_argument(
+        "--stack",
+        action="append",
+        type=_parse_stack,
+        help="Analysis stack definition in 'column:suffix' format, can be repeated (default: ilastik and full).",
+    )
+    parser.add_argument("--metalcolumn", help="Column name of the metal names.", default="Metal Tag")
+    parser.add_argument("--histocat-folder", help="Also write histoCAT-compatible TIFF files to this folder.")
+    parser.add_argument("--imc-folder", help="Also write IMC folder with OME-TIFF files to this folder.")
+    parser.add_argument(
+        "--parse_txt", action="store_true", help="Always use TXT files if present to get acquisition image data."
+    )
+    parser.add_argument("--writers", type=int, help="Number of writer threads.")
     parser.set_defaults(func=func)
 
 
@@ -152,7 +340,7 @@ def _add_omefile2analysisfolder_parser(subparsers: argparse._SubParsersAction):
 
 def _add_exportacquisitioncsv_parser(subparsers: argparse._SubParsersAction):
     def func(args):
-        export_acquisition_csv(args.ome_folder, args.output_folder, args.output_name)
+        export_acquisition_csv(args.ome_folder, args.output_folder, args.output_name, args.format, args.workers)
 
     parser = subparsers.add_parser(
         "export-acquisition-csv",
@@ -162,12 +350,14 @@ def _add_exportacquisitioncsv_parser(subparsers: argparse._SubParsersAction):
     parser.add_argument("ome_folder", help="The path to the folders containing the OME-TIFFs.")
     parser.add_argument("output_folder", help="Folder where the metadata CSV file should be stored in.")
     parser.add_argument("--output_name", help="Filename of the acquisition metadata CSV file.", default=AC_META)
+    parser.add_argument("--format", help="Output file format.", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--workers", type=int, help="Number of worker processes (defaults to the number of CPUs).")
     parser.set_defaults(func=func)
 
 
 def _add_v1_to_v2_parser(subparsers: argparse._SubParsersAction):
     def func(args):
-        v1_to_v2(args.input_folder, args.output_folder)
+        v1_to_v2(args.input_folder, args.output_folder, args.mode, args.workers)
 
     parser = subparsers.add_parser(
         "v1-to-v2",
@@ -176,4 +366,136 @@ def _add_v1_to_v2_parser(subparsers: argparse._SubParsersAction):
     )
     parser.add_argument("input_folder", help="Input folder (with IMC v1 data).")
     parser.add_argument("output_folder", help="Output folder.")
+    parser.add_argument(
+        "--mode",
+        default="copy",
+        choices=["copy", "link", "move"],
+        help="File transfer mode: regular copy, hardlink/reflink where possible, or move (removes input files).",
+    )
+    parser.add_argument("--workers", type=int, help="Number of worker processes (defaults to the number of CPUs).")
+    parser.set_defaults(func=func)
+
+
+def _add_catalog_parser(subparsers: argparse._SubParsersAction):
+    def func(args):
+        with Catalog(args.catalog_file) as catalog:
+            if len(args.folders) > 0:
+                indexed, removed, unchanged = catalog.update(args.folders, args.workers)
+                print(f"Indexed sessions: {indexed}, removed: {removed}, unchanged: {unchanged}")
+            if args.channel or args.start or args.end or args.ablation_frequency or args.session:
+                acquisitions = catalog.find_acquisitions(
+                    channels=args.channel,
+                    start=parse_timestamp(args.start),
+                    end=parse_timestamp(args.end),
+                    ablation_frequency=args.ablation_frequency,
+                    session_name=args.session,
+                )
+                for acquisition in acquisitions:
+                    print(f"{acquisition.folder}\t{acquisition.acquisition_id}\t{acquisition.description}")
+
+    parser = subparsers.add_parser(
+        "catalog",
+        description="Indexes IMC folders in a local SQLite catalog and queries their acquisitions.",
+        help="Indexes IMC folders in a local SQLite catalog and queries their acquisitions.",
+    )
+    parser.add_argument("catalog_file", help="Catalog database file path.")
+    parser.add_argument("folders", nargs="*", help="Folders with IMC folders to index (only changed ones are re-read).")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (defaults to the number of CPUs).")
+    parser.add_argument(
+        "--channel", action="append", help="Channel name or label that acquisitions must include (repeatable)."
+    )
+    parser.add_argument("--start", help="Earliest acquisition start time (ISO format).")
+    parser.add_argument("--end", help="Latest acquisition start time (ISO format, exclusive).")
+    parser.add_argument("--ablation-frequency", type=float, help="Ablation frequency (in Hz).")
+    parser.add_argument("--session", help="Session name pattern (SQL LIKE syntax, e.g. '2020%%').")
     parser.set_defaults(func=func)
+
+
+def _add_preview_parser(subparsers: argparse._SubParsersAction):
+    def func(args):
+        count = imcfolders_to_previews(args.inputs, args.output_folder, _get_thumbnail_settings(args), args.workers)
+        print(f"Acquisitions with thumbnails: {count}")
+
+    parser = subparsers.add_parser(
+        "preview",
+        description="Generates PNG thumbnails of acquisitions, panoramas and ablation images of IMC folders.",
+        help="Generates PNG thumbnails of acquisitions, panoramas and ablation images of IMC folders.",
+    )
+    parser.add_argument("inputs", nargs="+", help="IMC folders, or folders to search for IMC folders.")
+    parser.add_argument("--output-folder", help="Output folder (defaults to the IMC folders themselves).")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (defaults to the number of CPUs).")
+    _add_thumbnail_arguments(parser)
+    parser.set_defaults(func=func)
+
+
+def _add_serve_parser(subparsers: argparse._SubParsersAction):
+    def func(args):
+        cache = AcquisitionCache(args.cache_size * 1024 ** 2)
+        tile_cache = TileCache(args.tile_cache_size * 1024 ** 2, args.tile_cache_folder)
+        with TileServer(args.path, cache=cache, tile_cache=tile_cache) as tile_server:
+            print(f"Serving {args.path} at http://{args.host}:{args.port}/")
+            tile_server.serve(args.host, args.port, args.workers)
+
+    parser = subparsers.add_parser(
+        "serve",
+        description="Serves slides, panoramas and acquisitions of an IMC folder or MCD file as deep zoom tiles.",
+        help="Serves slides, panoramas and acquisitions of an IMC folder or MCD file as deep zoom tiles.",
+    )
+    parser.add_argument("path", help="IMC folder, _imc.zip archive or MCD file.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host address to listen on.")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on.")
+    parser.add_argument("--workers", type=int, help="Number of request threads (defaults to the number of CPUs).")
+    parser.add_argument("--cache-size", type=int, default=1024, help="Memory budget of decoded image data (in MB).")
+    parser.add_argument("--tile-cache-size", type=int, default=256, help="Size budget of the tile cache (in MB).")
+    parser.add_argument("--tile-cache-folder", help="Keep rendered tiles in this folder instead of memory.")
+    parser.set_defaults(func=func)
+
+
+def _add_thumbnail_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--thumbnail-size",
+        type=int,
+        default=DEFAULT_THUMBNAIL_SIZE,
+        help="Size of the longer thumbnail side (in pixels).",
+    )
+    parser.add_argument(
+        "--composite",
+        action="append",
+        type=_parse_composite,
+        help="RGB thumbnail as name=red,green,blue channel names or labels (repeatable, e.g. dna=,,Ir191).",
+    )
+
+
+def _get_thumbnail_settings(args: argparse.Namespace):
+    """Thumbnail settings from parsed thumbnail arguments."""
+    composites = dict(args.composite) if args.composite is not None else None
+    return ThumbnailSettings(size=args.thumbnail_size, composites=composites)
+
+
+def _parse_shard(value: str):
+    """Parse shard definition in 'i/N' format."""
+    try:
+        index, count = (int(v) for v in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected format: i/N")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', index should be in range [0, {count})")
+    return index, count
+
+
+def _parse_stack(value: str):
+    """Parse analysis stack definition in 'column:suffix' format."""
+    column, sep, suffix = value.partition(":")
+    if sep == "" or column == "":
+        raise argparse.ArgumentTypeError(f"Invalid stack '{value}', expected format: column:suffix")
+    return column, suffix
+
+
+def _parse_composite(value: str):
+    """Parse RGB composite definition in 'name=red,green,blue' format."""
+    name, sep, channels = value.partition("=")
+    colors = channels.split(",")
+    if sep == "" or name == "" or len(colors) > 3:
+        raise argparse.ArgumentTypeError(f"Invalid composite '{value}', expected format: name=red,green,blue")
+    colors += [""] * (3 - len(colors))
+    return name, tuple(c if c != "" else None for c in colors)
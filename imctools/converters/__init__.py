@@ -1,5 +1,13 @@
 from .exportacquisitioncsv import export_acquisition_csv
-from .mcdfolder2imcfolder import mcdfolder_to_imcfolder
+from .hotfolder import watch_inbox_to_imcfolders
+from .imcfolder2preview import imcfolders_to_previews
+from .mcd2analysis import mcdfolder_to_analysisfolder
+from .mcdfolder2imcfolder import (
+    follow_mcdfile_to_imcfolder,
+    mcdfiles_to_imcfolders,
+    mcdfolder_to_imcfolder,
+    merge_imcfolder_shards,
+)
 from .ome2analysis import omefile_2_analysisfolder, omefolder_to_analysisfolder
 from .ome2histocat import (
     omefile_to_histocatfolder,
@@ -1,26 +1,34 @@
-import csv
 import glob
 import os
-from io import StringIO
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, List, Optional, Union
 
 import pandas as pd
 
 import imctools.io.mcd.constants as const
-from imctools.data import Session
-from imctools.io.utils import CSV_FILENDING, META_CSV_SUFFIX, SESSION_JSON_SUFFIX
+from imctools.io.utils import CSV_FILENDING, META_CSV_SUFFIX, SESSION_JSON_SUFFIX, load_json
 
 SUFFIX_ACMETA = "_acquisitions" + META_CSV_SUFFIX
 COL_MCD_ID = const.ID
 COL_AC_ID = const.ACQUISITION_ID
 COL_AC_SESSION = "AcSession"
 AC_META = "acquisition_metadata"
+PARQUET_FILENDING = ".parquet"
 
 
-def export_acquisition_csv(root_folder: Union[str, Path], output_folder: Union[str, Path], output_name=AC_META):
+def export_acquisition_csv(
+    root_folder: Union[str, Path],
+    output_folder: Union[str, Path],
+    output_name=AC_META,
+    output_format: str = "csv",
+    n_workers: Optional[int] = None,
+):
     """Export CSV file with merged acquisition metadata from all session subfolders.
 
+    Only the acquisition records are taken from the session files (no session object tree is built), and session files
+    are read in parallel.
+
     Parameters
     ----------
     root_folder
@@ -29,35 +37,59 @@ def export_acquisition_csv(root_folder: Union[str, Path], output_folder: Union[s
         Folder where the metadata CSV file should be stored in.
     output_name
         Filename of the acquisition metadata CSV file.
+    output_format
+        Output file format ("csv" or "parquet", the latter requires pyarrow or fastparquet).
+    n_workers
+        Number of worker processes reading the session files (defaults to the number of CPUs).
     """
     if isinstance(root_folder, Path):
         root_folder = str(root_folder)
     if isinstance(output_folder, str):
         output_folder = Path(output_folder)
-    ac_names = os.listdir(root_folder)
-    session_files = glob.glob(os.path.join(root_folder, f"*/*{SESSION_JSON_SUFFIX}"), recursive=True)
+    if output_format not in ("csv", "parquet"):
+        raise ValueError(f"Unsupported output format: {output_format}")
+    session_files = sorted(glob.glob(os.path.join(root_folder, f"*/*{SESSION_JSON_SUFFIX}"), recursive=True))
     if len(session_files) == 0:
         raise ValueError("No session JSON files available.")
 
-    stack = []
-    for session_file in session_files:
-        session = Session.load(session_file)
-        acquisitions = [v.get_csv_dict() for v in session.acquisitions.values()]
-        cols = acquisitions[0].keys()
-        with StringIO() as buffer:
-            writer = csv.DictWriter(buffer, sorted(cols))
-            writer.writeheader()
-            writer.writerows(acquisitions)
-            buffer.seek(0)
-            stack.append(pd.read_csv(buffer))
-    data = pd.concat(stack, keys=ac_names, names=[COL_AC_SESSION])
-    data = data.reset_index(COL_AC_SESSION, drop=False)
-    data.rename(columns={COL_MCD_ID: COL_AC_ID})
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers == 1 or len(session_files) == 1:
+        records = [_read_acquisition_records(f) for f in session_files]
+    else:
+        chunksize = max(1, len(session_files) // (n_workers * 4))
+        with ProcessPoolExecutor(n_workers) as executor:
+            records = list(executor.map(_read_acquisition_records, session_files, chunksize=chunksize))
+
+    # Build typed columns directly from the records, column order as in the per-session acquisition CSV tables
+    columns: Dict[str, List[Any]] = {COL_AC_SESSION: []}
+    names = sorted({key for session_records in records for record in session_records for key in record})
+    for name in names:
+        columns[name] = []
+    for session_file, session_records in zip(session_files, records):
+        # Session folder name, paired with its own session file
+        session_name = os.path.basename(os.path.dirname(session_file))
+        for record in session_records:
+            columns[COL_AC_SESSION].append(session_name)
+            for name in names:
+                columns[name].append(record.get(name))
+    data = pd.DataFrame(columns)
 
     if not output_folder.exists():
         output_folder.mkdir(parents=True, exist_ok=True)
 
-    data.to_csv(output_folder / (output_name + CSV_FILENDING), index=False)
+    if output_format == "parquet":
+        data.to_parquet(output_folder / (output_name + PARQUET_FILENDING), index=False)
+    else:
+        data.to_csv(output_folder / (output_name + CSV_FILENDING), index=False)
+
+
+def _read_acquisition_records(session_file: str):
+    """Read acquisition records (without raw metadata) from a session JSON file."""
+    acquisitions = load_json(session_file).get("acquisitions", [])
+    for acquisition in acquisitions:
+        acquisition.pop("metadata", None)
+    return acquisitions
 
 
 if __name__ == "__main__":
@@ -0,0 +1,374 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import timeit
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from imctools.converters.mcdfolder2imcfolder import mcdfolder_to_imcfolder
+from imctools.io.imc.imcwriter import IMC_ZIP_SUFFIX
+from imctools.io.utils import MCD_FILENDING, ZIP_FILENDING
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FILENAME = ".imctools_queue.sqlite"
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class JobQueue:
+    """Persistent conversion job queue stored in a local SQLite database.
+
+    Every inbox entry has one job, identified by its path. A job is only queued again when the fingerprint of its
+    source changes, so finished jobs are not reprocessed after a restart. Sources changing while their job is running
+    are queued again once the running conversion ends, so a job never runs twice at the same time.
+    """
+
+    def __init__(self, filepath: Union[str, Path]):
+        """
+        Parameters
+        ----------
+        filepath
+            SQLite database file path.
+        """
+        if isinstance(filepath, str):
+            filepath = Path(filepath)
+        self.filepath = filepath
+        self._connection = sqlite3.connect(str(filepath))
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT UNIQUE NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    requeue INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    queued_at REAL,
+                    retry_at REAL,
+                    started_at REAL,
+                    finished_at REAL,
+                    duration REAL
+                )
+                """
+            )
+
+    def recover(self):
+        """Re-queue jobs that were running when the previous process stopped. Returns the number of such jobs."""
+        with self._connection:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ?, requeue = 0, retry_at = NULL WHERE status = ?",
+                (STATUS_PENDING, STATUS_RUNNING),
+            )
+        return cursor.rowcount
+
+    def enqueue(self, source: str, fingerprint: str):
+        """Queue conversion of the source unless the same version of it is already known. Returns True if queued.
+
+        Parameters
+        ----------
+        source
+            Path to the inbox entry.
+        fingerprint
+            Fingerprint of the inbox entry content.
+        """
+        row = self._connection.execute("SELECT fingerprint, status FROM jobs WHERE source = ?", (source,)).fetchone()
+        if row is not None and row["fingerprint"] == fingerprint:
+            return False
+        with self._connection:
+            if row is not None and row["status"] == STATUS_RUNNING:
+                # Queued again by finish/fail once the running conversion of the previous version ends
+                self._connection.execute(
+                    "UPDATE jobs SET fingerprint = ?, requeue = 1 WHERE source = ?", (fingerprint, source)
+                )
+                return True
+            self._connection.execute(
+                """
+                INSERT INTO jobs (source, fingerprint, status, attempts, queued_at) VALUES (?, ?, ?, 0, ?)
+                ON CONFLICT(source) DO UPDATE SET
+                    fingerprint = excluded.fingerprint, status = excluded.status, attempts = 0, requeue = 0,
+                    error = NULL, queued_at = excluded.queued_at, retry_at = NULL, started_at = NULL,
+                    finished_at = NULL, duration = NULL
+                """,
+                (source, fingerprint, STATUS_PENDING, time.time()),
+            )
+        return True
+
+    def next_pending(self):
+        """Oldest pending job that is due, or None."""
+        return self._connection.execute(
+            """
+            SELECT * FROM jobs WHERE status = ? AND (retry_at IS NULL OR retry_at <= ?) ORDER BY queued_at, id LIMIT 1
+            """,
+            (STATUS_PENDING, time.time()),
+        ).fetchone()
+
+    def start(self, job_id: int):
+        """Mark job as running.
+
+        Parameters
+        ----------
+        job_id
+            Job ID.
+        """
+        with self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ? WHERE id = ?",
+                (STATUS_RUNNING, time.time(), job_id),
+            )
+
+    def finish(self, job_id: int, duration: float):
+        """Mark job as successfully done, or queue it again if its source changed while running. Returns the new
+        job status.
+
+        Parameters
+        ----------
+        job_id
+            Job ID.
+        duration
+            Conversion time (in seconds).
+        """
+        if self.get_job(job_id)["requeue"]:
+            return self._requeue(job_id)
+        with self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, error = NULL, finished_at = ?, duration = ? WHERE id = ?",
+                (STATUS_DONE, time.time(), duration, job_id),
+            )
+        return STATUS_DONE
+
+    def fail(self, job_id: int, error: str, duration: float, max_retries: int = 2, retry_delay: float = 60.0):
+        """Record a failed attempt, re-queueing the job unless it ran out of retries (a source that changed while
+        running is always queued again). Returns the new job status.
+
+        Parameters
+        ----------
+        job_id
+            Job ID.
+        error
+            Error message.
+        duration
+            Time spent on the failed attempt (in seconds).
+        max_retries
+            Number of retries after the first failed attempt.
+        retry_delay
+            Delay before the job is retried (in seconds).
+        """
+        row = self.get_job(job_id)
+        if row["requeue"]:
+            return self._requeue(job_id)
+        if row["attempts"] > max_retries:
+            status, retry_at = STATUS_FAILED, None
+        else:
+            status, retry_at = STATUS_PENDING, time.time() + retry_delay
+        with self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, retry_at = ?, finished_at = ?, duration = ? WHERE id = ?",
+                (status, error, retry_at, time.time(), duration, job_id),
+            )
+        return status
+
+    def _requeue(self, job_id: int):
+        """Queue job of a source that changed while running."""
+        with self._connection:
+            self._connection.execute(
+                """
+                UPDATE jobs SET status = ?, attempts = 0, requeue = 0, error = NULL, queued_at = ?, retry_at = NULL,
+                    started_at = NULL, finished_at = NULL, duration = NULL
+                WHERE id = ?
+                """,
+                (STATUS_PENDING, time.time(), job_id),
+            )
+        return STATUS_PENDING
+
+    def get_job(self, job_id: int):
+        """Get job by ID.
+
+        Parameters
+        ----------
+        job_id
+            Job ID.
+        """
+        return self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def get_jobs(self, status: Optional[str] = None):
+        """List jobs, optionally only the ones with given status.
+
+        Parameters
+        ----------
+        status
+            Job status.
+        """
+        if status is None:
+            return self._connection.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        return self._connection.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,)).fetchall()
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(filepath={self.filepath})"
+
+
+def watch_inbox_to_imcfolders(
+    inbox: Union[str, Path],
+    output_folder: Union[str, Path],
+    create_zip: bool = False,
+    parse_txt: bool = False,
+    n_workers: Optional[int] = None,
+    settle_time: float = 60.0,
+    interval: float = 10.0,
+    max_retries: int = 2,
+    retry_delay: float = 60.0,
+    queue_path: Optional[Union[str, Path]] = None,
+    idle_timeout: Optional[float] = None,
+):
+    """Watches an inbox folder and converts raw data folders and .zip files copied into it to IMC folders.
+
+    Inbox entries are queued once their content hasn't changed for `settle_time` seconds and converted by a pool of
+    worker processes with `mcdfolder_to_imcfolder`. Jobs are kept in a SQLite queue together with their timings, so
+    interrupted jobs are resumed and finished jobs are not reprocessed after a restart.
+
+    Parameters
+    ----------
+    inbox
+        Folder to watch for raw data folders and .zip files.
+    output_folder
+        Path to the output folder.
+    create_zip
+        Whether to create an output as .zip file.
+    parse_txt
+        Always use TXT files if present to get acquisition image data.
+    n_workers
+        Number of worker processes (defaults to the number of CPUs).
+    settle_time
+        Time an inbox entry has to stay unchanged before it is queued (in seconds).
+    interval
+        Polling interval (in seconds).
+    max_retries
+        Number of retries of failed jobs.
+    retry_delay
+        Delay before a failed job is retried (in seconds).
+    queue_path
+        Job queue database path (defaults to a hidden file in the output folder).
+    idle_timeout
+        Stop once the queue has been empty and the inbox unchanged for this many seconds (None to watch until
+        interrupted).
+    """
+    if isinstance(inbox, str):
+        inbox = Path(inbox)
+    if isinstance(output_folder, str):
+        output_folder = Path(output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    if queue_path is None:
+        queue_path = output_folder / QUEUE_FILENAME
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    # Last seen fingerprint of inbox entries and since when it is unchanged
+    candidates: Dict[Path, Dict[str, object]] = dict()
+    with JobQueue(queue_path) as queue, ProcessPoolExecutor(n_workers) as executor:
+        recovered = queue.recover()
+        if recovered > 0:
+            logger.info(f"Resuming interrupted jobs: {recovered}")
+        running: Dict[Future, sqlite3.Row] = dict()
+        last_activity = timeit.default_timer()
+        while True:
+            now = timeit.default_timer()
+            sources = _find_inbox_entries(inbox)
+            for source in set(candidates).difference(sources):
+                del candidates[source]
+            for source in sources:
+                fingerprint = _get_inbox_entry_fingerprint(source)
+                candidate = candidates.get(source)
+                if candidate is None or candidate["fingerprint"] != fingerprint:
+                    candidates[source] = {"fingerprint": fingerprint, "since": now}
+                    last_activity = now
+                elif not candidate.get("checked") and now - candidate["since"] >= settle_time:
+                    candidate["checked"] = True
+                    if fingerprint is not None and queue.enqueue(str(source), fingerprint):
+                        logger.info(f"Queued: {source}")
+                        last_activity = now
+
+            while len(running) < n_workers:
+                job = queue.next_pending()
+                if job is None:
+                    break
+                queue.start(job["id"])
+                logger.info(f"Converting: {job['source']}")
+                future = executor.submit(_convert_job, job["source"], output_folder, create_zip, parse_txt)
+                running[future] = job
+
+            if len(running) > 0:
+                last_activity = now
+                done, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        duration = future.result()
+                    except Exception as e:
+                        duration = time.time() - queue.get_job(job["id"])["started_at"]
+                        status = queue.fail(job["id"], str(e), duration, max_retries, retry_delay)
+                        logger.error(f"Error in {job['source']} ({status}): {e}")
+                    else:
+                        status = queue.finish(job["id"], duration)
+                        logger.info(f"Converted: {job['source']} ({duration:.1f} s, {status})")
+            else:
+                if idle_timeout is not None and now - last_activity >= idle_timeout:
+                    break
+                time.sleep(interval)
+
+
+def _convert_job(source: str, output_folder: Path, create_zip: bool, parse_txt: bool):
+    """Worker task: convert an inbox entry and return the conversion time."""
+    tic = timeit.default_timer()
+    mcdfolder_to_imcfolder(source, output_folder, create_zip=create_zip, parse_txt=parse_txt, resume=True)
+    return timeit.default_timer() - tic
+
+
+def _find_inbox_entries(inbox: Path):
+    """List raw data folders and .zip files in the inbox."""
+    result = []
+    for f in sorted(inbox.iterdir()):
+        if f.name.startswith(".") or f.name.endswith(IMC_ZIP_SUFFIX):
+            continue
+        if f.is_dir() or f.suffix == ZIP_FILENDING:
+            result.append(f)
+    return result
+
+
+def _get_inbox_entry_fingerprint(source: Path):
+    """Fingerprint of the names, sizes and modification times of all files in an inbox entry.
+
+    Returns None for folders without MCD files (yet), which are not queued.
+    """
+    try:
+        if source.is_dir():
+            files = sorted(f for f in source.rglob("*") if f.is_file())
+            if not any(f.suffix == MCD_FILENDING and not f.name.startswith(".") for f in files):
+                return None
+        else:
+            files = [source]
+        h = hashlib.sha256()
+        for f in files:
+            stat = f.stat()
+            h.update(f"{f.relative_to(source.parent)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+        return h.hexdigest()
+    except FileNotFoundError:
+        # Entry is being moved or renamed
+        return None
@@ -0,0 +1,97 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+from imctools.io.imc.imcparser import ImcParser
+from imctools.io.thumbnails import (
+    ThumbnailSettings,
+    get_thumbnail_binning,
+    save_acquisition_thumbnails,
+    save_image_thumbnail,
+)
+from imctools.io.utils import SESSION_JSON_SUFFIX, THUMBNAIL_PNG_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# Encoded artifact images of IMC folders (panoramas, before/after ablation images)
+_ARTIFACT_PATTERNS = ("*_pano.*", "*_before.png", "*_after.png")
+
+
+def imcfolders_to_previews(
+    inputs: Union[str, Path, Sequence[Union[str, Path]]],
+    output_folder: Optional[Union[str, Path]] = None,
+    settings: Optional[ThumbnailSettings] = None,
+    n_workers: Optional[int] = None,
+):
+    """Generates PNG thumbnails of acquisitions, panoramas and ablation images of existing IMC folders in parallel.
+
+    Returns the number of acquisitions with thumbnails.
+
+    Parameters
+    ----------
+    inputs
+        IMC folders, or folders to search for IMC folders.
+    output_folder
+        Output folder (thumbnails are written into a subfolder per IMC folder), the IMC folders themselves by default.
+    settings
+        Thumbnail settings.
+    n_workers
+        Number of worker processes (defaults to the number of CPUs).
+    """
+    if isinstance(inputs, (str, Path)):
+        inputs = [inputs]
+    if isinstance(output_folder, str):
+        output_folder = Path(output_folder)
+    if settings is None:
+        settings = ThumbnailSettings()
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    imc_folders = sorted({f.parent for input in inputs for f in Path(input).glob(f"**/*{SESSION_JSON_SUFFIX}")})
+    tasks = []
+    for imc_folder in imc_folders:
+        preview_folder = imc_folder if output_folder is None else output_folder / imc_folder.name
+        preview_folder.mkdir(parents=True, exist_ok=True)
+        tasks.append((_save_artifact_previews, imc_folder, preview_folder, settings))
+        session = ImcParser(imc_folder).session
+        for acquisition in session.acquisitions.values():
+            if acquisition.is_valid:
+                tasks.append((_save_acquisition_preview, imc_folder, preview_folder, settings, acquisition.id))
+
+    count = 0
+    with ProcessPoolExecutor(n_workers) as executor:
+        futures = {executor.submit(*task): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                count += future.result()
+            except Exception as e:
+                task = futures[future]
+                logger.error(f"Cannot create thumbnails of {task[1]} ({task[0].__name__}): {e}")
+    return count
+
+
+def _save_acquisition_preview(
+    imc_folder: Path, preview_folder: Path, settings: ThumbnailSettings, acquisition_id: int
+) -> int:
+    """Worker task: save thumbnails of a single acquisition, reading only the binned image data."""
+    with ImcParser(imc_folder) as parser:
+        acquisition = parser.session.acquisitions.get(acquisition_id)
+        binning = get_thumbnail_binning(acquisition.max_y, acquisition.max_x, settings.size)
+        image_stack = parser.get_image_stack(acquisition_id, binning=binning)
+    save_acquisition_thumbnails(acquisition, image_stack, preview_folder, settings, binning=binning)
+    return 1
+
+
+def _save_artifact_previews(imc_folder: Path, preview_folder: Path, settings: ThumbnailSettings) -> int:
+    """Worker task: save thumbnails of panoramas and ablation images."""
+    filepaths: List[Path] = []
+    for pattern in _ARTIFACT_PATTERNS:
+        filepaths.extend(imc_folder.glob(pattern))
+    for filepath in filepaths:
+        with open(filepath, "rb") as f:
+            buf = f.read()
+        filename = filepath.name[: -len(filepath.suffix)] + THUMBNAIL_PNG_SUFFIX
+        save_image_thumbnail(buf, preview_folder / filename, settings.size)
+    return 0
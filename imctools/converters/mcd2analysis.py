@@ -0,0 +1,148 @@
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+import pandas as pd
+
+from imctools.converters.mcdfolder2imcfolder import open_raw_data
+from imctools.converters.ome2analysis import get_metals, write_analysis_stack
+from imctools.data import Acquisition
+from imctools.data.acquisitiondata import AcquisitionData
+from imctools.io.imc.imcwriter import ImcWriter, read_acquisition_data
+from imctools.io.imc.manifest import ConversionManifest
+from imctools.io.utils import OME_TIFF_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# Acquisitions that may be waiting for their writes to finish while the next one is read
+_MAX_PENDING_ACQUISITIONS = 2
+
+
+def mcdfolder_to_analysisfolder(
+    input: Union[str, Path],
+    output_folder: Union[str, Path],
+    panel_csv_file: Union[str, Path],
+    analysis_stacks: Sequence[Tuple[str, str]] = (("ilastik", "_ilastik"), ("full", "_full")),
+    metalcolumn: str = "Metal Tag",
+    dtype=np.uint16,
+    histocat_folder: Optional[Union[str, Path]] = None,
+    histocat_dtype: Optional[Type] = None,
+    imc_folder: Optional[Union[str, Path]] = None,
+    parse_txt: bool = False,
+    n_writers: Optional[int] = None,
+):
+    """Converts raw data folder (or zipped folder) directly to analysis stacks, without OME-TIFF intermediates.
+
+    Every acquisition is read from the MCD file once. Analysis stacks, histoCAT TIFF files and (optionally) the
+    OME-TIFF files of the IMC folder are written from the same image data by a pool of writer threads, while the next
+    acquisition is read. Output files are named as if they were derived from the IMC folder OME-TIFF files.
+
+    Parameters
+    ----------
+    input
+        Input folder / .zip file with raw .mcd/.txt acquisition data files.
+    output_folder
+        Output folder for the analysis stacks.
+    panel_csv_file
+        Name of the CSV file that contains the channels to be written out.
+    analysis_stacks
+        Array of analysis stack definitions in a tuple format (column, suffix).
+    metalcolumn
+        Column name of the metal names.
+    dtype
+        Output numpy dtype of the analysis stacks.
+    histocat_folder
+        Output folder for histoCAT-compatible single channel TIFF files (not written if None).
+    histocat_dtype
+        Output numpy dtype of the histoCAT TIFF files.
+    imc_folder
+        Output folder for the IMC folder with OME-TIFF files (not written if None).
+    parse_txt
+        Always use TXT files if present to get acquisition image data.
+    n_writers
+        Number of writer threads (defaults to the Python thread pool default).
+    """
+    if isinstance(output_folder, str):
+        output_folder = Path(output_folder)
+    if isinstance(histocat_folder, str):
+        histocat_folder = Path(histocat_folder)
+
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    panel = pd.read_csv(panel_csv_file)
+    stacks = [(suffix, get_metals(panel, col, metalcolumn, True)) for (col, suffix, *_) in analysis_stacks]
+
+    with open_raw_data(input) as (mcd_parser, txt_acquisitions_map), ThreadPoolExecutor(n_writers) as executor:
+        imc_writer = None
+        manifest = None
+        if imc_folder is not None:
+            imc_writer = ImcWriter(imc_folder, mcd_parser, txt_acquisitions_map, parse_txt)
+            manifest = imc_writer.prepare_imc_folder()
+            mcd_xml = mcd_parser.get_mcd_xml()
+
+        pending = deque()
+        for acquisition in mcd_parser.session.acquisitions.values():
+            acquisition_data = read_acquisition_data(mcd_parser, acquisition.id, txt_acquisitions_map, parse_txt)
+            if not acquisition_data.is_valid:
+                logger.warning(f"Skipping invalid acquisition: {acquisition.id}")
+                continue
+
+            # Same basename as derived from the OME-TIFF file name by `omefolder_to_analysisfolder`
+            basename = acquisition.metaname + "_ac"
+            futures = [
+                executor.submit(
+                    write_analysis_stack, acquisition_data, output_folder, basename + suffix, metals, False, dtype
+                )
+                for suffix, metals in stacks
+            ]
+            if histocat_folder is not None:
+                futures.append(
+                    executor.submit(_write_histocat_tiffs, acquisition_data, histocat_folder / basename, histocat_dtype)
+                )
+            ome_tiff_path = None
+            if imc_writer is not None:
+                ome_tiff_path = imc_writer.output_folder / (acquisition.metaname + OME_TIFF_SUFFIX)
+                if manifest.is_complete(acquisition.id, ome_tiff_path):
+                    manifest.restore(acquisition)
+                    ome_tiff_path = None
+                else:
+                    futures.append(
+                        executor.submit(
+                            imc_writer.write_acquisition,
+                            acquisition.id,
+                            imc_writer.output_folder,
+                            xml_metadata=mcd_xml,
+                            acquisition_data=acquisition_data,
+                        )
+                    )
+            pending.append((acquisition, futures, ome_tiff_path))
+
+            while len(pending) > _MAX_PENDING_ACQUISITIONS:
+                _complete_acquisition(*pending.popleft(), manifest)
+        while len(pending) > 0:
+            _complete_acquisition(*pending.popleft(), manifest)
+
+        if imc_writer is not None:
+            imc_writer.finalize_imc_folder(create_zip=False)
+
+
+def _complete_acquisition(
+    acquisition: Acquisition,
+    futures: List[Future],
+    ome_tiff_path: Optional[Path],
+    manifest: Optional[ConversionManifest],
+):
+    """Wait for all writes of an acquisition, record written OME-TIFF file in the conversion manifest."""
+    for future in futures:
+        future.result()
+    if ome_tiff_path is not None and acquisition.is_valid:
+        manifest.mark_complete(acquisition, ome_tiff_path)
+
+
+def _write_histocat_tiffs(acquisition_data: AcquisitionData, output_folder: Path, dtype: Optional[Type]):
+    """Write single channel TIFF files into histoCAT acquisition folder (in the calling writer thread)."""
+    output_folder.mkdir(parents=True, exist_ok=True)
+    acquisition_data.save_tiffs(output_folder, basename="", dtype=dtype, n_writers=1)
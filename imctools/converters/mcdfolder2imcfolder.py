@@ -1,20 +1,54 @@
 import glob
+import json
 import logging
+import os
+import re
+import time
+import timeit
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import contextmanager
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Union
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
 
-from imctools.io.imc.imcwriter import ImcWriter
+import imctools.io.mcd.constants as const
+from imctools.data import Acquisition
+from imctools.io.imc.imcwriter import IMC_ZIP_SUFFIX, ImcWriter, compress_imc_folder
+from imctools.io.imc.manifest import ConversionManifest
 from imctools.io.mcd.mcdparser import McdParser
+from imctools.io.mcd.mcdxmlparser import McdXmlParser
+from imctools.io.thumbnails import ThumbnailSettings
 from imctools.io.txt.txtparser import TXT_FILE_EXTENSION, TxtParser
-from imctools.io.utils import MCD_FILENDING, SCHEMA_FILENDING, ZIP_FILENDING
+from imctools.io.utils import (
+    MANIFEST_JSON_SUFFIX,
+    MCD_FILENDING,
+    OME_TIFF_SUFFIX,
+    SCHEMA_FILENDING,
+    SCHEMA_XML_SUFFIX,
+    SESSION_JSON_SUFFIX,
+    ZIP_FILENDING,
+)
 
 logger = logging.getLogger(__name__)
 
+# Memory needed to convert an acquisition relative to its raw data size (memory map, reshaped data, output copy)
+_MEMORY_PER_DATA_BYTE = 3
+
+# MCD parsers kept open by a worker process, so consecutive tasks of the same file don't re-parse the MCD XML
+_MAX_WORKER_PARSERS = 4
+_worker_parsers: "OrderedDict[Path, McdParser]" = OrderedDict()
+
 
 def mcdfolder_to_imcfolder(
-    input: Union[str, Path], output_folder: Union[str, Path], create_zip: bool = False, parse_txt: bool = False
+    input: Union[str, Path],
+    output_folder: Union[str, Path],
+    create_zip: bool = False,
+    parse_txt: bool = False,
+    resume: bool = True,
+    shard: Optional[Tuple[int, int]] = None,
+    thumbnails: Optional[ThumbnailSettings] = None,
 ):
     """Converts folder (or zipped folder) containing raw acquisition data (mcd and txt files) to IMC folder containing standardized files.
 
@@ -28,6 +62,457 @@ def mcdfolder_to_imcfolder(
         Whether to create an output as .zip file.
     parse_txt
         Always use TXT files if present to get acquisition image data.
+    resume
+        Skip acquisitions already converted by a previous (interrupted) run, as recorded in the conversion manifest.
+    shard
+        Shard index and number of shards (index starts at 0). Only the acquisitions of the given shard are written, so
+        a session can be converted on several nodes at once; session files are assembled by `merge_imcfolder_shards`.
+    thumbnails
+        Settings of PNG thumbnails written during conversion (None to skip them).
+    """
+    with open_raw_data(input) as (mcd_parser, txt_acquisitions_map):
+        imc_writer = ImcWriter(output_folder, mcd_parser, txt_acquisitions_map, parse_txt, thumbnails=thumbnails)
+        if shard is None:
+            imc_writer.write_imc_folder(create_zip=create_zip, resume=resume)
+        else:
+            manifest = imc_writer.prepare_imc_folder(resume=resume, shard=shard)
+            acquisitions = mcd_parser.session.acquisitions.values()
+            acquisition_ids = select_shard({a.id: _get_acquisition_data_size(a) for a in acquisitions}, *shard)
+            mcd_xml = mcd_parser.get_mcd_xml()
+            for acquisition_id in acquisition_ids:
+                imc_writer.write_acquisition(
+                    acquisition_id, imc_writer.output_folder, xml_metadata=mcd_xml, manifest=manifest
+                )
+            if shard[0] == 0:
+                imc_writer.write_artifacts()
+
+
+def merge_imcfolder_shards(output_folder: Union[str, Path], create_zip: bool = False):
+    """Assembles session files of IMC folders converted in shards (see `mcdfolder_to_imcfolder`).
+
+    Only the MCD XML schema and shard manifests in the output folder are read, so merging doesn't need the raw data.
+
+    Parameters
+    ----------
+    output_folder
+        Output folder used for the sharded conversion.
+    create_zip
+        Whether to create an output as .zip file.
+    """
+    if isinstance(output_folder, str):
+        output_folder = Path(output_folder)
+
+    shard_pattern = re.compile(
+        r"^(?P<name>.+)_shard(?P<index>\d+)-of-(?P<count>\d+)" + re.escape(MANIFEST_JSON_SUFFIX) + "$"
+    )
+    imc_folders = sorted({f.parent for f in output_folder.glob(f"*/*_shard*{MANIFEST_JSON_SUFFIX}")})
+    if len(imc_folders) == 0:
+        raise ValueError(f"No shard manifests found in {output_folder}")
+
+    for imc_folder in imc_folders:
+        shard_manifests = dict()
+        shard_count = None
+        for manifest_file in imc_folder.glob(f"*_shard*{MANIFEST_JSON_SUFFIX}"):
+            m = shard_pattern.match(manifest_file.name)
+            if m is None or m.group("name") != imc_folder.name:
+                continue
+            if shard_count is not None and int(m.group("count")) != shard_count:
+                raise ValueError(f"Inconsistent shard counts in {imc_folder}")
+            shard_count = int(m.group("count"))
+            shard_manifests[int(m.group("index"))] = ConversionManifest.load(manifest_file)
+        missing = sorted(set(range(shard_count)) - set(shard_manifests.keys()))
+        if len(missing) > 0:
+            raise ValueError(f"Missing shards {missing} of {shard_count} in {imc_folder}")
+        sources = {json.dumps(m.source_fingerprint, sort_keys=True) for m in shard_manifests.values()}
+        if len(sources) != 1:
+            raise ValueError(f"Shards of {imc_folder} were converted from different sources")
+
+        first = shard_manifests[0]
+        manifest = ConversionManifest(
+            imc_folder / (imc_folder.name + MANIFEST_JSON_SUFFIX), first.source_fingerprint, first.source_path
+        )
+        for shard_manifest in shard_manifests.values():
+            manifest.acquisitions.update(shard_manifest.acquisitions)
+
+        with open(imc_folder / (imc_folder.name + SCHEMA_XML_SUFFIX), "rt") as f:
+            session = McdXmlParser(f.read(), first.source_path).session
+        for acquisition in session.acquisitions.values():
+            if str(acquisition.id) in manifest.acquisitions:
+                manifest.restore(acquisition)
+            else:
+                acquisition.is_valid = False
+
+        session.save(imc_folder / (session.metaname + SESSION_JSON_SUFFIX))
+        manifest.save()
+        for shard_manifest in shard_manifests.values():
+            os.remove(shard_manifest.filepath)
+
+        if create_zip:
+            compress_imc_folder(imc_folder)
+
+
+def follow_mcdfile_to_imcfolder(
+    mcd_file: Union[str, Path],
+    output_folder: Union[str, Path],
+    interval: float = 10.0,
+    idle_timeout: Optional[float] = 600.0,
+):
+    """Converts acquisitions of an MCD file that is still being acquired as soon as they are finished.
+
+    The MCD file is polled for new data; finished acquisitions are written once, together with their ablation images,
+    and the MCD XML schema file is rewritten whenever the MCD XML changes. The session file, slide images and panoramas
+    are written once following stops. Already converted acquisitions are skipped when following is restarted.
+
+    Parameters
+    ----------
+    mcd_file
+        Path to the MCD file being acquired.
+    output_folder
+        Path to the output folder.
+    interval
+        Polling interval (in seconds).
+    idle_timeout
+        Stop following once the file hasn't changed for this many seconds (None to follow until interrupted).
+    """
+    if isinstance(mcd_file, str):
+        mcd_file = Path(mcd_file)
+
+    with McdParser(mcd_file, follow=True) as mcd_parser:
+        imc_writer = ImcWriter(output_folder, mcd_parser)
+        manifest = None
+        mcd_xml = None
+        last_change = timeit.default_timer()
+        last_size = None
+        try:
+            while True:
+                completed_ids = mcd_parser.refresh()
+                if mcd_parser.session is not None:
+                    if manifest is None:
+                        manifest = imc_writer.prepare_imc_folder(resume=True, follow=True)
+                        mcd_xml = mcd_parser.get_mcd_xml()
+                    elif mcd_parser.get_mcd_xml() != mcd_xml:
+                        mcd_xml = mcd_parser.get_mcd_xml()
+                        imc_writer.write_schema_xml()
+                    # Session is re-created whenever the MCD XML changes, restore results of written acquisitions
+                    for acquisition in mcd_parser.session.acquisitions.values():
+                        if str(acquisition.id) in manifest.acquisitions:
+                            manifest.restore(acquisition)
+                    for acquisition_id in completed_ids:
+                        logger.info(f"Acquisition finished: {acquisition_id}")
+                        imc_writer.write_acquisition(
+                            acquisition_id, imc_writer.output_folder, xml_metadata=mcd_xml, manifest=manifest
+                        )
+                        imc_writer.write_acquisition_artifacts(acquisition_id)
+
+                size = mcd_file.stat().st_size
+                if size != last_size:
+                    last_size = size
+                    last_change = timeit.default_timer()
+                elif idle_timeout is not None and timeit.default_timer() - last_change >= idle_timeout:
+                    break
+                time.sleep(interval)
+        finally:
+            if manifest is not None:
+                imc_writer.finalize_imc_folder(create_zip=False)
+
+
+def select_shard(sizes: Dict[Any, int], shard_index: int, shard_count: int):
+    """Deterministically selects the items of a shard, balancing the total size of all shards.
+
+    Items are assigned largest first to the shard with the smallest total size so far (ties broken by key order), so
+    every node computes the same disjoint assignment.
+
+    Parameters
+    ----------
+    sizes
+        Item sizes by item key.
+    shard_index
+        Shard index (starting at 0).
+    shard_count
+        Number of shards.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index}/{shard_count}")
+    loads = [0] * shard_count
+    selected = []
+    for key in sorted(sizes.keys(), key=lambda k: (-sizes[k], str(k))):
+        i = loads.index(min(loads))
+        loads[i] += sizes[key]
+        if i == shard_index:
+            selected.append(key)
+    return sorted(selected, key=str)
+
+
+class BatchConversionSummary:
+    """Summary of a batch conversion of many MCD files."""
+
+    def __init__(self):
+        self.converted: List[str] = []
+        self.failed: Dict[str, List[str]] = dict()
+        self.n_acquisitions = 0
+        self.n_skipped_acquisitions = 0
+        self.n_bytes = 0
+        self.elapsed = 0.0
+
+    def add_failure(self, source: Union[str, Path], error: str):
+        """Record an error of a raw data file, keeping the errors of all its failed acquisitions."""
+        self.failed.setdefault(str(source), []).append(error)
+
+    @property
+    def throughput(self):
+        """Converted raw data throughput (in MB/s)"""
+        return self.n_bytes / 1e6 / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        lines = [
+            f"Converted files: {len(self.converted)}, failed files: {len(self.failed)}",
+            f"Converted acquisitions: {self.n_acquisitions}, skipped acquisitions: {self.n_skipped_acquisitions}",
+            f"Raw data: {self.n_bytes / 1e6:.1f} MB in {self.elapsed:.1f} s ({self.throughput:.1f} MB/s)",
+        ]
+        lines += [f"Failed: {source} ({error})" for source, errors in self.failed.items() for error in errors]
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(converted={len(self.converted)}, failed={len(self.failed)}, "
+            f"throughput={self.throughput:.1f})"
+        )
+
+
+def mcdfiles_to_imcfolders(
+    inputs: Union[str, Path, Sequence[Union[str, Path]]],
+    output_folder: Union[str, Path],
+    create_zip: bool = False,
+    parse_txt: bool = False,
+    resume: bool = True,
+    n_workers: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+    shard: Optional[Tuple[int, int]] = None,
+):
+    """Converts many MCD files (or zipped raw data folders) to IMC folders using a pool of worker processes.
+
+    Acquisitions of all MCD files are converted in parallel, largest first. A failure in one file is logged and
+    reported in the returned summary, but doesn't stop the conversion of the others.
+
+    Parameters
+    ----------
+    inputs
+        Folder that is searched recursively for .mcd and .zip raw data files, or a list of such files.
+    output_folder
+        Path to the output folder.
+    create_zip
+        Whether to create an output as .zip file.
+    parse_txt
+        Always use TXT files if present to get acquisition image data.
+    resume
+        Skip acquisitions already converted by a previous (interrupted) run, as recorded in the conversion manifest.
+    n_workers
+        Number of worker processes (defaults to the number of CPUs).
+    memory_budget
+        Approximate memory budget per worker (in bytes). Tasks are only started while the estimated memory usage of
+        all running tasks stays within `n_workers * memory_budget`; larger tasks run alone.
+    shard
+        Shard index and number of shards (index starts at 0). Only the raw data files of the given shard are converted.
+    """
+    tic = timeit.default_timer()
+
+    if isinstance(output_folder, str):
+        output_folder = Path(output_folder)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    max_running_bytes = n_workers * memory_budget if memory_budget is not None else None
+
+    summary = BatchConversionSummary()
+    jobs: Dict[Path, _McdJob] = dict()
+    tasks: List[Tuple[int, Path, Optional[int]]] = []
+    sources = _find_raw_data_files(inputs)
+    if shard is not None:
+        sources = select_shard({source: source.stat().st_size for source in sources}, *shard)
+    for source in sources:
+        if source.suffix == ZIP_FILENDING:
+            tasks.append((source.stat().st_size, source, None))
+            continue
+        try:
+            job = _McdJob(source, output_folder, parse_txt, resume)
+        except Exception as e:
+            logger.exception(f"Error in {source}")
+            summary.add_failure(source, str(e))
+            continue
+        for acquisition in job.writer.mcd_parser.session.acquisitions.values():
+            output_path = job.writer.output_folder / (acquisition.metaname + OME_TIFF_SUFFIX)
+            if job.manifest.is_complete(acquisition.id, output_path):
+                job.manifest.restore(acquisition)
+                summary.n_skipped_acquisitions += 1
+            else:
+                tasks.append((_get_acquisition_data_size(acquisition), source, acquisition.id))
+                job.pending.add(acquisition.id)
+        jobs[source] = job
+        if len(job.pending) == 0:
+            job.finalize(create_zip, summary)
+
+    queue = sorted(tasks, key=lambda t: t[0], reverse=True)
+    with ProcessPoolExecutor(n_workers) as executor:
+        running: Dict[Future, Tuple[int, Path, Optional[int]]] = dict()
+        running_bytes = 0
+        while len(queue) > 0 or len(running) > 0:
+            while len(queue) > 0 and len(running) < n_workers:
+                index = 0
+                if max_running_bytes is not None:
+                    # Largest task that still fits into the memory budget (tasks are sorted by size)
+                    free_bytes = max_running_bytes - running_bytes
+                    index = next(
+                        (i for i, t in enumerate(queue) if t[0] * _MEMORY_PER_DATA_BYTE <= free_bytes),
+                        0 if len(running) == 0 else None,
+                    )
+                    if index is None:
+                        break
+                task = queue.pop(index)
+                size, source, acquisition_id = task
+                if acquisition_id is None:
+                    future = executor.submit(_convert_zip, source, output_folder, create_zip, parse_txt, resume)
+                else:
+                    job = jobs[source]
+                    txt_file = job.txt_acquisitions_map.get(acquisition_id) if job.txt_acquisitions_map else None
+                    future = executor.submit(
+                        _convert_acquisition, source, acquisition_id, output_folder, parse_txt, txt_file
+                    )
+                running[future] = task
+                running_bytes += size * _MEMORY_PER_DATA_BYTE
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                size, source, acquisition_id = running.pop(future)
+                running_bytes -= size * _MEMORY_PER_DATA_BYTE
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    logger.error(f"Error in {source} (acquisition: {acquisition_id}): {e}")
+                    if acquisition_id is None:
+                        summary.add_failure(source, str(e))
+                        continue
+                    summary.add_failure(source, f"acquisition {acquisition_id}: {e}")
+                    jobs[source].failed = True
+                else:
+                    summary.n_bytes += size
+                    if acquisition_id is None:
+                        summary.converted.append(str(source))
+                        continue
+                    jobs[source].complete(acquisition_id, entry)
+                    summary.n_acquisitions += 1
+                job = jobs[source]
+                job.pending.discard(acquisition_id)
+                if len(job.pending) == 0:
+                    job.finalize(create_zip, summary)
+
+    summary.elapsed = timeit.default_timer() - tic
+    logger.info(f"Batch conversion finished:\n{summary}")
+    return summary
+
+
+class _McdJob:
+    """Conversion state of a single MCD file in a batch conversion (lives in the main process)."""
+
+    def __init__(self, mcd_file: Path, output_folder: Path, parse_txt: bool, resume: bool):
+        mcd_parser = _open_mcd_parser(mcd_file)
+        try:
+            # TXT files can only be assigned to acquisitions if the MCD file is the only one in its folder
+            mcd_files = [f for f in mcd_file.parent.glob(f"*{MCD_FILENDING}") if not f.name.startswith(".")]
+            self.txt_acquisitions_map = _get_txt_acquisitions_map(mcd_file.parent) if len(mcd_files) == 1 else None
+            self.writer = ImcWriter(output_folder, mcd_parser, self.txt_acquisitions_map, parse_txt)
+            self.manifest = self.writer.prepare_imc_folder(resume=resume)
+        except Exception:
+            mcd_parser.close()
+            raise
+        self.mcd_file = mcd_file
+        self.pending: Set[int] = set()
+        self.failed = False
+
+    def complete(self, acquisition_id: int, entry: Optional[Dict[str, Any]]):
+        """Apply the result of a worker to the session and the manifest."""
+        acquisition = self.writer.mcd_parser.session.acquisitions.get(acquisition_id)
+        if entry is None:
+            acquisition.is_valid = False
+        else:
+            self.manifest.add_entry(acquisition_id, entry)
+            self.manifest.restore(acquisition)
+
+    def finalize(self, create_zip: bool, summary: BatchConversionSummary):
+        """Write session files once all acquisitions are converted."""
+        try:
+            if not self.failed:
+                self.writer.finalize_imc_folder(create_zip=create_zip)
+                summary.converted.append(str(self.mcd_file))
+        except Exception as e:
+            logger.exception(f"Error in {self.mcd_file}")
+            summary.add_failure(self.mcd_file, str(e))
+        finally:
+            self.writer.mcd_parser.close()
+
+
+def _convert_acquisition(
+    mcd_file: Path, acquisition_id: int, output_folder: Path, parse_txt: bool, txt_file: Optional[str]
+):
+    """Worker task: write a single acquisition and return its manifest entry (None for invalid acquisitions)."""
+    mcd_parser = _worker_parsers.pop(mcd_file, None)
+    if mcd_parser is None:
+        mcd_parser = _open_mcd_parser(mcd_file)
+        if len(_worker_parsers) >= _MAX_WORKER_PARSERS:
+            _worker_parsers.popitem(last=False)[1].close()
+    _worker_parsers[mcd_file] = mcd_parser
+
+    txt_acquisitions_map = {acquisition_id: txt_file} if txt_file is not None else None
+    imc_writer = ImcWriter(output_folder, mcd_parser, txt_acquisitions_map, parse_txt)
+    imc_writer.write_acquisition(acquisition_id, imc_writer.output_folder, xml_metadata=mcd_parser.get_mcd_xml())
+    acquisition = mcd_parser.session.acquisitions.get(acquisition_id)
+    if not acquisition.is_valid:
+        return None
+    output_path = imc_writer.output_folder / (acquisition.metaname + OME_TIFF_SUFFIX)
+    return ConversionManifest.create_entry(acquisition, output_path)
+
+
+def _convert_zip(input: Path, output_folder: Path, create_zip: bool, parse_txt: bool, resume: bool):
+    """Worker task: convert zipped raw data folder."""
+    mcdfolder_to_imcfolder(input, output_folder, create_zip=create_zip, parse_txt=parse_txt, resume=resume)
+
+
+def _find_raw_data_files(inputs: Union[str, Path, Sequence[Union[str, Path]]]):
+    """List .mcd and zipped raw data files from a folder tree and/or a list of files."""
+    if isinstance(inputs, (str, Path)):
+        inputs = [inputs]
+    result: List[Path] = []
+    for item in inputs:
+        item = Path(item)
+        if item.is_dir():
+            for f in sorted(item.rglob("*")):
+                if f.name.startswith(".") or f.name.endswith(IMC_ZIP_SUFFIX):
+                    continue
+                if f.suffix in (MCD_FILENDING, ZIP_FILENDING):
+                    result.append(f)
+        else:
+            result.append(item)
+    return result
+
+
+def _get_acquisition_data_size(acquisition: Acquisition):
+    """Size of raw acquisition data in MCD file (in bytes)."""
+    try:
+        start_offset = int(acquisition.metadata.get(const.DATA_START_OFFSET))
+        end_offset = int(acquisition.metadata.get(const.DATA_END_OFFSET))
+        return max(end_offset - start_offset + 1, 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+@contextmanager
+def open_raw_data(input: Union[str, Path]):
+    """Open the single MCD file of a raw data folder (or zipped folder), yielding its parser and TXT files map.
+
+    Zipped folders are extracted into a temporary folder, which is removed again together with the parser on exit.
+
+    Parameters
+    ----------
+    input
+        Input folder / .zip file with raw .mcd/.txt acquisition data files.
     """
     if isinstance(input, str):
         input = Path(input)
@@ -46,22 +531,8 @@ def mcdfolder_to_imcfolder(
         mcd_files = [f for f in mcd_files if not f.name.startswith(".")]
         assert len(mcd_files) == 1
         input_folder = mcd_files[0].parent
-        schema_files = glob.glob(str(input_folder / f"*{SCHEMA_FILENDING}"))
-        schema_file = schema_files[0] if len(schema_files) > 0 else None
-        try:
-            mcd_parser = McdParser(mcd_files[0])
-        except:
-            if schema_file is not None:
-                logging.error("MCD file is corrupted, trying to rescue with schema file")
-                mcd_parser = McdParser(mcd_files[0], xml_metadata_filepath=schema_file)
-            else:
-                raise
-
-        txt_files = glob.glob(str(input_folder / f"*[0-9]{TXT_FILE_EXTENSION}"))
-        txt_acquisitions_map = {TxtParser.extract_acquisition_id(f): f for f in txt_files}
-
-        imc_writer = ImcWriter(output_folder, mcd_parser, txt_acquisitions_map, parse_txt)
-        imc_writer.write_imc_folder(create_zip=create_zip)
+        mcd_parser = _open_mcd_parser(mcd_files[0])
+        yield mcd_parser, _get_txt_acquisitions_map(input_folder)
     finally:
         if mcd_parser is not None:
             mcd_parser.close()
@@ -69,9 +540,26 @@ def mcdfolder_to_imcfolder(
             tmpdir.cleanup()
 
 
-if __name__ == "__main__":
-    import timeit
+def _open_mcd_parser(mcd_file: Path):
+    """Open MCD file, trying to rescue corrupted files with a schema file from the same folder."""
+    schema_files = glob.glob(str(mcd_file.parent / f"*{SCHEMA_FILENDING}"))
+    schema_file = schema_files[0] if len(schema_files) > 0 else None
+    try:
+        return McdParser(mcd_file)
+    except Exception:
+        if schema_file is not None:
+            logging.error("MCD file is corrupted, trying to rescue with schema file")
+            return McdParser(mcd_file, xml_metadata_filepath=schema_file)
+        raise
+
 
+def _get_txt_acquisitions_map(input_folder: Path):
+    """Map acquisition IDs to raw TXT files in the folder."""
+    txt_files = glob.glob(str(input_folder / f"*[0-9]{TXT_FILE_EXTENSION}"))
+    return {TxtParser.extract_acquisition_id(f): f for f in txt_files}
+
+
+if __name__ == "__main__":
     tic = timeit.default_timer()
 
     mcdfolder_to_imcfolder(
@@ -1,11 +1,13 @@
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, Sequence, Tuple, Type, Union
+from typing import List, Optional, Sequence, Tuple, Type, Union
 
 import numpy as np
 import pandas as pd
 
+from imctools.data.acquisitiondata import AcquisitionData
 from imctools.io.ometiff.ometiffparser import OmeTiffParser
 
 logger = logging.getLogger(__name__)
@@ -30,11 +32,28 @@ def get_metals_from_panel(
     sort_channels
         Whether to sort channels by mass.
     """
+    panel = pd.read_csv(panel_csv_file) if panel_csv_file is not None else None
+    return get_metals(panel, usedcolumn, metalcolumn, sort_channels)
+
+
+def get_metals(panel: Optional[pd.DataFrame], usedcolumn: str, metalcolumn: str, sort_channels: bool):
+    """Get list of metals from an already parsed panel and a boolean column.
+
+    Parameters
+    ----------
+    panel
+        Panel table (all channels are used if None).
+    usedcolumn
+        Column that should contain booleans (0, 1) if the channel should be used, i.e. "ilastik".
+    metalcolumn
+        Column name of the metal names.
+    sort_channels
+        Whether to sort channels by mass.
+    """
     metals = None
 
-    if panel_csv_file is not None:
+    if panel is not None:
 
-        panel = pd.read_csv(panel_csv_file)
         if panel.shape[1] > 1:
             selected = panel[usedcolumn]
             assert selected.isin((0, 1)).all(), f"Values in 'usedcolumn' column should contain only 0/1"
@@ -97,22 +116,7 @@ def omefile_2_analysisfolder(
         output_folder.mkdir(parents=True, exist_ok=True)
 
     metals = get_metals_from_panel(panel_csv_file, usedcolumn, metalcolumn, sort_channels)
-
-    ome = OmeTiffParser(filename)
-    acquisition_data = ome.get_acquisition_data()
-
-    acquisition_data.save_tiff(
-        output_folder / (basename + ".tiff"), names=metals, imagej=True, bigtiff=bigtiff, dtype=dtype
-    )
-
-    if metals is not None:
-        savenames = metals
-    else:
-        savenames = [s for s in acquisition_data.channel_names]
-
-    with open(output_folder / (basename + ".csv"), "w") as f:
-        for n in savenames:
-            f.write(n + "\n")
+    _omefile_to_analysis_stacks(filename, output_folder, [(basename, metals)], bigtiff, dtype)
 
 
 def omefolder_to_analysisfolder(
@@ -122,6 +126,7 @@ def omefolder_to_analysisfolder(
     analysis_stacks: Sequence[Tuple[str, str]],
     metalcolumn: str = "Metal Tag",
     dtype=np.uint16,
+    n_workers: Optional[int] = None,
 ):
     """Convert OME tiffs to analysis tiffs that are more compatible with tools. A CSV with a boolean column can be used to select subsets of channels or metals from the stack. The channels of the tiff will have the same order as in the csv.'
 
@@ -139,6 +144,9 @@ def omefolder_to_analysisfolder(
         Column name of the metal names.
     dtype
         Output numpy dtype
+    n_workers
+        Number of worker processes (defaults to the number of CPUs). Each OME-TIFF file is read only once, all
+        analysis stacks are written from the same image data.
     """
     if isinstance(input_folder, str):
         input_folder = Path(input_folder)
@@ -148,26 +156,84 @@ def omefolder_to_analysisfolder(
     if not output_folder.exists():
         output_folder.mkdir(parents=True, exist_ok=True)
 
-    for fol in os.listdir(input_folder):
-        sub_fol = input_folder / fol
-        for img in os.listdir(sub_fol):
-            if not img.endswith(".ome.tiff"):
-                continue
-            basename = img.rstrip(".ome.tiff")
-            for (col, suffix, *_) in analysis_stacks:
-                try:
-                    omefile_2_analysisfolder(
-                        sub_fol / img,
-                        output_folder,
-                        basename + suffix,
-                        panel_csv_file=panel_csv_file,
-                        metalcolumn=metalcolumn,
-                        usedcolumn=col,
-                        bigtiff=False,
-                        dtype=dtype,
-                    )
-                except:
-                    logger.exception("Error in {}".format(img))
+    # Panel is parsed once per run
+    panel = pd.read_csv(panel_csv_file) if panel_csv_file is not None else None
+    stacks = [(suffix, get_metals(panel, col, metalcolumn, True)) for (col, suffix, *_) in analysis_stacks]
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(n_workers) as executor:
+        futures = dict()
+        for fol in os.listdir(input_folder):
+            sub_fol = input_folder / fol
+            for img in os.listdir(sub_fol):
+                if not img.endswith(".ome.tiff"):
+                    continue
+                basename = img.rstrip(".ome.tiff")
+                image_stacks = [(basename + suffix, metals) for suffix, metals in stacks]
+                future = executor.submit(
+                    _omefile_to_analysis_stacks, sub_fol / img, output_folder, image_stacks, False, dtype
+                )
+                futures[future] = img
+        for future, img in futures.items():
+            try:
+                future.result()
+            except:
+                logger.exception("Error in {}".format(img))
+
+
+def _omefile_to_analysis_stacks(
+    filename: Path,
+    output_folder: Path,
+    stacks: Sequence[Tuple[str, Optional[List[str]]]],
+    bigtiff: bool,
+    dtype: Optional[Type],
+):
+    """Read OME-TIFF file once and write all analysis stacks, defined as (basename, metals) tuples, from it."""
+    ome = OmeTiffParser(filename, calculate_intensity_range=False)
+    acquisition_data = ome.get_acquisition_data()
+
+    for basename, metals in stacks:
+        write_analysis_stack(acquisition_data, output_folder, basename, metals, bigtiff, dtype)
+
+
+def write_analysis_stack(
+    acquisition_data: AcquisitionData,
+    output_folder: Path,
+    basename: str,
+    metals: Optional[List[str]],
+    bigtiff: bool,
+    dtype: Optional[Type],
+):
+    """Write analysis stack with the selected metals (`basename`.tiff) and the list of its channels (`basename`.csv).
+
+    Parameters
+    ----------
+    acquisition_data
+        Acquisition data.
+    output_folder
+        Output folder.
+    basename
+        Basename of the output files.
+    metals
+        Metals of the analysis stack (all channels if None).
+    bigtiff
+        Whether to save TIFF files in BigTIFF format.
+    dtype
+        Output numpy dtype.
+    """
+    acquisition_data.save_tiff(
+        output_folder / (basename + ".tiff"), names=metals, imagej=True, bigtiff=bigtiff, dtype=dtype
+    )
+
+    if metals is not None:
+        savenames = metals
+    else:
+        savenames = [s for s in acquisition_data.channel_names]
+
+    with open(output_folder / (basename + ".csv"), "w") as f:
+        for n in savenames:
+            f.write(n + "\n")
 
 
 if __name__ == "__main__":
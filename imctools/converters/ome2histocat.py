@@ -1,17 +1,23 @@
+import bisect
 import glob
 import logging
 import os
-import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, Union
+from typing import List, Optional, Union
 
 from imctools.io.ometiff.ometiffparser import OmeTiffParser
+from imctools.io.utils import link_or_copy_file
 
 logger = logging.getLogger(__name__)
 
 
 def omefile_to_tifffolder(
-    filepath: Union[str, Path], output_folder: Union[str, Path], basename: str = None, dtype: Optional[object] = None
+    filepath: Union[str, Path],
+    output_folder: Union[str, Path],
+    basename: str = None,
+    dtype: Optional[object] = None,
+    n_writers: Optional[int] = None,
 ):
     """Saves planes of single OME-TIFF file to a folder containing standard TIFF (ImageJ-compatible) files.
 
@@ -25,6 +31,8 @@ def omefile_to_tifffolder(
         Basename for generated output files.
     dtype
         Output numpy format.
+    n_writers
+        Number of writer threads.
     """
     if isinstance(output_folder, str):
         output_folder = Path(output_folder)
@@ -34,7 +42,7 @@ def omefile_to_tifffolder(
 
     with OmeTiffParser(filepath) as parser:
         acquisition_data = parser.get_acquisition_data()
-        acquisition_data.save_tiffs(output_folder, basename=basename, dtype=dtype)
+        acquisition_data.save_tiffs(output_folder, basename=basename, dtype=dtype, n_writers=n_writers)
 
 
 def omefile_to_histocatfolder(
@@ -42,6 +50,7 @@ def omefile_to_histocatfolder(
     base_folder: Union[str, Path],
     mask_file: Optional[Union[str, Path]] = None,
     dtype: Optional[object] = None,
+    n_writers: Optional[int] = None,
 ):
     """Converts single OME-TIFF file to a folder compatible with HistoCAT software.
 
@@ -55,6 +64,8 @@ def omefile_to_histocatfolder(
         Path to mask file.
     dtype
         Output numpy format.
+    n_writers
+        Number of writer threads.
     """
     if isinstance(filepath, str):
         filepath = Path(filepath)
@@ -64,11 +75,11 @@ def omefile_to_histocatfolder(
 
     basename = filepath.name.rstrip(".ome.tiff")
     output_folder = base_folder / basename
-    omefile_to_tifffolder(filepath, output_folder, basename="", dtype=dtype)
+    omefile_to_tifffolder(filepath, output_folder, basename="", dtype=dtype, n_writers=n_writers)
     if mask_file is not None:
         if isinstance(mask_file, str):
             mask_file = Path(mask_file)
-        shutil.copy2(mask_file, output_folder)
+        link_or_copy_file(mask_file, output_folder / mask_file.name)
 
 
 def omefolder_to_histocatfolder(
@@ -77,6 +88,8 @@ def omefolder_to_histocatfolder(
     mask_folder: Optional[Union[str, Path]] = None,
     mask_suffix="_mask.tiff",
     dtype: Optional[object] = None,
+    n_writers: Optional[int] = None,
+    n_workers: Optional[int] = None,
 ):
     """Converts all OME-TIFF files in input folder to a folder compatible with HistoCAT software.
 
@@ -92,6 +105,11 @@ def omefolder_to_histocatfolder(
         Mask suffix.
     dtype
         Output numpy format.
+    n_writers
+        Number of writer threads per OME-TIFF file (defaults to the number of CPUs divided among the worker processes,
+        so that up to n_workers x n_writers files are written at once).
+    n_workers
+        Number of worker processes (defaults to the number of CPUs).
     """
     if isinstance(input_folder, Path):
         input_folder = str(input_folder)
@@ -101,22 +119,47 @@ def omefolder_to_histocatfolder(
 
     ome_files = [os.path.basename(fn) for fn in glob.glob(os.path.join(input_folder, "*")) if fn.endswith(".ome.tiff")]
     if mask_folder is not None:
-        fn_masks = [
+        fn_masks = sorted(
             os.path.basename(fn) for fn in glob.glob(os.path.join(mask_folder, "*")) if fn.endswith(mask_suffix)
-        ]
+        )
     else:
         fn_masks = []
 
-    for fn_ome in ome_files:
-        len_suffix = len(".ome.tiff")
-        basename_ome = fn_ome[:-len_suffix]
-        cur_mask = [fn for fn in fn_masks if fn.startswith(basename_ome)]
-        if len(cur_mask) > 0:
-            mask_file = os.path.join(mask_folder, cur_mask[0])
-        else:
-            mask_file = None
-        path_ome = os.path.join(input_folder, fn_ome)
-        omefile_to_histocatfolder(path_ome, output_folder, mask_file=mask_file, dtype=dtype)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_writers is None:
+        n_writers = max(1, (os.cpu_count() or 1) // n_workers)
+    with ProcessPoolExecutor(n_workers) as executor:
+        futures = []
+        for fn_ome in ome_files:
+            len_suffix = len(".ome.tiff")
+            basename_ome = fn_ome[:-len_suffix]
+            cur_mask = _find_by_prefix(fn_masks, basename_ome)
+            if cur_mask is not None:
+                mask_file = os.path.join(mask_folder, cur_mask)
+            else:
+                mask_file = None
+            path_ome = os.path.join(input_folder, fn_ome)
+            futures.append(
+                executor.submit(
+                    omefile_to_histocatfolder,
+                    path_ome,
+                    output_folder,
+                    mask_file=mask_file,
+                    dtype=dtype,
+                    n_writers=n_writers,
+                )
+            )
+        for future in futures:
+            future.result()
+
+
+def _find_by_prefix(sorted_names: List[str], prefix: str):
+    """Find first name starting with prefix in a sorted list of names (binary search), or None."""
+    i = bisect.bisect_left(sorted_names, prefix)
+    if i < len(sorted_names) and sorted_names[i].startswith(prefix):
+        return sorted_names[i]
+    return None
 
 
 if __name__ == "__main__":
@@ -3,18 +3,29 @@ import logging
 import os
 import re
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Sequence, Union
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import tifffile
 
 from imctools.data import Session
 from imctools.io.mcd.mcdxmlparser import McdXmlParser
 from imctools.io.ometiff.ometiffparser import OmeTiffParser
-from imctools.io.utils import OME_TIFF_SUFFIX, SCHEMA_XML_SUFFIX, SESSION_JSON_SUFFIX
+from imctools.io.utils import OME_TIFF_SUFFIX, SCHEMA_XML_SUFFIX, SESSION_JSON_SUFFIX, link_or_copy_file
 
 logger = logging.getLogger(__name__)
 
+TRANSFER_MODES = ("copy", "link", "move")
+
 
-def v1_to_v2(input_folder: Union[str, Path], output_folder: Union[str, Path]):
+def v1_to_v2(
+    input_folder: Union[str, Path],
+    output_folder: Union[str, Path],
+    transfer_mode: str = "copy",
+    n_workers: Optional[int] = None,
+):
     """Converts IMC folder from v1 to v2 format.
 
     Parameters
@@ -23,7 +34,16 @@ def v1_to_v2(input_folder: Union[str, Path], output_folder: Union[str, Path]):
         Input folder (with IMC v1 data).
     output_folder
         Output folder.
+    transfer_mode
+        How files are transferred to the output folder: "copy" (regular copy), "link" (hardlink, reflink or in-kernel
+        copy where the filesystem allows it, regular copy otherwise) or "move" (files are removed from the input
+        folder, a rename within the same filesystem).
+    n_workers
+        Number of worker processes calculating channel intensity ranges (defaults to the number of CPUs).
     """
+    if transfer_mode not in TRANSFER_MODES:
+        raise ValueError(f"Unsupported transfer mode: {transfer_mode}")
+
     if isinstance(input_folder, str):
         input_folder = Path(input_folder)
 
@@ -46,54 +66,74 @@ def v1_to_v2(input_folder: Union[str, Path], output_folder: Union[str, Path]):
     session = xml_parser.session
 
     # Copy schema file
-    _copy_files([schema_file], output_folder)
+    _copy_files([schema_file], output_folder, transfer_mode=transfer_mode)
 
     # Copy slide images
     slide_files = glob.glob(str(input_folder / f"*_slide.*"))
-    _copy_files(slide_files, output_folder)
+    _copy_files(slide_files, output_folder, transfer_mode=transfer_mode)
 
     # Copy panorama images
     panorama_files = glob.glob(str(input_folder / f"*_pano.*"))
-    _copy_files(panorama_files, output_folder)
+    _copy_files(panorama_files, output_folder, transfer_mode=transfer_mode)
 
     # Copy before ablation images
     before_ablation_files = glob.glob(str(input_folder / f"*_before.*"))
-    _copy_files(before_ablation_files, output_folder, fix_names=True)
+    _copy_files(before_ablation_files, output_folder, fix_names=True, transfer_mode=transfer_mode)
 
     # Copy after ablation images
     after_ablation_files = glob.glob(str(input_folder / f"*_after.*"))
-    _copy_files(after_ablation_files, output_folder, fix_names=True)
+    _copy_files(after_ablation_files, output_folder, fix_names=True, transfer_mode=transfer_mode)
 
     # Copy OME-TIFF acquisition files
     ome_tiff_files = glob.glob(str(input_folder / f"*{OME_TIFF_SUFFIX}"))
-    session = _calculate_min_max_intensities(ome_tiff_files, session)
+    session = _calculate_min_max_intensities(ome_tiff_files, session, n_workers=n_workers)
     session.save(os.path.join(output_folder, session.metaname + SESSION_JSON_SUFFIX))
-    _copy_files(ome_tiff_files, output_folder, fix_names=True)
+    _copy_files(ome_tiff_files, output_folder, fix_names=True, transfer_mode=transfer_mode)
 
 
-def _calculate_min_max_intensities(filenames: Sequence[Union[str, Path]], session: Session):
+def _calculate_min_max_intensities(
+    filenames: Sequence[Union[str, Path]], session: Session, n_workers: Optional[int] = None
+):
     """Calculate min and max intensity of each channel."""
-    for fn in filenames:
-        with OmeTiffParser(fn) as parser:
-            ac_data = parser.get_acquisition_data()
-            acquisition = session.acquisitions.get(ac_data.acquisition.id)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(n_workers) as executor:
+        results = executor.map(_get_intensity_ranges, filenames)
+        for acquisition_id, intensity_ranges in results:
+            acquisition = session.acquisitions.get(acquisition_id)
             if acquisition:
                 for channel in acquisition.channels.values():
-                    img = ac_data.get_image_by_name(channel.name)
-                    session.channels[channel.id].min_intensity = round(float(img.min()), 4)
-                    session.channels[channel.id].max_intensity = round(float(img.max()), 4)
+                    intensity_range = intensity_ranges.get(channel.name)
+                    if intensity_range is not None:
+                        session.channels[channel.id].min_intensity = intensity_range[0]
+                        session.channels[channel.id].max_intensity = intensity_range[1]
     return session
 
 
-def _copy_files(filenames: Sequence[Union[str, Path]], output_folder: Path, fix_names=False):
+def _get_intensity_ranges(filename: Union[str, Path]) -> Tuple[int, Dict[str, Tuple[float, float]]]:
+    """Channel intensity ranges of an OME-TIFF file, decoded page by page (one channel image in memory at a time)."""
+    with tifffile.TiffFile(filename) as tif:
+        _, channel_names, _, _ = OmeTiffParser._parse_ome_xml(tif.pages[0].description)
+        intensity_ranges = dict()
+        for name, page in zip(channel_names, tif.pages):
+            img = page.asarray()
+            intensity_ranges[name] = (round(float(np.min(img)), 4), round(float(np.max(img)), 4))
+    return OmeTiffParser.extract_acquisition_id(filename), intensity_ranges
+
+
+def _copy_files(filenames: Sequence[Union[str, Path]], output_folder: Path, fix_names=False, transfer_mode="copy"):
     for fn in filenames:
         if os.path.exists(fn):
-            dst = output_folder
+            name = Path(fn).name
             if fix_names:
-                name = Path(fn).name
-                new_name = re.sub(r"_p\d+_r\d+", "", name)
-                dst = output_folder / new_name
-            shutil.copy2(fn, dst)
+                name = re.sub(r"_p\d+_r\d+", "", name)
+            dst = output_folder / name
+            if transfer_mode == "link":
+                link_or_copy_file(fn, dst)
+            elif transfer_mode == "move":
+                shutil.move(fn, dst)
+            else:
+                shutil.copy2(fn, dst)
 
 
 if __name__ == "__main__":
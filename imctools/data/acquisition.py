@@ -2,12 +2,13 @@ import logging
 import sys
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Optional, Sequence
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
 
-from dateutil.parser import parse
+import numpy as np
 
-from imctools.data.channel import Channel
+from imctools.data.channel import Channel, ChannelDict
 from imctools.data.slide import Slide
+from imctools.io.utils import parse_timestamp
 
 if sys.version_info >= (3, 8):
     from typing import TypedDict  # pylint: disable=no-name-in-module
@@ -53,11 +54,106 @@ class AcquisitionDict(TypedDict):
     is_valid: bool
 
 
+class ChannelTable(NamedTuple):
+    """Columnar table of acquisition channels (in channel order) with lookup indexes."""
+
+    ids: np.ndarray
+    order_numbers: np.ndarray
+    masses: np.ndarray
+    names: Tuple[str, ...]
+    labels: Tuple[str, ...]
+    mass_names: Tuple[str, ...]
+    name_index: Dict[str, int]
+    label_index: Dict[str, int]
+    mass_index: Dict[str, int]
+
+    @staticmethod
+    def from_channels(channels: Sequence[Channel]):
+        """Build channel table from a sequence of channels"""
+        names = tuple(c.name for c in channels)
+        labels = tuple(c.label for c in channels)
+        mass_names = tuple("".join([n for n in name if n.isdigit()]) for name in names)
+        return ChannelTable(
+            ids=np.array([c.id for c in channels], dtype=np.int64),
+            order_numbers=np.array([c.order_number for c in channels], dtype=np.int64),
+            masses=np.array([int(m) if m else -1 for m in mass_names], dtype=np.int64),
+            names=names,
+            labels=labels,
+            mass_names=mass_names,
+            name_index=ChannelTable._index(names),
+            label_index=ChannelTable._index(labels),
+            mass_index=ChannelTable._index(mass_names),
+        )
+
+    @staticmethod
+    def _index(values: Sequence[str]):
+        """Value to index map, the last index wins for duplicate values (e.g. isobaric masses such as In115 and
+        Sn115)"""
+        index = dict()
+        for i, v in enumerate(values):
+            index[v] = i
+        return index
+
+
+class _ChannelMap(dict):
+    """Channels dictionary that invalidates the channel table of its acquisition when modified."""
+
+    __slots__ = ("_acquisition",)
+
+    def __init__(self, acquisition: "Acquisition", *args, **kwargs):
+        self._acquisition = acquisition
+        super().__init__(*args, **kwargs)
+
+    def _invalidate(self):
+        # Unpickling sets items before the slots are restored
+        acquisition = getattr(self, "_acquisition", None)
+        if acquisition is not None:
+            acquisition.invalidate_channel_table()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._invalidate()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._invalidate()
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._invalidate()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self._invalidate()
+        return result
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self._invalidate()
+        return result
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._invalidate()
+
+    def clear(self):
+        super().clear()
+        self._invalidate()
+
+
 class Acquisition:
     """IMC acquisition as a collection of acquisition channels."""
 
     symbol = "a"
 
+    __slots__ = tuple(k for k in AcquisitionDict.__annotations__.keys() if k != "metadata") + (
+        "_metadata",
+        "slide",
+        "_channels",
+        "_channel_table",
+    )
+
     def __init__(
         self,
         slide_id: int,
@@ -165,6 +261,7 @@ class Acquisition:
         self.is_valid = is_valid
 
         self.slide: Optional[Slide] = None
+        self._channel_table: Optional[ChannelTable] = None
         self.channels: Dict[int, Channel] = dict()
 
     @staticmethod
@@ -181,8 +278,8 @@ class Acquisition:
             segment_data_format=d.get("segment_data_format"),
             ablation_frequency=d.get("ablation_frequency"),
             ablation_power=d.get("ablation_power"),
-            start_timestamp=parse(d.get("start_timestamp")),
-            end_timestamp=parse(d.get("end_timestamp")),
+            start_timestamp=parse_timestamp(d.get("start_timestamp")),
+            end_timestamp=parse_timestamp(d.get("end_timestamp")),
             movement_type=d.get("movement_type"),
             ablation_distance_between_shots_x=d.get("ablation_distance_between_shots_x"),
             ablation_distance_between_shots_y=d.get("ablation_distance_between_shots_y"),
@@ -199,6 +296,40 @@ class Acquisition:
         )
         return result
 
+    @property
+    def metadata(self):
+        """Original (raw) metadata as a dictionary"""
+        if self._metadata is None:
+            session = self.slide.session if self.slide is not None else None
+            if session is not None:
+                self._metadata = session.get_entity_metadata("acquisitions", self.id) or dict()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+
+    @property
+    def channels(self) -> Dict[int, Channel]:
+        """Acquisition channels by channel ID (in channel order)"""
+        return self._channels
+
+    @channels.setter
+    def channels(self, value: Dict[int, Channel]):
+        self._channels = _ChannelMap(self, value)
+        self._channel_table = None
+
+    @property
+    def channel_table(self):
+        """Columnar channel table, rebuilt after channels have changed"""
+        if self._channel_table is None:
+            self._channel_table = ChannelTable.from_channels(list(self._channels.values()))
+        return self._channel_table
+
+    def invalidate_channel_table(self):
+        """Drop cached channel table, e.g. after channel names or order numbers have changed"""
+        self._channel_table = None
+
     @property
     def metaname(self):
         """Meta name fully describing the entity"""
@@ -213,43 +344,54 @@ class Acquisition:
     @property
     def channel_names(self):
         """Channel names"""
-        channel_names = [c.name for c in self.channels.values()]
-        return channel_names
+        return list(self.channel_table.names)
 
     @property
     def channel_labels(self):
         """Channel labels"""
-        channel_labels = [c.label for c in self.channels.values()]
-        return channel_labels
+        return list(self.channel_table.labels)
 
     @property
     def channel_masses(self):
         """Channel masses"""
-        return ["".join([n for n in name if n.isdigit()]) for name in self.channel_names]
+        return list(self.channel_table.mass_names)
 
     def get_name_indices(self, names: Sequence[str]):
         """Returns a list with the indices from names"""
-        order_dict = dict()
-        for i, v in enumerate(self.channel_names):
-            order_dict.update({v: i})
-        return [order_dict[n] for n in names]
+        name_index = self.channel_table.name_index
+        return [name_index[n] for n in names]
+
+    def get_label_indices(self, labels: Sequence[str]):
+        """Returns a list with the indices from labels"""
+        label_index = self.channel_table.label_index
+        return [label_index[label] for label in labels]
 
     def get_mass_indices(self, masses: Sequence[str]):
         """Returns the channel indices from the queried mass"""
-        order_dict = dict()
-        for i, v in enumerate(self.channel_masses):
-            order_dict.update({v: i})
-        return [order_dict[m] for m in masses]
+        mass_index = self.channel_table.mass_index
+        return [mass_index[m] for m in masses]
 
     def __getstate__(self):
         """Returns dictionary for JSON/YAML serialization"""
-        s = self.__dict__.copy()
+        s = {k: getattr(self, k) for k in AcquisitionDict.__annotations__.keys()}
         s["start_timestamp"] = s["start_timestamp"].isoformat() if s["start_timestamp"] is not None else None
         s["end_timestamp"] = s["end_timestamp"].isoformat() if s["end_timestamp"] is not None else None
-        del s["slide"]
-        del s["channels"]
         return s
 
+    def __reduce__(self):
+        """Pickle (and copy) acquisitions with their channels as serialization dictionaries, without parent slide"""
+        return Acquisition._from_state, (self.__getstate__(), [c.__getstate__() for c in self.channels.values()])
+
+    @staticmethod
+    def _from_state(state: AcquisitionDict, channel_states: Sequence[ChannelDict]):
+        """Recreate an acquisition and its channels from serialization dictionaries"""
+        result = Acquisition.from_dict(state)
+        for channel_state in channel_states:
+            channel = Channel.from_dict(channel_state)
+            channel.acquisition = result
+            result.channels[channel.id] = channel
+        return result
+
     def get_csv_dict(self):
         """Returns dictionary for CSV tables"""
         s = self.__getstate__()
@@ -1,25 +1,84 @@
 import logging
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Sequence, Union
+from tempfile import TemporaryDirectory
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import numpy as np
+import pandas as pd
 import tifffile
 from xtiff import to_tiff
 
 from imctools import __version__
 from imctools.data import Acquisition
+from imctools.data.measurements import DEFAULT_OBJECT_STATS, measure_objects
 from imctools.io.utils import get_ome_xml
 
 logger = logging.getLogger(__name__)
 
 
+class ImageSource:
+    """Lazily readable acquisition image data in (channel, y, x) layout.
+
+    Supports numpy-style indexing, reading only the requested channels and image rows from the data source. Subclasses
+    implement `_read` and set `shape`, `dtype` and `chunks` (the natural read blocks of the data source).
+    """
+
+    shape: Tuple[int, int, int]
+    dtype: np.dtype
+    chunks: Tuple[int, int, int]
+
+    @property
+    def ndim(self):
+        return 3
+
+    def _read(self, channels: List[int], start_row: int, stop_row: int) -> np.ndarray:
+        """Read image rows [start_row, stop_row) of the channels as (channel, y, x) array"""
+        raise NotImplementedError()
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),) * (4 - len(key)) + key[i + 1 :]
+        key = key + (slice(None),) * (3 - len(key))
+        channels, rows, cols = (np.arange(n)[k] for n, k in zip(self.shape, key))
+        if min(np.size(channels), np.size(rows), np.size(cols)) == 0:
+            return np.empty(tuple(np.size(v) for v in (channels, rows, cols) if np.ndim(v) > 0), dtype=self.dtype)
+        start_row = int(np.min(rows))
+        data = self._read(np.atleast_1d(channels).tolist(), start_row, int(np.max(rows)) + 1)
+        if np.ndim(channels) == 0:
+            data = data[0]
+        data = data[..., rows - start_row, :]
+        return data[..., cols]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:, :, :]
+        return data if dtype is None else data.astype(dtype)
+
+
 class AcquisitionData:
     """Container for IMC acquisition binary image data."""
 
-    def __init__(self, acquisition: Acquisition, image_data: np.ndarray):
+    def __init__(
+        self, acquisition: Acquisition, image_data: Optional[np.ndarray], source: Optional[ImageSource] = None
+    ):
+        """
+        Parameters
+        ----------
+        acquisition
+            Acquisition metadata.
+        image_data
+            Binary image data, None to read it from the source on first access.
+        source
+            Lazily readable image data source.
+        """
         self._acquisition = acquisition
         self._image_data = image_data
+        self._source = source
 
     @property
     def acquisition(self):
@@ -29,16 +88,36 @@ class AcquisitionData:
     @property
     def image_data(self):
         """Binary image data as numpy array"""
+        if self._image_data is None and self._source is not None:
+            self._image_data = np.asarray(self._source)
         return self._image_data
 
-    def to_xarray(self):
-        """Get binary image data as xarray"""
+    def to_xarray(self, lazy: bool = False):
+        """Get binary image data as xarray
+
+        Parameters
+        ----------
+        lazy
+            Whether to wrap the image data into a dask array, read in blocks matching the data source layout (MCD file
+            rows, OME-TIFF pages) only when computed.
+        """
         try:
             import xarray as xr
-
-            return xr.DataArray(self._image_data, dims=("channel", "y", "x"), coords={"channel": self.channel_names})
         except ImportError:
             raise ImportError("Please install 'xarray' package first.")
+        data = self.to_dask() if lazy else self.image_data
+        return xr.DataArray(data, dims=("channel", "y", "x"), coords={"channel": self.channel_names})
+
+    def to_dask(self):
+        """Get binary image data as dask array, read in blocks matching the data source layout"""
+        try:
+            import dask.array as da
+        except ImportError:
+            raise ImportError("Please install 'dask' package first.")
+        if self._image_data is None and self._source is not None:
+            return da.from_array(self._source, chunks=self._source.chunks, asarray=True)
+        # Data are already in memory (or memory-mapped), split them into channel planes
+        return da.from_array(self.image_data, chunks=(1, -1, -1), name=False)
 
     @property
     def is_valid(self):
@@ -76,28 +155,39 @@ class AcquisitionData:
 
     def get_image_stack_by_names(self, names: Sequence[str]):
         """Get image stack by channel names"""
-        indices = [self.channel_names.index(name) for name in names]
+        indices = [self._get_channel_index(self._acquisition.channel_table.name_index, name) for name in names]
         return self.get_image_stack_by_indices(indices)
 
     def get_image_by_name(self, name: str):
         """Get channel image by its name"""
-        index = self.channel_names.index(name)
+        index = self._get_channel_index(self._acquisition.channel_table.name_index, name)
         return self.get_image_by_index(index)
 
     def get_image_stack_by_labels(self, labels: Sequence[str]):
         """Get image stack by channel labels"""
-        indices = [self.channel_labels.index(label) for label in labels]
+        indices = [self._get_channel_index(self._acquisition.channel_table.label_index, label) for label in labels]
         return self.get_image_stack_by_indices(indices)
 
     def get_image_by_label(self, label: str):
         """Get channel image by its label"""
-        index = self.channel_labels.index(label)
+        index = self._get_channel_index(self._acquisition.channel_table.label_index, label)
         return self.get_image_by_index(index)
 
+    @staticmethod
+    def _get_channel_index(index: Dict[str, int], key: str):
+        """Look up channel index, raising ValueError for unknown channels like `list.index`"""
+        result = index.get(key)
+        if result is None:
+            raise ValueError(f"Channel not found: {key}")
+        return result
+
     def _get_image_stack_cyx(self, indices: Sequence[int] = None) -> Sequence[np.ndarray]:
         """Return the data reshaped as a stack of images"""
         if indices is None:
             indices = range(self.n_channels)
+        if self._image_data is None and self._source is not None:
+            # Read only the requested channels
+            return self._source[list(indices)]
         return self.image_data[indices]
 
     def save_ome_tiff(
@@ -129,8 +219,9 @@ class AcquisitionData:
             order = self.acquisition.get_mass_indices(masses)
         else:
             order = [i for i in range(self.n_channels)]
-        channel_labels = [self.channel_labels[i] for i in order]
-        channel_names = [self.channel_names[i] for i in order]
+        channel_table = self.acquisition.channel_table
+        channel_labels = [channel_table.labels[i] for i in order]
+        channel_names = [channel_table.names[i] for i in order]
         creator = f"imctools {__version__}"
         data = np.array(self._get_image_stack_cyx(order), dtype=dtype)
         to_tiff(
@@ -160,9 +251,6 @@ class AcquisitionData:
             order = [i for i in range(self.n_channels)]
 
         data = np.array(self._get_image_stack_cyx(order), dtype=dtype)
-
-        data = np.array(data, dtype=dtype)
-
         tifffile.imwrite(filename, data, compress=compression, imagej=imagej, bigtiff=bigtiff)
 
     def save_tiffs(
@@ -175,9 +263,12 @@ class AcquisitionData:
         bigtiff=False,
         dtype: Optional[object] = None,
         compression: int = 0,
+        n_writers: Optional[int] = None,
     ):
         """Save ImageJ TIFF files in a folder.
 
+        Files are written by a pool of threads and only appear under their final names once completely written.
+
         Parameters
         ----------
         output_folder
@@ -196,25 +287,273 @@ class AcquisitionData:
             Output numpy format.
         compression
             Compression level.
+        n_writers
+            Number of writer threads (defaults to the Python thread pool default, 1 writes in the calling thread).
         """
         if isinstance(output_folder, str):
             output_folder = Path(output_folder)
-        creator = f"imctools {__version__}"
         if names is not None:
             order = self.acquisition.get_name_indices(names)
         elif masses is not None:
             order = self.acquisition.get_mass_indices(masses)
         else:
             order = [i for i in range(self.n_channels)]
-        for i in order:
-            label = self.channel_labels[i]
-            label = re.sub("[^a-zA-Z0-9()]", "-", label)
-            name = self.channel_names[i]
-            data = np.array(self.get_image_by_index(i), dtype=dtype)
-            if basename is None:
-                basename = self.acquisition.description.rstrip(".ome.tiff") + "_"
-            filename = output_folder / (basename + label + "_" + name + ".tiff")
-            tifffile.imwrite(filename, data, compress=compression, imagej=imagej, bigtiff=bigtiff)
+        if basename is None:
+            basename = self.acquisition.description.rstrip(".ome.tiff") + "_"
+        channel_labels = self.channel_labels
+        channel_names = self.channel_names
+        filenames = [
+            basename + re.sub("[^a-zA-Z0-9()]", "-", channel_labels[i]) + "_" + channel_names[i] + ".tiff"
+            for i in order
+        ]
+
+        # Write into a temporary folder next to the output files, so renames are atomic
+        with TemporaryDirectory(prefix=".tmp-", dir=output_folder) as tmpdir:
+
+            def write(i: int, filename: str):
+                data = np.array(self.get_image_by_index(i), dtype=dtype)
+                tmp_filename = os.path.join(tmpdir, filename)
+                tifffile.imwrite(tmp_filename, data, compress=compression, imagej=imagej, bigtiff=bigtiff)
+                os.replace(tmp_filename, output_folder / filename)
+
+            if n_writers == 1:
+                for i, filename in zip(order, filenames):
+                    write(i, filename)
+            else:
+                # numpy copies, TIFF encoding and file writes release the GIL
+                with ThreadPoolExecutor(n_writers) as executor:
+                    for future in [executor.submit(write, i, fn) for i, fn in zip(order, filenames)]:
+                        future.result()
+
+    def measure_objects(
+        self,
+        mask: Union[np.ndarray, str, Path],
+        channels: Optional[Sequence[str]] = None,
+        stats: Sequence[str] = DEFAULT_OBJECT_STATS,
+        chunk_rows: Optional[int] = None,
+    ):
+        """Measure per-object intensities (e.g. of segmented cells) and region properties as pandas DataFrame.
+
+        One row per object with its label, area, centroid and one column "{stat}_{channel}" per statistic and channel.
+        Image data are read in row chunks (only the requested channels if read lazily).
+
+        Parameters
+        ----------
+        mask
+            Object label image (y, x) or its TIFF file path (e.g. `_mask.tiff` file), 0 for background.
+        channels
+            Channel names (all channels if None).
+        stats
+            Intensity statistics ("mean", "sum", "min", "max" or "std").
+        chunk_rows
+            Number of image rows measured at once, by default chunks of about 64 MB of image data.
+        """
+        if isinstance(mask, (str, Path)):
+            mask = np.squeeze(tifffile.imread(str(mask)))
+        if channels is None:
+            channels = self.channel_names
+        indices = [self._get_channel_index(self._acquisition.channel_table.name_index, name) for name in channels]
+        image_data = self._source if self._image_data is None and self._source is not None else self.image_data
+        return measure_objects(image_data, mask, channels, indices, stats=stats, chunk_rows=chunk_rows)
 
     def __repr__(self):
         return f"{self.__class__.__name__}(acquisition={self.acquisition})"
+
+
+def to_dataset(acquisitions: Sequence[AcquisitionData], lazy: bool = True):
+    """Combine acquisitions into an xarray Dataset with one variable per acquisition.
+
+    Variables are named by acquisition meta names and share a harmonized channel coordinate (all channel names in order
+    of appearance); channels missing in an acquisition are NaN. Image dimensions are specific to each acquisition.
+
+    Parameters
+    ----------
+    acquisitions
+        Acquisitions with image data.
+    lazy
+        Whether to load the image data lazily with dask.
+    """
+    try:
+        import xarray as xr
+    except ImportError:
+        raise ImportError("Please install 'xarray' package first.")
+    channel_names = list(dict.fromkeys(name for a in acquisitions for name in a.channel_names))
+    variables = dict()
+    for acquisition_data in acquisitions:
+        name = acquisition_data.acquisition.metaname
+        data_array = acquisition_data.to_xarray(lazy=lazy)
+        data_array = data_array.rename({"y": f"{name}_y", "x": f"{name}_x"}).reindex(channel=channel_names)
+        data_array.attrs.update(
+            acquisition_id=acquisition_data.acquisition.id,
+            description=acquisition_data.acquisition.description or "",
+        )
+        variables[name] = data_array
+    return xr.Dataset(variables, coords={"channel": channel_names})
+
+
+class AcquisitionStack(NamedTuple):
+    """Image data of several acquisitions in one (acquisition, channel, y, x) array with harmonized channels."""
+
+    data: np.ndarray
+    # (acquisition, channel) mask, True for channels missing in an acquisition (filled with the fill value)
+    mask: np.ndarray
+    channels: List[str]
+
+
+def align_channels(
+    acquisitions: Sequence[Acquisition], channels: Optional[Sequence[str]] = None
+) -> Tuple[List[str], np.ndarray]:
+    """Align channels of acquisitions with different panels or channel orders.
+
+    Returns the channels and an (acquisition, channel) array of channel indices within each acquisition, -1 for missing
+    channels. Channels are matched by name, then by label, then by mass (so that e.g. "Pr141" and "141Pr" match).
+
+    Parameters
+    ----------
+    acquisitions
+        Acquisitions to align.
+    channels
+        Channel names, labels or masses, by default all channels (by mass) in order of appearance.
+    """
+    tables = [a.channel_table for a in acquisitions]
+    if channels is None:
+        keys = dict()
+        for table in tables:
+            for name, mass_name in zip(table.names, table.mass_names):
+                keys.setdefault(mass_name or name, name)
+        channels = list(keys.values())
+    indices = np.full((len(tables), len(channels)), -1, dtype=np.int64)
+    for j, channel in enumerate(channels):
+        mass_name = "".join([c for c in channel if c.isdigit()])
+        for i, table in enumerate(tables):
+            index = table.name_index.get(channel, table.label_index.get(channel))
+            if index is None and mass_name:
+                index = table.mass_index.get(mass_name)
+            if index is not None:
+                indices[i, j] = index
+    return list(channels), indices
+
+
+def stack_acquisitions(
+    acquisitions: Sequence[AcquisitionData],
+    channels: Optional[Sequence[str]] = None,
+    pad_to: Optional[Tuple[int, int]] = None,
+    fill: float = 0,
+    dtype: Optional[np.dtype] = None,
+    n_workers: Optional[int] = None,
+) -> AcquisitionStack:
+    """Read acquisitions into one preallocated (acquisition, channel, y, x) array with harmonized channels.
+
+    Images are aligned at the top left corner and padded with the fill value. Image data are read in parallel, in the
+    natural blocks of each data source, directly into the output array.
+
+    Parameters
+    ----------
+    acquisitions
+        Acquisitions with image data (preferably lazily readable).
+    channels
+        Channel names, labels or masses, see `align_channels`.
+    pad_to
+        Image size (y, x) of the output array, by default the maximum size of the acquisitions.
+    fill
+        Value of padding pixels and missing channels.
+    dtype
+        Output data type, by default the common data type of the acquisitions.
+    n_workers
+        Number of reader threads (defaults to the number of CPUs).
+    """
+    channels, indices = align_channels([a.acquisition for a in acquisitions], channels)
+    sources = [a._source if a._image_data is None and a._source is not None else a.image_data for a in acquisitions]
+    # Acquisitions without image data (invalid acquisitions) have all channels missing
+    indices[[i for i, source in enumerate(sources) if source is None]] = -1
+    shapes = [source.shape[1:] if source is not None else (0, 0) for source in sources]
+    if pad_to is None:
+        pad_to = tuple(int(v) for v in np.max(shapes, axis=0)) if len(shapes) > 0 else (0, 0)
+    for acquisition_data, shape in zip(acquisitions, shapes):
+        if shape[0] > pad_to[0] or shape[1] > pad_to[1]:
+            raise ValueError(f"Acquisition {acquisition_data.acquisition.metaname} is larger than {pad_to}")
+    if dtype is None:
+        dtypes = [source.dtype for source in sources if source is not None]
+        dtype = np.result_type(*dtypes) if len(dtypes) > 0 else np.float32
+    mask = indices < 0
+    data = np.empty((len(acquisitions), len(channels)) + tuple(pad_to), dtype=dtype)
+
+    def read(i: int, positions: np.ndarray):
+        source = sources[i]
+        height, width = shapes[i]
+        if isinstance(source, ImageSource):
+            rows = source.chunks[1]
+            for start_row in range(0, height, rows):
+                stop_row = min(start_row + rows, height)
+                block = source[indices[i, positions], start_row:stop_row]
+                data[i, positions, start_row:stop_row, :width] = block
+        else:
+            for j in positions:
+                data[i, j, :height, :width] = source[indices[i, j]]
+
+    tasks = []
+    for i, (source, (height, width)) in enumerate(zip(sources, shapes)):
+        data[i, mask[i]] = fill
+        data[i, :, height:] = fill
+        data[i, :, :height, width:] = fill
+        positions = np.flatnonzero(~mask[i])
+        # Split reads into the channel blocks of the data source (e.g. OME-TIFF pages), arrays are read by channel
+        step = source.chunks[0] if isinstance(source, ImageSource) else 1
+        tasks.extend((i, positions[k : k + step]) for k in range(0, len(positions), step))
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            read(*task)
+    else:
+        # numpy copies, memory-mapped reads and TIFF decoding release the GIL
+        with ThreadPoolExecutor(min(n_workers, len(tasks))) as executor:
+            for future in [executor.submit(read, *task) for task in tasks]:
+                future.result()
+    return AcquisitionStack(data, mask, channels)
+
+
+def measure_acquisitions(
+    acquisitions: Sequence[AcquisitionData],
+    masks: Sequence[Union[np.ndarray, str, Path]],
+    channels: Optional[Sequence[str]] = None,
+    stats: Sequence[str] = DEFAULT_OBJECT_STATS,
+    n_workers: Optional[int] = None,
+):
+    """Measure objects of several acquisitions in parallel, see `AcquisitionData.measure_objects`.
+
+    Returns one pandas DataFrame with the acquisition ID of each object in the "acquisition_id" column.
+
+    Parameters
+    ----------
+    acquisitions
+        Acquisitions with image data.
+    masks
+        Object label images or their TIFF file paths, one per acquisition.
+    channels
+        Channel names (all channels of each acquisition if None).
+    stats
+        Intensity statistics ("mean", "sum", "min", "max" or "std").
+    n_workers
+        Number of worker threads (defaults to the number of CPUs).
+    """
+    if len(acquisitions) != len(masks):
+        raise ValueError(f"Expected {len(acquisitions)} masks, got {len(masks)}")
+
+    def measure(acquisition_data: AcquisitionData, mask):
+        table = acquisition_data.measure_objects(mask, channels=channels, stats=stats)
+        table.insert(0, "acquisition_id", acquisition_data.acquisition.id)
+        return table
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers == 1 or len(acquisitions) <= 1:
+        tables = [measure(a, m) for a, m in zip(acquisitions, masks)]
+    else:
+        # Image reads, sorting and reductions release the GIL
+        with ThreadPoolExecutor(min(n_workers, len(acquisitions))) as executor:
+            tables = list(executor.map(measure, acquisitions, masks))
+    if len(tables) == 0:
+        return pd.DataFrame()
+    return pd.concat(tables, ignore_index=True)
@@ -8,6 +8,8 @@ if sys.version_info >= (3, 8):
 else:
     from typing_extensions import TypedDict
 
+from imctools.data.histogram import ChannelHistogram, ChannelHistogramDict
+
 if TYPE_CHECKING:
     from imctools.data.acquisition import Acquisition
 
@@ -21,14 +23,21 @@ class ChannelDict(TypedDict):
     mass: Optional[int]
     min_intensity: Optional[float]
     max_intensity: Optional[float]
+    histogram: Optional[ChannelHistogramDict]
     metadata: Optional[Dict[str, str]]
 
 
+# Channel attributes kept in the channel table of the parent acquisition
+_INDEXED_ATTRIBUTES = frozenset(("id", "order_number", "name", "label"))
+
+
 class Channel:
     """IMC acquisition channel. Represents an image intensity."""
 
     symbol = "c"
 
+    __slots__ = tuple(k for k in ChannelDict.__annotations__.keys() if k != "metadata") + ("_metadata", "acquisition")
+
     def __init__(
         self,
         acquisition_id: int,
@@ -40,6 +49,7 @@ class Channel:
         min_intensity: Optional[float] = None,
         max_intensity: Optional[float] = None,
         metadata: Optional[Dict[str, str]] = None,
+        histogram: Optional[ChannelHistogram] = None,
     ):
         """
         Parameters
@@ -62,7 +72,10 @@ class Channel:
             Maximum intensity value.
         metadata
             Original (raw) channel metadata.
+        histogram
+            Intensity histogram and percentiles.
         """
+        self.acquisition: Optional[Acquisition] = None  # Parent acquisition
         self.acquisition_id = acquisition_id
         self.id = id
         self.order_number = order_number
@@ -72,8 +85,7 @@ class Channel:
         self.min_intensity = min_intensity
         self.max_intensity = max_intensity
         self.metadata = metadata
-
-        self.acquisition: Optional[Acquisition] = None  # Parent acquisition
+        self.histogram = histogram
 
     @staticmethod
     def from_dict(d: ChannelDict):
@@ -88,9 +100,32 @@ class Channel:
             min_intensity=d.get("min_intensity") if d.get("min_intensity") is not None else None,
             max_intensity=d.get("max_intensity") if d.get("max_intensity") is not None else None,
             metadata=d.get("metadata"),
+            histogram=ChannelHistogram.from_dict(d.get("histogram")) if d.get("histogram") is not None else None,
         )
         return result
 
+    @property
+    def metadata(self):
+        """Original (raw) metadata as a dictionary"""
+        if self._metadata is None:
+            session = (
+                self.acquisition.slide.session
+                if self.acquisition is not None and self.acquisition.slide is not None
+                else None
+            )
+            if session is not None:
+                self._metadata = session.get_entity_metadata("channels", self.id) or dict()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+
+    def __setattr__(self, key, value):
+        object.__setattr__(self, key, value)
+        if key in _INDEXED_ATTRIBUTES and self.acquisition is not None:
+            self.acquisition.invalidate_channel_table()
+
     @property
     def metaname(self):
         """Meta name fully describing the entity"""
@@ -99,14 +134,19 @@ class Channel:
 
     def __getstate__(self):
         """Returns dictionary for JSON/YAML serialization"""
-        s = self.__dict__.copy()
-        del s["acquisition"]
+        s = {k: getattr(self, k) for k in ChannelDict.__annotations__.keys()}
+        s["histogram"] = self.histogram.__getstate__() if self.histogram is not None else None
         return s
 
+    def __reduce__(self):
+        """Pickle (and copy) channels as their serialization dictionary, without parent acquisition"""
+        return Channel.from_dict, (self.__getstate__(),)
+
     def get_csv_dict(self):
         """Returns dictionary for CSV tables"""
         s = self.__getstate__()
         del s["metadata"]
+        del s["histogram"]
         return s
 
     def __repr__(self):
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import math
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if sys.version_info >= (3, 8):
+    from typing import TypedDict  # pylint: disable=no-name-in-module
+else:
+    from typing_extensions import TypedDict
+
+# Number of linear bins between channel min and max intensity
+HISTOGRAM_BINS = 128
+
+# Relative accuracy of the log-binned histogram (and of percentiles estimated from it)
+LOG_HISTOGRAM_ACCURACY = 0.02
+
+# Intensities up to this value are counted in the zero bin of the log-binned histogram
+LOG_HISTOGRAM_MIN = 1e-3
+
+# Percentiles computed exactly for every acquisition channel
+PERCENTILES = (0.1, 1.0, 5.0, 25.0, 50.0, 75.0, 95.0, 99.0, 99.9)
+
+_LOG_GAMMA = math.log((1 + LOG_HISTOGRAM_ACCURACY) / (1 - LOG_HISTOGRAM_ACCURACY))
+
+
+class ChannelHistogramDict(TypedDict):
+    count: int
+    min: Optional[float]
+    max: Optional[float]
+    bins: List[int]
+    log_offset: int
+    log_bins: List[int]
+    zero_count: int
+    percentiles: Dict[str, float]
+
+
+class ChannelHistogram:
+    """Intensity distribution of a channel: linear histogram, log-binned histogram and percentiles.
+
+    Linear bins evenly split the [min, max] intensity range. Log bins have fixed edges shared by all channels, where bin
+    `i` covers intensities in (γ^(i-1), γ^i] with γ = (1 + a) / (1 - a) for relative accuracy `a`, so they add up
+    exactly when histograms are merged and any percentile can be estimated from them within the relative accuracy.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        min: Optional[float],
+        max: Optional[float],
+        bins: np.ndarray,
+        log_offset: int,
+        log_bins: np.ndarray,
+        zero_count: int,
+        percentiles: Optional[Dict[float, float]] = None,
+    ):
+        """
+        Parameters
+        ----------
+        count
+            Number of (finite) pixel intensities.
+        min
+            Minimal intensity value.
+        max
+            Maximum intensity value.
+        bins
+            Pixel counts of linear bins between minimal and maximum intensity.
+        log_offset
+            Index of the first log bin.
+        log_bins
+            Pixel counts of consecutive log bins, starting at `log_offset`.
+        zero_count
+            Number of intensities up to `LOG_HISTOGRAM_MIN` (including negative ones).
+        percentiles
+            Exact intensity percentiles.
+        """
+        self.count = count
+        self.min = min
+        self.max = max
+        self.bins = np.asarray(bins, dtype=np.int64)
+        self.log_offset = log_offset
+        self.log_bins = np.asarray(log_bins, dtype=np.int64)
+        self.zero_count = zero_count
+        self.percentiles = percentiles if percentiles is not None else dict()
+
+    @staticmethod
+    def from_image(img: np.ndarray, bins: int = HISTOGRAM_BINS):
+        """Compute histogram of channel image
+
+        Parameters
+        ----------
+        img
+            Channel image.
+        bins
+            Number of linear bins.
+        """
+        data = np.asarray(img).ravel()
+        if data.dtype.kind == "f":
+            data = data[np.isfinite(data)]
+        if data.size == 0:
+            return ChannelHistogram(0, None, None, np.zeros(bins), 0, [], 0)
+        vmin = float(data.min())
+        vmax = float(data.max())
+        if vmin < vmax:
+            counts, _ = np.histogram(data, bins=bins, range=(vmin, vmax))
+        else:
+            counts = np.zeros(bins, dtype=np.int64)
+            counts[0] = data.size
+
+        positive = data[data > LOG_HISTOGRAM_MIN]
+        log_offset = 0
+        log_counts = np.zeros(0, dtype=np.int64)
+        if positive.size > 0:
+            indices = np.ceil(np.log(positive.astype(np.float64)) / _LOG_GAMMA).astype(np.int64)
+            log_offset = int(indices.min())
+            log_counts = np.bincount(indices - log_offset)
+
+        values = np.percentile(data, PERCENTILES)
+        percentiles = {q: round(float(v), 4) for q, v in zip(PERCENTILES, values)}
+        return ChannelHistogram(
+            int(data.size),
+            round(vmin, 4),
+            round(vmax, 4),
+            counts,
+            log_offset,
+            log_counts,
+            int(data.size - positive.size),
+            percentiles,
+        )
+
+    @staticmethod
+    def merge(histograms: Sequence[ChannelHistogram], bins: int = HISTOGRAM_BINS):
+        """Combine histograms (e.g. of the same channel in several acquisitions) without accessing pixel data.
+
+        Log bins add up exactly. Linear bins are redistributed over the combined intensity range assuming uniformly
+        distributed intensities within every bin, and percentiles are estimated from the combined log bins.
+
+        Parameters
+        ----------
+        histograms
+            Histograms to combine.
+        bins
+            Number of linear bins of the combined histogram.
+        """
+        histograms = [h for h in histograms if h.count > 0]
+        if len(histograms) == 0:
+            return ChannelHistogram(0, None, None, np.zeros(bins), 0, [], 0)
+        vmin = min(h.min for h in histograms)
+        vmax = max(h.max for h in histograms)
+
+        if vmin < vmax:
+            edges = np.linspace(vmin, vmax, bins + 1)
+            cumulative_counts = np.zeros(bins + 1, dtype=np.float64)
+            for h in histograms:
+                cumulative_counts += _get_cumulative_counts(h, edges)
+            counts = np.diff(np.rint(cumulative_counts)).astype(np.int64)
+        else:
+            counts = np.zeros(bins, dtype=np.int64)
+            counts[0] = sum(h.count for h in histograms)
+
+        log_histograms = [h for h in histograms if len(h.log_bins) > 0]
+        log_offset = 0
+        log_counts = np.zeros(0, dtype=np.int64)
+        if len(log_histograms) > 0:
+            log_offset = min(h.log_offset for h in log_histograms)
+            log_end = max(h.log_offset + len(h.log_bins) for h in log_histograms)
+            log_counts = np.zeros(log_end - log_offset, dtype=np.int64)
+            for h in log_histograms:
+                start = h.log_offset - log_offset
+                log_counts[start : start + len(h.log_bins)] += h.log_bins
+
+        result = ChannelHistogram(
+            sum(h.count for h in histograms),
+            vmin,
+            vmax,
+            counts,
+            log_offset,
+            log_counts,
+            sum(h.zero_count for h in histograms),
+        )
+        return result
+
+    @property
+    def bin_edges(self) -> Optional[np.ndarray]:
+        """Edges of linear bins"""
+        if self.count == 0:
+            return None
+        return np.linspace(self.min, self.max, len(self.bins) + 1)
+
+    @property
+    def log_bin_edges(self) -> np.ndarray:
+        """Edges of log bins"""
+        return np.exp(np.arange(self.log_offset - 1, self.log_offset + len(self.log_bins)) * _LOG_GAMMA)
+
+    def get_percentile(self, q: float) -> Optional[float]:
+        """Intensity percentile, exact if it was computed from pixel data, estimated from log bins otherwise.
+
+        Parameters
+        ----------
+        q
+            Percentile (0-100).
+        """
+        if self.count == 0:
+            return None
+        value = self.percentiles.get(float(q))
+        if value is not None:
+            return value
+        return self._estimate_percentile(q)
+
+    def get_contrast_limits(self, lower: float = 1.0, upper: float = 99.0) -> Optional[Tuple[float, float]]:
+        """Display range of the channel, clipped at the given percentiles.
+
+        Parameters
+        ----------
+        lower
+            Lower percentile (0-100).
+        upper
+            Upper percentile (0-100).
+        """
+        if self.count == 0:
+            return None
+        return self.get_percentile(lower), self.get_percentile(upper)
+
+    def _estimate_percentile(self, q: float):
+        """Percentile estimated from log bins"""
+        rank = q / 100 * (self.count - 1)
+        if rank < self.zero_count:
+            value = 0.0
+        else:
+            cumulative_counts = np.cumsum(self.log_bins)
+            i = int(np.searchsorted(cumulative_counts, rank - self.zero_count, side="right"))
+            i = min(i, len(self.log_bins) - 1)
+            # Value with the smallest relative error to all intensities of the bin
+            value = 2 * math.exp((self.log_offset + i) * _LOG_GAMMA) / (1 + math.exp(_LOG_GAMMA))
+        return float(np.clip(value, self.min, self.max))
+
+    @staticmethod
+    def from_dict(d: ChannelHistogramDict):
+        """Recreate an object from dictionary"""
+        result = ChannelHistogram(
+            d.get("count"),
+            d.get("min"),
+            d.get("max"),
+            d.get("bins"),
+            d.get("log_offset"),
+            d.get("log_bins"),
+            d.get("zero_count"),
+            {float(k): v for k, v in d.get("percentiles", dict()).items()},
+        )
+        return result
+
+    def __getstate__(self):
+        """Returns dictionary for JSON/YAML serialization"""
+        s = {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "bins": self.bins.tolist(),
+            "log_offset": self.log_offset,
+            "log_bins": self.log_bins.tolist(),
+            "zero_count": self.zero_count,
+            "percentiles": {str(k): v for k, v in self.percentiles.items()},
+        }
+        return s
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(count={self.count}, min={self.min}, max={self.max})"
+
+
+def _get_cumulative_counts(histogram: ChannelHistogram, edges: np.ndarray):
+    """Number of histogram intensities up to each edge, interpolated linearly within bins"""
+    if histogram.min == histogram.max:
+        result = np.where(edges > histogram.min, histogram.count, 0).astype(np.float64)
+        result[-1] = histogram.count
+        return result
+    source_edges = histogram.bin_edges
+    source_counts = np.concatenate(([0], np.cumsum(histogram.bins)))
+    return np.interp(edges, source_edges, source_counts)
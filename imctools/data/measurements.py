@@ -0,0 +1,124 @@
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Supported per-object intensity statistics
+OBJECT_STATS = ("mean", "sum", "min", "max", "std")
+DEFAULT_OBJECT_STATS = ("mean", "sum", "max")
+
+# Target size of the row chunks of image data measured at once
+_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def measure_objects(
+    image_data,
+    mask: np.ndarray,
+    channel_names: Sequence[str],
+    channel_indices: Optional[Sequence[int]] = None,
+    stats: Sequence[str] = DEFAULT_OBJECT_STATS,
+    chunk_rows: Optional[int] = None,
+) -> pd.DataFrame:
+    """Measure per-object intensity statistics and region properties of labeled objects.
+
+    Returns one row per object (label) with the columns "object", "area", "centroid_y", "centroid_x" and one column
+    "{stat}_{channel}" per statistic and channel. All statistics are reduced in one pass over row chunks of the image
+    data: sums by weighted bincount, minima and maxima by a sort-based reduction of the chunk pixels.
+
+    Parameters
+    ----------
+    image_data
+        Image data in (channel, y, x) layout, numpy array or lazily readable image source.
+    mask
+        Object label image (y, x), 0 for background.
+    channel_names
+        Names of the measured channels.
+    channel_indices
+        Indices of the measured channels in the image data, all channels by default.
+    stats
+        Intensity statistics ("mean", "sum", "min", "max" or "std").
+    chunk_rows
+        Number of image rows measured at once, by default chunks of about 64 MB of image data.
+    """
+    unknown = set(stats) - set(OBJECT_STATS)
+    if len(unknown) > 0:
+        raise ValueError(f"Unsupported object statistics: {', '.join(sorted(unknown))}")
+    mask = np.asarray(mask)
+    if mask.dtype == bool:
+        mask = mask.astype(np.uint8)
+    if not np.issubdtype(mask.dtype, np.integer):
+        raise ValueError(f"Mask must be an integer label image, not {mask.dtype}")
+    _, height, width = image_data.shape
+    if channel_indices is None:
+        channel_indices = range(image_data.shape[0])
+    channel_indices = list(channel_indices)
+    n_channels = len(channel_indices)
+    if mask.shape != (height, width):
+        raise ValueError(f"Mask shape {mask.shape} does not match image shape {(height, width)}")
+    if len(channel_names) != n_channels:
+        raise ValueError(f"Expected {n_channels} channel names, got {len(channel_names)}")
+    if mask.size > 0 and mask.min() < 0:
+        raise ValueError("Mask labels must not be negative")
+    n_labels = int(mask.max()) + 1 if mask.size > 0 else 1
+    if chunk_rows is None:
+        chunk_rows = max(1, _CHUNK_BYTES // max(1, n_channels * width * np.dtype(image_data.dtype).itemsize))
+
+    count = np.zeros(n_labels, dtype=np.int64)
+    sum_y = np.zeros(n_labels)
+    sum_x = np.zeros(n_labels)
+    sums = np.zeros((n_channels, n_labels))
+    squares = np.zeros((n_channels, n_labels)) if "std" in stats else None
+    minima = np.full((n_channels, n_labels), np.inf) if "min" in stats else None
+    maxima = np.full((n_channels, n_labels), -np.inf) if "max" in stats else None
+
+    for start_row in range(0, height, chunk_rows):
+        stop_row = min(start_row + chunk_rows, height)
+        ys, xs = np.nonzero(mask[start_row:stop_row])
+        if len(ys) == 0:
+            continue
+        labels = mask[start_row:stop_row][ys, xs].astype(np.intp)
+        count += np.bincount(labels, minlength=n_labels)
+        sum_y += np.bincount(labels, weights=ys + start_row, minlength=n_labels)
+        sum_x += np.bincount(labels, weights=xs, minlength=n_labels)
+        values = np.asarray(image_data[channel_indices, start_row:stop_row])[:, ys, xs].astype(np.float64)
+        for c in range(n_channels):
+            sums[c] += np.bincount(labels, weights=values[c], minlength=n_labels)
+            if squares is not None:
+                squares[c] += np.bincount(labels, weights=values[c] ** 2, minlength=n_labels)
+        if minima is not None or maxima is not None:
+            order = np.argsort(labels, kind="stable")
+            sorted_labels = labels[order]
+            starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+            chunk_labels = sorted_labels[starts]
+            sorted_values = values[:, order]
+            if minima is not None:
+                chunk_minima = np.minimum.reduceat(sorted_values, starts, axis=1)
+                minima[:, chunk_labels] = np.minimum(minima[:, chunk_labels], chunk_minima)
+            if maxima is not None:
+                chunk_maxima = np.maximum.reduceat(sorted_values, starts, axis=1)
+                maxima[:, chunk_labels] = np.maximum(maxima[:, chunk_labels], chunk_maxima)
+
+    objects = np.flatnonzero(count)
+    objects = objects[objects > 0]
+    area = count[objects]
+    columns: Dict[str, np.ndarray] = {
+        "object": objects,
+        "area": area,
+        "centroid_y": sum_y[objects] / area,
+        "centroid_x": sum_x[objects] / area,
+    }
+    for stat in stats:
+        for c, channel_name in enumerate(channel_names):
+            if stat == "sum":
+                values = sums[c, objects]
+            elif stat == "mean":
+                values = sums[c, objects] / area
+            elif stat == "std":
+                mean = sums[c, objects] / area
+                values = np.sqrt(np.maximum(squares[c, objects] / area - mean**2, 0))
+            elif stat == "min":
+                values = minima[c, objects]
+            else:
+                values = maxima[c, objects]
+            columns[f"{stat}_{channel_name}"] = values
+    return pd.DataFrame(columns)
@@ -120,6 +120,19 @@ class Panorama:
         )
         return result
 
+    @property
+    def metadata(self):
+        """Original (raw) metadata as a dictionary"""
+        if self._metadata is None:
+            session = self.slide.session if self.slide is not None else None
+            if session is not None:
+                self._metadata = session.get_entity_metadata("panoramas", self.id) or dict()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+
     @property
     def metaname(self):
         """Meta name fully describing the entity"""
@@ -128,7 +141,8 @@ class Panorama:
 
     def __getstate__(self):
         """Returns dictionary for JSON/YAML serialization"""
-        s = self.__dict__.copy()
+        s = {("metadata" if k == "_metadata" else k): v for k, v in self.__dict__.items()}
+        s["metadata"] = self.metadata
         del s["slide"]
         return s
 
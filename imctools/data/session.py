@@ -5,15 +5,24 @@ import json
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
-
-from dateutil.parser import parse
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
+import imctools.io.mcd.constants as const
 from imctools.data.acquisition import Acquisition, AcquisitionDict
 from imctools.data.channel import Channel, ChannelDict
+from imctools.data.histogram import ChannelHistogram
 from imctools.data.panorama import Panorama, PanoramaDict
 from imctools.data.slide import Slide, SlideDict
-from imctools.io.utils import META_CSV_SUFFIX, sort_acquisition_channels
+from imctools.io.utils import (
+    META_CSV_SUFFIX,
+    SESSION_JSON_SUFFIX,
+    SESSION_METADATA_JSON_SUFFIX,
+    atomic_output,
+    load_json,
+    parse_timestamp,
+    save_json,
+    sort_acquisition_channels,
+)
 
 if sys.version_info >= (3, 8):
     from typing import TypedDict  # pylint: disable=no-name-in-module
@@ -21,6 +30,18 @@ else:
     from typing_extensions import TypedDict
 
 
+# Current session JSON format: compact structural records, raw metadata stored once in a separate file
+SESSION_FORMAT_VERSION = 3
+
+# Raw metadata elements of the entities in the session metadata tree
+_METADATA_ELEMENTS = {
+    "slides": const.SLIDE,
+    "panoramas": const.PANORAMA,
+    "acquisitions": const.ACQUISITION,
+    "channels": const.ACQUISITION_CHANNEL,
+}
+
+
 class SessionDict(TypedDict):
     id: str
     name: str
@@ -62,7 +83,12 @@ class Session:
         self.name = name
         self.imctools_version = imctools_version
         self.created = created
-        self.metadata = metadata
+        self._metadata = metadata
+        # Raw metadata file of sessions loaded from compact format, read on first access
+        self._metadata_filepath: Optional[Path] = None
+        self._metadata_archive: Optional[Path] = None
+        self._entity_metadata: Dict[str, Dict[str, Any]] = dict()
+        self._metadata_index: Optional[Dict[str, Dict[str, Any]]] = None
 
         self.slides: Dict[int, Slide] = dict()
         self.acquisitions: Dict[int, Acquisition] = dict()
@@ -76,14 +102,62 @@ class Session:
             d.get("id"),
             d.get("name"),
             d.get("imctools_version"),
-            parse(d.get("created")),
+            parse_timestamp(d.get("created")),
             d.get("metadata"),
         )
         return result
 
+    @property
+    def metadata(self):
+        """Whole set of original (raw) metadata as a dictionary"""
+        if self._metadata is None and self._metadata_filepath is not None:
+            data = load_json(self._metadata_filepath, self._metadata_archive)
+            self._metadata = data.get("session")
+            self._entity_metadata = data.get("entities", dict())
+            self._metadata_filepath = None
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+        self._metadata_filepath = None
+        self._metadata_index = None
+
+    def get_entity_metadata(self, kind: str, id: int) -> Optional[Dict[str, Any]]:
+        """Original (raw) metadata of a slide, panorama, acquisition or channel.
+
+        Parameters
+        ----------
+        kind
+            Entity kind ("slides", "panoramas", "acquisitions" or "channels").
+        id
+            Entity ID.
+        """
+        self.metadata  # Load raw metadata file if needed
+        entity_metadata = self._entity_metadata.get(kind, dict()).get(str(id))
+        if entity_metadata is not None:
+            return entity_metadata
+        return self._get_tree_metadata(kind, id)
+
+    def _get_tree_metadata(self, kind: str, id: int):
+        """Entity metadata element in the session metadata tree"""
+        tree = self.metadata
+        if tree is None:
+            return None
+        if self._metadata_index is None:
+            self._metadata_index = {
+                k: {item.get(const.ID): item for item in tree.get(element, [])}
+                for k, element in _METADATA_ELEMENTS.items()
+            }
+        item = self._metadata_index[kind].get(str(id))
+        return dict(item) if item is not None else None
+
     def __getstate__(self):
         """Returns dictionary for JSON/YAML serialization"""
         s = self.__dict__.copy()
+        for key in ("_metadata", "_metadata_filepath", "_metadata_archive", "_entity_metadata", "_metadata_index"):
+            del s[key]
+        s["metadata"] = self.metadata
         s["created"] = s["created"].isoformat()
         s["slides"] = list(s["slides"].values())
         s["acquisitions"] = list(s["acquisitions"].values())
@@ -91,6 +165,13 @@ class Session:
         s["channels"] = list(s["channels"].values())
         return s
 
+    def __reduce__(self):
+        """Pickle (and copy) sessions as serialization dictionaries, the object tree is rebuilt when loaded"""
+        s = self.__getstate__()
+        for key in ("slides", "acquisitions", "panoramas", "channels"):
+            s[key] = [item.__getstate__() for item in s[key]]
+        return Session._rebuild_object_tree, (s,)
+
     def get_csv_dict(self):
         """Returns dictionary for CSV tables"""
         s = self.__dict__.copy()
@@ -99,25 +180,77 @@ class Session:
         del s["acquisitions"]
         del s["panoramas"]
         del s["channels"]
-        del s["metadata"]
+        for key in ("_metadata", "_metadata_filepath", "_metadata_archive", "_entity_metadata", "_metadata_index"):
+            del s[key]
         return s
 
-    def save(self, filepath: str):
-        """Save session data in JSON format.
+    def save(self, filepath: Union[str, Path], format_version: int = SESSION_FORMAT_VERSION):
+        """Save session data in JSON format (atomically).
+
+        Format version 3 keeps the structural records compact and stores the raw metadata once, in a separate
+        `*_session_metadata.json` file next to the session file that is only read when metadata is accessed. Format
+        version 2 stores everything in a single, indented file.
 
         Parameters
         ----------
         filepath
             Output JSON file path
+        format_version
+            Session file format version (2 or 3).
         """
+        if isinstance(filepath, str):
+            filepath = Path(filepath)
 
         def handle_default(obj):
             if isinstance(obj, (Session, Slide, Panorama, Acquisition, Channel)):
                 return obj.__getstate__()
             return None
 
-        with open(filepath, "wt") as f:
-            json.dump(self, f, indent=2, default=handle_default)
+        if format_version == 2:
+            with atomic_output(filepath) as tmp_path:
+                with open(tmp_path, "wt") as f:
+                    json.dump(self, f, indent=2, default=handle_default)
+            return
+        if format_version != SESSION_FORMAT_VERSION:
+            raise ValueError(f"Unsupported session format version: {format_version}")
+
+        # Entity metadata is only stored if it differs from its element in the session metadata tree
+        tree = self.metadata
+        self._metadata_index = None
+        entities = {
+            "slides": self.slides,
+            "panoramas": self.panoramas,
+            "acquisitions": self.acquisitions,
+            "channels": self.channels,
+        }
+        records = dict()
+        entity_metadata = dict()
+        for kind, items in entities.items():
+            records[kind] = []
+            entity_metadata[kind] = dict()
+            for item in items.values():
+                record = item.__getstate__()
+                metadata = record.pop("metadata")
+                if tree is None or metadata != self._get_tree_metadata(kind, item.id):
+                    entity_metadata[kind][str(item.id)] = metadata
+                records[kind].append(record)
+
+        if filepath.name.endswith(SESSION_JSON_SUFFIX):
+            metadata_filename = filepath.name[: -len(SESSION_JSON_SUFFIX)] + SESSION_METADATA_JSON_SUFFIX
+        else:
+            metadata_filename = filepath.stem + "_metadata.json"
+        save_json({"session": tree, "entities": entity_metadata}, filepath.parent / metadata_filename)
+
+        data = {
+            "format_version": format_version,
+            "id": self.id,
+            "name": self.name,
+            "imctools_version": self.imctools_version,
+            "created": self.created.isoformat(),
+            "metadata_file": metadata_filename,
+        }
+        data.update(records)
+        save_json(data, filepath)
 
     def save_meta_csv(self, output_folder: Union[str, Path]):
         """Writes the metadata as CSV tables"""
@@ -154,17 +287,22 @@ class Session:
             writer.writerows(values)
 
     @staticmethod
-    def load(filepath: Union[str, Path]):
+    def load(filepath: Union[str, Path], archive: Optional[Union[str, Path]] = None):
         """Load IMC session data from JSON file
 
         Parameters
         ----------
         filepath
-            Input JSON file path.
+            Input JSON file path (member name if read from a zip archive).
+        archive
+            Zip archive (e.g. `_imc.zip` file) containing the session files.
         """
-        with open(filepath, "r") as f:
-            data = json.load(f)
-            return Session._rebuild_object_tree(data)
+        data = load_json(filepath, archive)
+        session = Session._rebuild_object_tree(data)
+        if data.get("format_version", 2) >= 3:
+            session._metadata_filepath = Path(filepath).parent / data.get("metadata_file")
+            session._metadata_archive = Path(archive) if archive is not None else None
+        return session
 
     @staticmethod
     def _rebuild_object_tree(data: SessionDict):
@@ -172,13 +310,18 @@ class Session:
 
         session = Session.from_dict(data)
 
+        # Metadata of entities saved without it is looked up in the session metadata on first access
         for item in data.get("slides"):
             slide = Slide.from_dict(item)
+            if "metadata" not in item:
+                slide.metadata = None
             slide.session = session
             session.slides[slide.id] = slide
 
         for item in data.get("panoramas"):
             panorama = Panorama.from_dict(item)
+            if "metadata" not in item:
+                panorama.metadata = None
             slide = session.slides.get(panorama.slide_id)
             panorama.slide = slide
             slide.panoramas[panorama.id] = panorama
@@ -186,6 +329,8 @@ class Session:
 
         for item in data.get("acquisitions"):
             acquisition = Acquisition.from_dict(item)
+            if "metadata" not in item:
+                acquisition.metadata = None
             slide = session.slides.get(acquisition.slide_id)
             acquisition.slide = slide
             slide.acquisitions[acquisition.id] = acquisition
@@ -193,6 +338,8 @@ class Session:
 
         for item in data.get("channels"):
             channel = Channel.from_dict(item)
+            if "metadata" not in item:
+                channel.metadata = None
             acquisition = session.acquisitions.get(channel.acquisition_id)
             channel.acquisition = acquisition
             acquisition.channels[channel.id] = channel
@@ -212,6 +359,35 @@ class Session:
     def acquisition_ids(self) -> Tuple[int, ...]:
         return tuple(self.acquisitions.keys())
 
+    def get_channel_histogram(
+        self, channel_name: str, acquisition_ids: Optional[Sequence[int]] = None
+    ) -> Optional[ChannelHistogram]:
+        """Intensity histogram of a channel combined across acquisitions, None if no acquisition has one.
+
+        Parameters
+        ----------
+        channel_name
+            Channel name.
+        acquisition_ids
+            IDs of acquisitions to combine (all acquisitions by default).
+        """
+        if acquisition_ids is None:
+            acquisition_ids = self.acquisitions.keys()
+        histograms = []
+        for acquisition_id in acquisition_ids:
+            acquisition = self.acquisitions.get(acquisition_id)
+            if acquisition is None:
+                continue
+            index = acquisition.channel_table.name_index.get(channel_name)
+            if index is None:
+                continue
+            channel = acquisition.channels[int(acquisition.channel_table.ids[index])]
+            if channel.histogram is not None:
+                histograms.append(channel.histogram)
+        if len(histograms) == 0:
+            return None
+        return ChannelHistogram.merge(histograms)
+
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name})"
 
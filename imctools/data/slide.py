@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import sys
-from typing import TYPE_CHECKING, Dict, Optional
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 
 import imctools.io.mcd.constants as const
+from imctools.data.spatialindex import SpatialIndex
 
 if sys.version_info >= (3, 8):
     from typing import TypedDict  # pylint: disable=no-name-in-module
@@ -71,6 +72,8 @@ class Slide:
         self.session: Optional[Session] = None  # Parent session object
         self.acquisitions: Dict[int, Acquisition] = dict()  # Children acquisitions
         self.panoramas: Dict[int, Panorama] = dict()  # Children panoramas
+        self._spatial_index: Optional[SpatialIndex] = None
+        self._spatial_index_size: Optional[Tuple[int, int]] = None
 
     @staticmethod
     def from_dict(d: SlideDict):
@@ -86,6 +89,39 @@ class Slide:
         )
         return result
 
+    @property
+    def metadata(self):
+        """Original (raw) metadata as a dictionary"""
+        if self._metadata is None:
+            session = self.session
+            if session is not None:
+                self._metadata = session.get_entity_metadata("slides", self.id) or dict()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+
+    @property
+    def spatial_index(self):
+        """Spatial index of acquisition ROIs and panoramas, rebuilt when acquisitions or panoramas are added/removed"""
+        if self._spatial_index is None or self._spatial_index_size != (len(self.acquisitions), len(self.panoramas)):
+            self._spatial_index = SpatialIndex.from_slide(self)
+            self._spatial_index_size = (len(self.acquisitions), len(self.panoramas))
+        return self._spatial_index
+
+    def invalidate_spatial_index(self):
+        """Drop cached spatial index, e.g. after ROI or panorama coordinates have changed"""
+        self._spatial_index = None
+
+    def find_intersecting(self, xmin: float, ymin: float, xmax: float, ymax: float):
+        """Acquisitions and panoramas intersecting the slide region (in μm)"""
+        return self.spatial_index.intersecting(xmin, ymin, xmax, ymax)
+
+    def find_nearest(self, x: float, y: float, k: int = 1):
+        """Acquisitions and panoramas nearest to the slide position (in μm)"""
+        return self.spatial_index.nearest(x, y, k)
+
     @property
     def metaname(self):
         """Meta name fully describing the entity"""
@@ -114,10 +150,13 @@ class Slide:
 
     def __getstate__(self):
         """Returns dictionary for JSON/YAML serialization"""
-        s = self.__dict__.copy()
+        s = {("metadata" if k == "_metadata" else k): v for k, v in self.__dict__.items()}
+        s["metadata"] = self.metadata
         del s["session"]
         del s["acquisitions"]
         del s["panoramas"]
+        del s["_spatial_index"]
+        del s["_spatial_index_size"]
         return s
 
     def get_csv_dict(self):
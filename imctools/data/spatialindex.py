@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from imctools.data.acquisition import Acquisition
+    from imctools.data.panorama import Panorama
+    from imctools.data.slide import Slide
+
+# Items spanning more grid cells (e.g. slide-wide panoramas) are tested on every query instead
+_MAX_CELLS_PER_ITEM = 1024
+
+
+class SpatialIndex:
+    """Uniform grid index over the bounding boxes of slide entities (acquisition ROIs, panoramas).
+
+    Every item is registered in all grid cells its bounding box overlaps, so a region query only tests the items of the
+    cells covered by the region. Coordinates are slide coordinates (in μm).
+    """
+
+    def __init__(self, items: Sequence[Any], bboxes: Sequence[Tuple[float, float, float, float]]):
+        """
+        Parameters
+        ----------
+        items
+            Indexed items.
+        bboxes
+            Item bounding boxes as (xmin, ymin, xmax, ymax) tuples.
+        """
+        self.items = list(items)
+        self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        self._cells: Dict[Tuple[int, int], List[int]] = dict()
+        self._large_items: List[int] = []
+        self.cell_size = 1.0
+        if len(self.items) == 0:
+            return
+
+        # Cells about the size of an average item keep both the number of cells per item and items per cell low
+        sizes = self.bboxes[:, 2:] - self.bboxes[:, :2]
+        self.cell_size = max(float(np.mean(sizes)), 1.0)
+        cell_bboxes = np.floor(self.bboxes / self.cell_size).astype(np.int64)
+        for i, (cx1, cy1, cx2, cy2) in enumerate(cell_bboxes.tolist()):
+            if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > _MAX_CELLS_PER_ITEM:
+                self._large_items.append(i)
+                continue
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    self._cells.setdefault((cx, cy), []).append(i)
+
+    @staticmethod
+    def from_slide(slide: Slide):
+        """Build spatial index of slide acquisitions (ROIs) and panoramas with known coordinates"""
+        items = []
+        bboxes = []
+        for acquisition in slide.acquisitions.values():
+            bbox = get_acquisition_bbox(acquisition)
+            if bbox is not None:
+                items.append(acquisition)
+                bboxes.append(bbox)
+        for panorama in slide.panoramas.values():
+            bbox = get_panorama_bbox(panorama)
+            if bbox is not None:
+                items.append(panorama)
+                bboxes.append(bbox)
+        return SpatialIndex(items, bboxes)
+
+    def intersecting(self, xmin: float, ymin: float, xmax: float, ymax: float) -> List[Any]:
+        """Items whose bounding boxes intersect the region (in index order).
+
+        Parameters
+        ----------
+        xmin
+            Region left border.
+        ymin
+            Region top border.
+        xmax
+            Region right border.
+        ymax
+            Region bottom border.
+        """
+        if len(self.items) == 0:
+            return []
+        cx1, cy1, cx2, cy2 = (math.floor(v / self.cell_size) for v in (xmin, ymin, xmax, ymax))
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self._cells):
+            candidates = np.arange(len(self.items))
+        else:
+            indices = set(self._large_items)
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    indices.update(self._cells.get((cx, cy), ()))
+            candidates = np.fromiter(sorted(indices), dtype=np.int64, count=len(indices))
+        bboxes = self.bboxes[candidates]
+        mask = (bboxes[:, 0] <= xmax) & (bboxes[:, 2] >= xmin) & (bboxes[:, 1] <= ymax) & (bboxes[:, 3] >= ymin)
+        return [self.items[i] for i in candidates[mask]]
+
+    def nearest(self, x: float, y: float, k: int = 1) -> List[Any]:
+        """Items nearest to the point, by distance to their bounding boxes (zero for boxes containing the point).
+
+        Parameters
+        ----------
+        x
+            Point X coordinate.
+        y
+            Point Y coordinate.
+        k
+            Number of items to return.
+        """
+        if len(self.items) == 0 or k <= 0:
+            return []
+        dx = np.maximum(np.maximum(self.bboxes[:, 0] - x, x - self.bboxes[:, 2]), 0)
+        dy = np.maximum(np.maximum(self.bboxes[:, 1] - y, y - self.bboxes[:, 3]), 0)
+        distances = np.hypot(dx, dy)
+        k = min(k, len(self.items))
+        order = np.argpartition(distances, k - 1)[:k]
+        order = order[np.argsort(distances[order], kind="stable")]
+        return [self.items[i] for i in order]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(items={len(self.items)}, cell_size={self.cell_size})"
+
+
+def get_acquisition_bbox(acquisition: Acquisition) -> Optional[Tuple[float, float, float, float]]:
+    """Bounding box of acquisition ROI on the slide, None if ROI coordinates are unknown"""
+    xs = (acquisition.roi_start_x_pos_um, acquisition.roi_end_x_pos_um)
+    ys = (acquisition.roi_start_y_pos_um, acquisition.roi_end_y_pos_um)
+    if None in xs or None in ys:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def get_panorama_bbox(panorama: Panorama) -> Optional[Tuple[float, float, float, float]]:
+    """Bounding box of panorama corners on the slide, None if corner coordinates are unknown"""
+    xs = (panorama.x1, panorama.x2, panorama.x3, panorama.x4)
+    ys = (panorama.y1, panorama.y2, panorama.y3, panorama.y4)
+    if None in xs or None in ys:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
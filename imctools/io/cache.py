@@ -0,0 +1,214 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+# Default memory budget of the acquisition cache (in bytes)
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+
+class CacheStats(NamedTuple):
+    """Acquisition cache counters."""
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    nbytes: int
+    max_bytes: int
+
+
+class AcquisitionCache:
+    """Memory-capped LRU cache of decoded acquisition image data, shared by parsers.
+
+    Entries are keyed by (source fingerprint, acquisition ID, channel subset, binning) and stored read-only, so callers
+    can't modify cached data. When the cached data exceed the byte budget, least recently used entries are evicted.
+    Concurrent misses on the same key in `get_or_load` load the data only once, the other callers wait for the result.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_SIZE):
+        """
+        Parameters
+        ----------
+        max_bytes
+            Memory budget (in bytes).
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+        # Loads in flight by key
+        self._loading: Dict[Hashable, _Load] = dict()
+
+    @staticmethod
+    def create_key(
+        source: Union[str, os.PathLike],
+        acquisition_id: int,
+        channels: Optional[Sequence[str]] = None,
+        binning: int = 1,
+    ):
+        """Cache key of acquisition image data, the source file fingerprint changes whenever the file is modified.
+
+        Parameters
+        ----------
+        source
+            Source file path.
+        acquisition_id
+            Acquisition ID.
+        channels
+            Channel names of the image data (None for all channels).
+        binning
+            Binning factor of the image data.
+        """
+        stat = os.stat(source)
+        fingerprint = (os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+        return fingerprint, acquisition_id, tuple(channels) if channels is not None else None, binning
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Cached image data as read-only array, None if not cached.
+
+        Parameters
+        ----------
+        key
+            Cache key.
+        """
+        return self._get(key, count_miss=True)
+
+    def _get(self, key: Hashable, count_miss: bool):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                if count_miss:
+                    self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return _read_only_view(data)
+
+    def put(self, key: Hashable, data: np.ndarray) -> np.ndarray:
+        """Cache a copy of image data, returned as read-only array. Data larger than the whole budget are not cached.
+
+        Parameters
+        ----------
+        key
+            Cache key.
+        data
+            Image data.
+        """
+        return self._store(key, np.array(data))
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Optional[np.ndarray]]) -> Optional[np.ndarray]:
+        """Cached image data, loaded and cached on a miss.
+
+        Parameters
+        ----------
+        key
+            Cache key.
+        load
+            Function loading the image data into a new array (may return None for unreadable data, which is not cached).
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            in_flight = self._loading.get(key)
+            if in_flight is None:
+                in_flight = self._loading[key] = _Load()
+            in_flight.n_callers += 1
+        try:
+            with in_flight.lock:
+                # Data loaded by another caller in the meantime (also if too large to be cached)
+                if in_flight.data is not None:
+                    return _read_only_view(in_flight.data)
+                data = self._get(key, count_miss=False)
+                if data is None:
+                    data = load()
+                    if data is not None:
+                        data = np.asarray(data)
+                        if isinstance(data, np.memmap) or not data.flags.owndata:
+                            # Keep memory-mapped files and the bases of views out of the cache
+                            data = np.array(data)
+                        data = self._store(key, data)
+                        in_flight.data = data
+                return data
+        finally:
+            with self._lock:
+                in_flight.n_callers -= 1
+                if in_flight.n_callers == 0:
+                    del self._loading[key]
+
+    def _store(self, key: Hashable, data: np.ndarray):
+        """Store array owned by the cache."""
+        data.flags.writeable = False
+        if data.nbytes > self.max_bytes:
+            return _read_only_view(data)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            self._entries[key] = data
+            self._nbytes += data.nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self._evictions += 1
+        return _read_only_view(data)
+
+    @property
+    def stats(self):
+        """Cache counters"""
+        with self._lock:
+            return CacheStats(
+                self._hits, self._misses, self._evictions, len(self._entries), self._nbytes, self.max_bytes
+            )
+
+    def clear(self):
+        """Remove all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(max_bytes={self.max_bytes})"
+
+
+class _Load:
+    """Load of a cache entry in flight, shared by all callers missing the same key."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.n_callers = 0
+        self.data: Optional[np.ndarray] = None
+
+
+def bin_image_stack(data: np.ndarray, binning: int) -> np.ndarray:
+    """Average (channel, y, x) image data over non-overlapping binning x binning pixel blocks, incomplete blocks at
+    the image borders are dropped.
+
+    Parameters
+    ----------
+    data
+        Image data in (channel, y, x) layout.
+    binning
+        Binning factor.
+    """
+    if binning == 1:
+        return data
+    c, h, w = data.shape
+    h, w = h // binning, w // binning
+    data = data[:, : h * binning, : w * binning].reshape(c, h, binning, w, binning)
+    return data.mean(axis=(2, 4), dtype=np.float64).astype(np.float32)
+
+
+def _read_only_view(data: np.ndarray) -> np.ndarray:
+    view = data.view()
+    view.flags.writeable = False
+    return view
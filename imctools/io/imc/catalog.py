@@ -0,0 +1,386 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from imctools.io.imc.imcparser import ImcParser
+from imctools.io.utils import SESSION_JSON_SUFFIX, get_file_fingerprint, load_json, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = "imctools_catalog.sqlite"
+
+# Acquisition attributes kept in the catalog (besides IDs, timestamps and ROI coordinates)
+_ACQUISITION_COLUMNS = (
+    "description",
+    "max_x",
+    "max_y",
+    "signal_type",
+    "ablation_frequency",
+    "ablation_power",
+    "movement_type",
+    "template",
+    "is_valid",
+)
+
+_ROI_COLUMNS = ("roi_start_x_pos_um", "roi_start_y_pos_um", "roi_end_x_pos_um", "roi_end_y_pos_um")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sessions (
+    pk INTEGER PRIMARY KEY,
+    folder TEXT UNIQUE NOT NULL,
+    session_file TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    id TEXT,
+    name TEXT,
+    imctools_version TEXT,
+    created TEXT,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS slides (
+    session_pk INTEGER NOT NULL REFERENCES sessions(pk) ON DELETE CASCADE,
+    id INTEGER NOT NULL,
+    description TEXT,
+    width_um REAL,
+    height_um REAL,
+    PRIMARY KEY (session_pk, id)
+);
+CREATE TABLE IF NOT EXISTS acquisitions (
+    session_pk INTEGER NOT NULL REFERENCES sessions(pk) ON DELETE CASCADE,
+    id INTEGER NOT NULL,
+    slide_id INTEGER,
+    start_timestamp TEXT,
+    end_timestamp TEXT,
+    start_time REAL,
+    end_time REAL,
+    {", ".join(f"{c} REAL" for c in _ROI_COLUMNS)},
+    description TEXT,
+    max_x INTEGER,
+    max_y INTEGER,
+    signal_type TEXT,
+    ablation_frequency REAL,
+    ablation_power REAL,
+    movement_type TEXT,
+    template TEXT,
+    is_valid INTEGER,
+    PRIMARY KEY (session_pk, id)
+);
+CREATE TABLE IF NOT EXISTS channels (
+    session_pk INTEGER NOT NULL REFERENCES sessions(pk) ON DELETE CASCADE,
+    acquisition_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    order_number INTEGER,
+    name TEXT,
+    label TEXT,
+    min_intensity REAL,
+    max_intensity REAL,
+    PRIMARY KEY (session_pk, id)
+);
+CREATE INDEX IF NOT EXISTS channels_name ON channels (name);
+CREATE INDEX IF NOT EXISTS channels_label ON channels (label);
+CREATE INDEX IF NOT EXISTS channels_acquisition ON channels (session_pk, acquisition_id);
+CREATE INDEX IF NOT EXISTS acquisitions_start_time ON acquisitions (start_time);
+"""
+
+
+class CatalogAcquisition(NamedTuple):
+    """Lightweight handle of a cataloged acquisition."""
+
+    folder: str
+    session_name: str
+    acquisition_id: int
+    slide_id: int
+    description: Optional[str]
+    start_timestamp: Optional[datetime]
+    ablation_frequency: Optional[float]
+    max_x: int
+    max_y: int
+
+    def open(self):
+        """Open the IMC folder of the acquisition"""
+        return ImcParser(self.folder)
+
+    def get_acquisition_data(self):
+        """Read acquisition image data from the IMC folder"""
+        with self.open() as parser:
+            return parser.get_acquisition_data(self.acquisition_id)
+
+
+class Catalog:
+    """Local SQLite index of the sessions, slides, acquisitions and channels of many IMC folders.
+
+    Session files are fingerprinted (size and modification time), so updating the catalog only reads the session
+    files that were added or changed since the last update.
+    """
+
+    def __init__(self, filepath: Union[str, Path]):
+        """
+        Parameters
+        ----------
+        filepath
+            SQLite database file path.
+        """
+        if isinstance(filepath, str):
+            filepath = Path(filepath)
+        self.filepath = filepath
+        self._connection = sqlite3.connect(str(filepath))
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def update(self, root_folders: Union[str, Path, Sequence[Union[str, Path]]], n_workers: Optional[int] = None):
+        """Index new and changed IMC folders below the root folders and drop the ones that no longer exist.
+
+        Returns the number of indexed, removed and unchanged sessions. Unreadable session files are logged and skipped
+        (and read again by the next update).
+
+        Parameters
+        ----------
+        root_folders
+            Folder(s) to search for IMC folders.
+        n_workers
+            Number of worker processes reading the session files (defaults to the number of CPUs).
+        """
+        if isinstance(root_folders, (str, Path)):
+            root_folders = [root_folders]
+        root_folders = [Path(f).resolve() for f in root_folders]
+
+        session_files = dict()
+        for root_folder in root_folders:
+            for session_file in root_folder.rglob(f"*{SESSION_JSON_SUFFIX}"):
+                session_files[str(session_file.parent)] = session_file
+
+        known = {
+            row["folder"]: (row["pk"], row["fingerprint"])
+            for row in self._connection.execute("SELECT pk, folder, fingerprint FROM sessions")
+        }
+        removed = [
+            pk
+            for folder, (pk, _) in known.items()
+            if folder not in session_files and any(folder.startswith(os.path.join(str(r), "")) for r in root_folders)
+        ]
+
+        changed = []
+        for folder, session_file in sorted(session_files.items()):
+            fingerprint = json.dumps(get_file_fingerprint(session_file), sort_keys=True)
+            if folder not in known or known[folder][1] != fingerprint:
+                changed.append((folder, str(session_file), fingerprint))
+
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        changed_files = [session_file for (_, session_file, _) in changed]
+        if n_workers == 1 or len(changed) <= 1:
+            records = [_read_session_records(f) for f in changed_files]
+        else:
+            chunksize = max(1, len(changed) // (n_workers * 4))
+            with ProcessPoolExecutor(n_workers) as executor:
+                records = list(executor.map(_read_session_records, changed_files, chunksize=chunksize))
+
+        n_indexed = 0
+        with self._connection:
+            self._connection.executemany("DELETE FROM sessions WHERE pk = ?", [(pk,) for pk in removed])
+            for (folder, session_file, fingerprint), session_records in zip(changed, records):
+                if session_records is None:
+                    continue
+                self._connection.execute("DELETE FROM sessions WHERE folder = ?", (folder,))
+                self._insert_session(folder, session_file, fingerprint, session_records)
+                n_indexed += 1
+
+        logger.info(f"Indexed sessions: {n_indexed}, removed: {len(removed)}, skipped: {len(changed) - n_indexed}")
+        return n_indexed, len(removed), len(session_files) - len(changed)
+
+    def _insert_session(self, folder: str, session_file: str, fingerprint: str, records: Dict[str, Any]):
+        session = records["session"]
+        cursor = self._connection.execute(
+            """
+            INSERT INTO sessions (folder, session_file, fingerprint, id, name, imctools_version, created, indexed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                folder,
+                session_file,
+                fingerprint,
+                session.get("id"),
+                session.get("name"),
+                session.get("imctools_version"),
+                session.get("created"),
+                time.time(),
+            ),
+        )
+        pk = cursor.lastrowid
+        self._connection.executemany(
+            "INSERT INTO slides VALUES (?, ?, ?, ?, ?)",
+            [(pk, s.get("id"), s.get("description"), s.get("width_um"), s.get("height_um")) for s in records["slides"]],
+        )
+        columns = ("id", "slide_id", "start_timestamp", "end_timestamp") + _ROI_COLUMNS + _ACQUISITION_COLUMNS
+        self._connection.executemany(
+            f"""
+            INSERT INTO acquisitions (session_pk, start_time, end_time, {", ".join(columns)})
+            VALUES ({", ".join("?" * (len(columns) + 3))})
+            """,
+            [
+                (pk, _get_time(a.get("start_timestamp")), _get_time(a.get("end_timestamp")))
+                + tuple(a.get(c) for c in columns)
+                for a in records["acquisitions"]
+            ],
+        )
+        self._connection.executemany(
+            "INSERT INTO channels VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    pk,
+                    c.get("acquisition_id"),
+                    c.get("id"),
+                    c.get("order_number"),
+                    c.get("name"),
+                    c.get("label"),
+                    c.get("min_intensity"),
+                    c.get("max_intensity"),
+                )
+                for c in records["channels"]
+            ],
+        )
+
+    def find_acquisitions(
+        self,
+        channels: Optional[Sequence[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        ablation_frequency: Optional[float] = None,
+        session_name: Optional[str] = None,
+        region: Optional[Tuple[float, float, float, float]] = None,
+        valid_only: bool = True,
+    ) -> List[CatalogAcquisition]:
+        """Find cataloged acquisitions matching all given criteria.
+
+        Parameters
+        ----------
+        channels
+            Channel names (metals) or labels that all have to be acquired.
+        start
+            Earliest acquisition start time.
+        end
+            Latest acquisition start time (exclusive).
+        ablation_frequency
+            Ablation frequency (in Hz).
+        session_name
+            Session name (SQL LIKE pattern).
+        region
+            Slide region (xmin, ymin, xmax, ymax, in μm) that acquisition ROIs have to intersect. Only meaningful
+            together with other criteria selecting a single slide, e.g. `session_name`.
+        valid_only
+            Skip acquisitions without valid image data.
+        """
+        conditions = []
+        params: List[Any] = []
+        for channel in channels or []:
+            conditions.append("""
+                EXISTS (
+                    SELECT 1 FROM channels c
+                    WHERE c.session_pk = a.session_pk AND c.acquisition_id = a.id AND (c.name = ? OR c.label = ?)
+                )
+                """)
+            params.extend((channel, channel))
+        if start is not None:
+            conditions.append("a.start_time >= ?")
+            params.append(start.timestamp())
+        if end is not None:
+            conditions.append("a.start_time < ?")
+            params.append(end.timestamp())
+        if ablation_frequency is not None:
+            conditions.append("a.ablation_frequency = ?")
+            params.append(ablation_frequency)
+        if session_name is not None:
+            conditions.append("s.name LIKE ?")
+            params.append(session_name)
+        if region is not None:
+            conditions.append("""
+                MIN(a.roi_start_x_pos_um, a.roi_end_x_pos_um) <= ?
+                AND MAX(a.roi_start_x_pos_um, a.roi_end_x_pos_um) >= ?
+                AND MIN(a.roi_start_y_pos_um, a.roi_end_y_pos_um) <= ?
+                AND MAX(a.roi_start_y_pos_um, a.roi_end_y_pos_um) >= ?
+                """)
+            xmin, ymin, xmax, ymax = region
+            params.extend((xmax, xmin, ymax, ymin))
+        if valid_only:
+            conditions.append("a.is_valid")
+        where = ("WHERE " + " AND ".join(conditions)) if len(conditions) > 0 else ""
+        rows = self._connection.execute(
+            f"""
+            SELECT s.folder, s.name, a.id, a.slide_id, a.description, a.start_timestamp, a.ablation_frequency, a.max_x,
+                a.max_y
+            FROM acquisitions a JOIN sessions s ON s.pk = a.session_pk
+            {where}
+            ORDER BY s.folder, a.id
+            """,
+            params,
+        )
+        return [
+            CatalogAcquisition(
+                folder=row["folder"],
+                session_name=row["name"],
+                acquisition_id=row["id"],
+                slide_id=row["slide_id"],
+                description=row["description"],
+                start_timestamp=parse_timestamp(row["start_timestamp"]),
+                ablation_frequency=row["ablation_frequency"],
+                max_x=row["max_x"],
+                max_y=row["max_y"],
+            )
+            for row in rows
+        ]
+
+    def get_sessions(self):
+        """List cataloged sessions"""
+        return self._connection.execute("SELECT * FROM sessions ORDER BY folder").fetchall()
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(filepath={self.filepath})"
+
+
+def _read_session_records(session_file: str):
+    """Read entity records (without raw metadata) from a session JSON file, None for unreadable files."""
+    try:
+        data = load_json(session_file)
+        records = {kind: data.pop(kind, []) for kind in ("slides", "acquisitions", "channels")}
+        records["session"] = {k: data.get(k) for k in ("id", "name", "imctools_version", "created")}
+        for kind in ("slides", "acquisitions", "channels"):
+            for record in records[kind]:
+                record.pop("metadata", None)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Skipping unreadable session file {session_file}: {e}")
+        return None
+    return records
+
+
+def _get_time(value: Optional[str]):
+    """POSIX time of an ISO timestamp, used for time range queries."""
+    timestamp = parse_timestamp(value)
+    return timestamp.timestamp() if timestamp is not None else None
+
+
+if __name__ == "__main__":
+    import timeit
+
+    tic = timeit.default_timer()
+
+    with Catalog("/home/anton/Downloads/imc_catalog.sqlite") as catalog:
+        catalog.update("/home/anton/Downloads/imc_folders")
+        acquisitions = catalog.find_acquisitions(channels=["Ir191", "CD45"])
+
+    print(timeit.default_timer() - tic)
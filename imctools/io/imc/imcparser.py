@@ -1,23 +1,61 @@
-from pathlib import Path
-from typing import Union
-
-import tifffile
+import fnmatch
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 from imctools.data import Session
-from imctools.data.acquisitiondata import AcquisitionData
-from imctools.io.utils import OME_TIFF_SUFFIX, SCHEMA_XML_SUFFIX, SESSION_JSON_SUFFIX
+from imctools.data.acquisitiondata import AcquisitionData, AcquisitionStack, stack_acquisitions, to_dataset
+from imctools.io.cache import AcquisitionCache, bin_image_stack
+from imctools.io.ometiff.ometiffparser import OmeTiffImageSource, TiffFilePool, read_tiff_data
+from imctools.io.utils import OME_TIFF_SUFFIX, SCHEMA_XML_SUFFIX, SESSION_JSON_SUFFIX, get_zip_member_offset
 
 
 class ImcParser:
-    """IMC folder parser."""
-
-    def __init__(self, input_dir: Union[str, Path]):
+    """IMC folder parser.
+
+    IMC folders can also be read in place from `_imc.zip` archives: OME-TIFF files stored without compression are
+    memory-mapped within the archive, compressed ones are decoded page by page.
+    """
+
+    def __init__(
+        self,
+        input_dir: Union[str, Path],
+        cache: Optional[AcquisitionCache] = None,
+        tiff_pool: Optional[TiffFilePool] = None,
+    ):
+        """
+        Parameters
+        ----------
+        input_dir
+            IMC folder path or `_imc.zip` archive path.
+        cache
+            Cache of decoded acquisition image data (can be shared by several parsers).
+        tiff_pool
+            Pool of open OME-TIFF files (can be shared by several parsers), the parser keeps its own pool by default.
+        """
         if isinstance(input_dir, str):
             input_dir = Path(input_dir)
         self.input_dir = input_dir
-
-        session_json = str(next(input_dir.glob(f"*{SESSION_JSON_SUFFIX}")))
-        self._session = Session.load(session_json)
+        self._cache = cache
+        self._own_tiff_pool = tiff_pool is None
+        self._tiff_pool = tiff_pool if tiff_pool is not None else TiffFilePool()
+
+        # Archive members of the IMC folder by file name, None for IMC folders on disk
+        self._members: Optional[Dict[str, str]] = None
+        if input_dir.is_file():
+            with zipfile.ZipFile(input_dir) as zf:
+                names = zf.namelist()
+            session_json = next(name for name in names if name.endswith(SESSION_JSON_SUFFIX))
+            self._members = dict()
+            prefix = str(PurePosixPath(session_json).parent)
+            for name in names:
+                path = PurePosixPath(name)
+                if str(path.parent) == prefix and not name.endswith("/"):
+                    self._members[path.name] = name
+            self._session = Session.load(session_json, archive=input_dir)
+        else:
+            session_json = str(next(input_dir.glob(f"*{SESSION_JSON_SUFFIX}")))
+            self._session = Session.load(session_json)
 
     @property
     def origin(self):
@@ -27,32 +65,168 @@ class ImcParser:
     def session(self):
         return self._session
 
+    @property
+    def is_archive(self):
+        """Whether the IMC folder is read from a zip archive"""
+        return self._members is not None
+
+    def list_files(self, pattern: str = "*") -> List[str]:
+        """Sorted names of the IMC folder files matching a glob pattern.
+
+        Parameters
+        ----------
+        pattern
+            File name pattern (e.g. "*_pano.*").
+        """
+        if self._members is not None:
+            return sorted(fnmatch.filter(self._members.keys(), pattern))
+        return sorted(f.name for f in self.input_dir.glob(pattern) if f.is_file())
+
+    def read_file(self, filename: str) -> bytes:
+        """Content of an IMC folder file.
+
+        Parameters
+        ----------
+        filename
+            File name (e.g. panorama image file name).
+        """
+        if self._members is not None:
+            with zipfile.ZipFile(self.input_dir) as zf:
+                return zf.read(self._members[filename])
+        return (self.input_dir / filename).read_bytes()
+
     def get_mcd_xml(self):
         """Original (raw) metadata from MCD file in XML format."""
         xml_metadata_filename = self.session.metaname + SCHEMA_XML_SUFFIX
-        with open(self.input_dir / xml_metadata_filename, "rt") as f:
-            return f.read()
+        return self.read_file(xml_metadata_filename).decode("utf-8")
 
-    def get_acquisition_data(self, acquisition_id: int):
-        """Returns AcquisitionData object with binary image data"""
+    def get_acquisition_data(self, acquisition_id: int, lazy: bool = False):
+        """Returns AcquisitionData object with binary image data
+
+        Parameters
+        ----------
+        acquisition_id
+            Acquisition ID.
+        lazy
+            Read image data from the OME-TIFF file only when accessed, and then only the requested channels.
+
+        Uncompressed OME-TIFF files are memory-mapped (read-only), compressed ones are decoded into memory.
+        """
         acquisition = self.session.acquisitions.get(acquisition_id)
         if acquisition is None:
             return None
-        filename = acquisition.metaname + OME_TIFF_SUFFIX
-        image_data = ImcParser._read_file(self.input_dir / filename)
+        filepath, member = self._get_location(acquisition.metaname + OME_TIFF_SUFFIX)
+        if lazy:
+            return AcquisitionData(acquisition, None, source=OmeTiffImageSource(filepath, self._tiff_pool, member))
+        if self._cache is not None:
+            key = AcquisitionCache.create_key(filepath, acquisition.id)
+            image_data = self._cache.get_or_load(key, lambda: self._read_file(filepath, member))
+        else:
+            image_data = self._read_file(filepath, member)
         acquisition_data = AcquisitionData(acquisition, image_data)
         return acquisition_data
 
-    @staticmethod
-    def _read_file(filepath: Path):
-        with tifffile.TiffFile(filepath) as tif:
-            return tif.asarray(out="memmap")
+    def get_image_stack(self, acquisition_id: int, names: Optional[Sequence[str]] = None, binning: int = 1):
+        """Returns acquisition image stack (channel, y, x) of selected channels, None for unknown acquisitions.
+
+        Stacks are cached (as read-only arrays) if the parser has a cache.
+
+        Parameters
+        ----------
+        acquisition_id
+            Acquisition ID.
+        names
+            Channel names (all channels if None).
+        binning
+            Average image data over binning x binning pixel blocks.
+        """
+        if names is None and binning == 1:
+            acquisition_data = self.get_acquisition_data(acquisition_id)
+            return acquisition_data.image_data if acquisition_data is not None else None
+
+        def load():
+            acquisition_data = self.get_acquisition_data(acquisition_id, lazy=True)
+            if acquisition_data is None:
+                return None
+            if names is None:
+                return bin_image_stack(acquisition_data.image_data, binning)
+            return bin_image_stack(acquisition_data.get_image_stack_by_names(names), binning)
+
+        acquisition = self.session.acquisitions.get(acquisition_id)
+        if self._cache is None or acquisition is None:
+            return load()
+        filepath, _ = self._get_location(acquisition.metaname + OME_TIFF_SUFFIX)
+        return self._cache.get_or_load(AcquisitionCache.create_key(filepath, acquisition_id, names, binning), load)
+
+    def get_acquisitions_stack(
+        self,
+        acquisition_ids: Sequence[int],
+        channels: Optional[Sequence[str]] = None,
+        pad_to: Optional[Tuple[int, int]] = None,
+        fill: float = 0,
+        n_workers: Optional[int] = None,
+    ) -> AcquisitionStack:
+        """Returns image data of several acquisitions as one (acquisition, channel, y, x) array with aligned channels.
+
+        Channels are aligned by name, label or mass, missing channels are flagged in the mask of the returned stack.
+        Image data are read in parallel directly into the preallocated array.
+
+        Parameters
+        ----------
+        acquisition_ids
+            Acquisition IDs.
+        channels
+            Channel names, labels or masses, by default all channels (by mass) in order of appearance.
+        pad_to
+            Image size (y, x) of the stack, by default the maximum size of the acquisitions.
+        fill
+            Value of padding pixels and missing channels.
+        n_workers
+            Number of reader threads (defaults to the number of CPUs).
+        """
+        acquisitions = []
+        for acquisition_id in acquisition_ids:
+            acquisition = self.session.acquisitions.get(acquisition_id)
+            if acquisition is None:
+                raise ValueError(f"Acquisition not found: {acquisition_id}")
+            if acquisition.is_valid:
+                acquisitions.append(self.get_acquisition_data(acquisition_id, lazy=True))
+            else:
+                acquisitions.append(AcquisitionData(acquisition, None))
+        return stack_acquisitions(acquisitions, channels, pad_to, fill, n_workers=n_workers)
+
+    def to_dataset(self, lazy: bool = True):
+        """Get all valid acquisitions as xarray Dataset with a harmonized channel coordinate
+
+        Parameters
+        ----------
+        lazy
+            Whether to load the image data lazily with dask.
+        """
+        acquisitions = [a for a in self.session.acquisitions.values() if a.is_valid]
+        return to_dataset([self.get_acquisition_data(a.id, lazy=lazy) for a in acquisitions], lazy=lazy)
+
+    def _get_location(self, filename: str) -> Tuple[Path, Optional[str]]:
+        """File path and archive member name of an IMC folder file"""
+        if self._members is not None:
+            return self.input_dir, self._members.get(filename, filename)
+        return self.input_dir / filename, None
+
+    def _read_file(self, filepath: Path, member: Optional[str] = None):
+        offset = get_zip_member_offset(filepath, member) if member is not None else 0
+        with self._tiff_pool.open(filepath, member) as tif:
+            return read_tiff_data(tif, offset) if offset is not None else tif.series[0].asarray()
+
+    def close(self):
+        """Close open OME-TIFF files of the parser's own pool."""
+        if self._own_tiff_pool:
+            self._tiff_pool.close()
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
-        pass
+        self.close()
 
 
 if __name__ == "__main__":
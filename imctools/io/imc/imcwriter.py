@@ -1,12 +1,26 @@
 import logging
 import os
+import shutil
 import zipfile
 from pathlib import Path
-from typing import Dict, Union
+from typing import Dict, Optional, Tuple, Union
 
+from imctools.data import AblationImageType
+from imctools.data.acquisitiondata import AcquisitionData
+from imctools.data.histogram import ChannelHistogram
+from imctools.io.imc.manifest import ConversionManifest
 from imctools.io.mcd.mcdparser import McdParser
+from imctools.io.thumbnails import ThumbnailSettings, save_acquisition_thumbnails, save_image_thumbnail
 from imctools.io.txt.txtparser import TxtParser
-from imctools.io.utils import OME_TIFF_SUFFIX, SCHEMA_XML_SUFFIX, SESSION_JSON_SUFFIX
+from imctools.io.utils import (
+    MANIFEST_JSON_SUFFIX,
+    OME_TIFF_SUFFIX,
+    SCHEMA_XML_SUFFIX,
+    SESSION_JSON_SUFFIX,
+    THUMBNAIL_PNG_SUFFIX,
+    atomic_output,
+    get_file_fingerprint,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +37,26 @@ class ImcWriter:
         mcd_parser: McdParser,
         txt_acquisitions_map: Dict[int, Union[str, Path]] = None,
         parse_txt: bool = False,
+        calculate_histograms: bool = True,
+        thumbnails: Optional[ThumbnailSettings] = None,
     ):
         """
         Initializes an ImcFolderWriter that can be used to write out an imcfolder and compress it to zip.
+
+        Parameters
+        ----------
+        root_output_folder
+            Root folder of the IMC folder.
+        mcd_parser
+            MCD file parser.
+        txt_acquisitions_map
+            Acquisition TXT files by acquisition ID.
+        parse_txt
+            Always use TXT files if present to get acquisition image data.
+        calculate_histograms
+            Whether to store channel intensity histograms and percentiles in the session.
+        thumbnails
+            Settings of PNG thumbnails written next to acquisitions, panoramas and ablation images (None to skip them).
         """
         if isinstance(root_output_folder, str):
             root_output_folder = Path(root_output_folder)
@@ -33,57 +64,121 @@ class ImcWriter:
         self.mcd_parser = mcd_parser
         self.txt_acquisitions_map = txt_acquisitions_map
         self.parse_txt = parse_txt
+        self.calculate_histograms = calculate_histograms
+        self.thumbnails = thumbnails
 
     @property
     def folder_name(self):
         return self.mcd_parser.session.metaname
 
-    def write_imc_folder(self, create_zip: bool = True, remove_folder: bool = None):
-        if remove_folder is None:
-            remove_folder = create_zip
+    @property
+    def output_folder(self):
+        return self.root_output_folder / self.folder_name
 
-        output_folder = self.root_output_folder / self.folder_name
+    def write_imc_folder(self, create_zip: bool = True, remove_folder: bool = None, resume: bool = True):
+        """Write IMC folder.
+
+        Parameters
+        ----------
+        create_zip
+            Whether to compress the output folder into a .zip file.
+        remove_folder
+            Whether to remove the output folder after compression (defaults to `create_zip`).
+        resume
+            Skip acquisitions that were completely written by a previous (interrupted) conversion of the same source.
+        """
+        manifest = self.prepare_imc_folder(resume=resume)
+        mcd_xml = self.mcd_parser.get_mcd_xml()
+
+        # Save acquisition images in OME-TIFF format
+        for acquisition in self.mcd_parser.session.acquisitions.values():
+            self.write_acquisition(acquisition.id, self.output_folder, xml_metadata=mcd_xml, manifest=manifest)
+
+        self.finalize_imc_folder(create_zip=create_zip, remove_folder=remove_folder)
+
+    def prepare_imc_folder(self, resume: bool = True, shard: Optional[Tuple[int, int]] = None, follow: bool = False):
+        """Create output IMC folder, save MCD XML metadata and return the conversion manifest.
+
+        Parameters
+        ----------
+        resume
+            Load the manifest of a previous conversion of the same source instead of starting an empty one.
+        shard
+            Shard index and number of shards when the folder is written by several processes/nodes at once. Each shard
+            keeps its own manifest, which are combined by `imctools.converters.merge_imcfolder_shards`.
+        follow
+            Whether the MCD file is still being acquired. Its size and modification time change all the time, so the
+            source is identified by file name and slide UIDs instead.
+        """
+        output_folder = self.output_folder
 
         if not output_folder.exists():
             output_folder.mkdir(parents=True, exist_ok=True)
 
+        # Remove leftovers of atomic writes interrupted by a crash (other shards might still be writing)
+        if shard is None:
+            for tmp_dir in output_folder.glob(".tmp-*"):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
         session = self.mcd_parser.session
 
-        # Save XML metadata if available
+        manifest_name = session.metaname if shard is None else f"{session.metaname}_shard{shard[0]}-of-{shard[1]}"
+        manifest_path = output_folder / (manifest_name + MANIFEST_JSON_SUFFIX)
+        if follow:
+            source_fingerprint = {
+                "name": os.path.basename(self.mcd_parser.mcd_filename),
+                "slide_uids": [slide.uid for slide in session.slides.values()],
+            }
+        else:
+            source_fingerprint = get_file_fingerprint(self.mcd_parser.mcd_filename)
+        source_path = self.mcd_parser.mcd_filename
+        if resume:
+            manifest = ConversionManifest.open(manifest_path, source_fingerprint, source_path=source_path)
+        else:
+            manifest = ConversionManifest(manifest_path, source_fingerprint, source_path=source_path)
+
+        self.write_schema_xml()
+
+        return manifest
+
+    def write_schema_xml(self):
+        """Save MCD XML metadata if available (again whenever the MCD XML of a followed MCD file changes)."""
         mcd_xml = self.mcd_parser.get_mcd_xml()
         if mcd_xml is not None:
-            with open(output_folder / (session.metaname + SCHEMA_XML_SUFFIX), "wt") as f:
-                f.write(mcd_xml)
+            session = self.mcd_parser.session
+            with atomic_output(self.output_folder / (session.metaname + SCHEMA_XML_SUFFIX)) as tmp_path:
+                with open(tmp_path, "wt") as f:
+                    f.write(mcd_xml)
 
-        # Save acquisition images in OME-TIFF format
-        for acquisition in session.acquisitions.values():
-            acquisition_data = self.mcd_parser.get_acquisition_data(acquisition.id)
-            if self.parse_txt or not acquisition_data.is_valid:
-                if self.txt_acquisitions_map is not None and acquisition.id in self.txt_acquisitions_map:
-                    logger.warning(f"Using TXT file for acquisition: {acquisition.id}")
-                    try:
-                        txt_parser = TxtParser(self.txt_acquisitions_map.get(acquisition.id), acquisition.slide_id)
-                        acquisition_data = txt_parser.get_acquisition_data()
-                        acquisition.origin = acquisition_data.acquisition.origin
-                        acquisition.is_valid = acquisition_data.acquisition.is_valid
-                    except:
-                        logger.error(f"Acquisition TXT file is also corrupted")
-
-            if acquisition_data.is_valid:
-                # Calculate channels intensity range
-                for ch in acquisition.channels.values():
-                    img = acquisition_data.get_image_by_name(ch.name)
-                    if img is not None:
-                        ch.min_intensity = round(float(img.min()), 4)
-                        ch.max_intensity = round(float(img.max()), 4)
-                acquisition_data.save_ome_tiff(
-                    output_folder / (acquisition.metaname + OME_TIFF_SUFFIX),
-                    xml_metadata=mcd_xml,
-                )
+    def finalize_imc_folder(self, create_zip: bool = True, remove_folder: bool = None):
+        """Save session JSON and MCD file-specific artifacts once all acquisitions are written, optionally zip the
+        folder.
+
+        Parameters
+        ----------
+        create_zip
+            Whether to compress the output folder into a .zip file.
+        remove_folder
+            Whether to remove the output folder after compression (defaults to `create_zip`).
+        """
+        if remove_folder is None:
+            remove_folder = create_zip
+
+        output_folder = self.output_folder
+        session = self.mcd_parser.session
 
         session.save(output_folder / (session.metaname + SESSION_JSON_SUFFIX))
 
-        # Save MCD file-specific artifacts like ablation images, panoramas, slide images, etc.
+        self.write_artifacts()
+
+        if create_zip:
+            compress_imc_folder(output_folder, remove_folder=remove_folder)
+
+    def write_artifacts(self):
+        """Save MCD file-specific artifacts like ablation images, panoramas, slide images, etc."""
+        output_folder = self.output_folder
+        session = self.mcd_parser.session
+
         for key in session.slides.keys():
             self.mcd_parser.save_slide_image(key, output_folder)
 
@@ -91,24 +186,166 @@ class ImcWriter:
             self.mcd_parser.save_panorama_image(key, output_folder)
 
         for key in session.acquisitions.keys():
-            self.mcd_parser.save_before_ablation_image(key, output_folder)
-            self.mcd_parser.save_after_ablation_image(key, output_folder)
+            self.write_acquisition_artifacts(key)
 
-        if create_zip:
-            with zipfile.ZipFile(
-                self.root_output_folder / (self.folder_name + IMC_ZIP_SUFFIX),
-                "w",
-                compression=zipfile.ZIP_DEFLATED,
-                allowZip64=True,
-            ) as imc_zip:
-                for root, d, files in os.walk(str(output_folder)):
-                    for fn in files:
-                        imc_zip.write(os.path.join(root, fn), fn)
-                        if remove_folder:
-                            os.remove(os.path.join(root, fn))
-
-        if remove_folder:
-            os.removedirs(output_folder)
+        if self.thumbnails is not None:
+            self.write_artifact_thumbnails()
+
+    def write_acquisition_artifacts(self, acquisition_id: int):
+        """Save before and after ablation images of a single acquisition (and their thumbnails).
+
+        Parameters
+        ----------
+        acquisition_id
+            Acquisition ID.
+        """
+        output_folder = self.output_folder
+        self.mcd_parser.save_before_ablation_image(acquisition_id, output_folder)
+        self.mcd_parser.save_after_ablation_image(acquisition_id, output_folder)
+
+        if self.thumbnails is not None:
+            acquisition = self.mcd_parser.session.acquisitions.get(acquisition_id)
+            images = {
+                AblationImageType.BEFORE: self.mcd_parser.get_before_ablation_image(acquisition_id),
+                AblationImageType.AFTER: self.mcd_parser.get_after_ablation_image(acquisition_id),
+            }
+            for image_type, buf in images.items():
+                if buf is not None:
+                    filename = f"{acquisition.metaname}_{image_type.value}{THUMBNAIL_PNG_SUFFIX}"
+                    save_image_thumbnail(buf, output_folder / filename, self.thumbnails.size)
+
+    def write_artifact_thumbnails(self):
+        """Save downscaled PNG thumbnails of panoramas."""
+        output_folder = self.output_folder
+        session = self.mcd_parser.session
+        size = self.thumbnails.size
+
+        for key, panorama in session.panoramas.items():
+            buf = self.mcd_parser.get_panorama_image(key)
+            if buf is not None:
+                save_image_thumbnail(buf, output_folder / (panorama.metaname + "_pano" + THUMBNAIL_PNG_SUFFIX), size)
+
+    def write_acquisition(
+        self,
+        acquisition_id: int,
+        output_folder: Union[str, Path],
+        xml_metadata: Optional[str] = None,
+        manifest: Optional[ConversionManifest] = None,
+        acquisition_data: Optional[AcquisitionData] = None,
+    ):
+        """Write single acquisition in OME-TIFF format (and thumbnails), calculate its channels intensity range and
+        histograms.
+
+        Parameters
+        ----------
+        acquisition_id
+            Acquisition ID.
+        output_folder
+            Output IMC folder.
+        xml_metadata
+            Original MCD-XML metadata to embed into the OME-TIFF file.
+        manifest
+            Conversion manifest used to skip already written acquisitions and to record written ones.
+        acquisition_data
+            Already read acquisition image data (see `read_acquisition_data`), read from the MCD file if not provided.
+        """
+        if isinstance(output_folder, str):
+            output_folder = Path(output_folder)
+        acquisition = self.mcd_parser.session.acquisitions.get(acquisition_id)
+        output_path = output_folder / (acquisition.metaname + OME_TIFF_SUFFIX)
+
+        if manifest is not None and manifest.is_complete(acquisition.id, output_path):
+            logger.info(f"Skipping already converted acquisition: {acquisition.id}")
+            manifest.restore(acquisition)
+            return
+
+        if acquisition_data is None:
+            acquisition_data = read_acquisition_data(
+                self.mcd_parser, acquisition.id, self.txt_acquisitions_map, self.parse_txt
+            )
+
+        if acquisition_data.is_valid:
+            # Calculate channels intensity range and histograms
+            for ch in acquisition.channels.values():
+                img = acquisition_data.get_image_by_name(ch.name)
+                if img is not None:
+                    ch.min_intensity = round(float(img.min()), 4)
+                    ch.max_intensity = round(float(img.max()), 4)
+                    if self.calculate_histograms:
+                        ch.histogram = ChannelHistogram.from_image(img)
+            with atomic_output(output_path) as tmp_path:
+                acquisition_data.save_ome_tiff(tmp_path, xml_metadata=xml_metadata)
+            if self.thumbnails is not None:
+                save_acquisition_thumbnails(acquisition, acquisition_data.image_data, output_folder, self.thumbnails)
+            if manifest is not None:
+                manifest.mark_complete(acquisition, output_path)
+
+
+def read_acquisition_data(
+    mcd_parser: McdParser,
+    acquisition_id: int,
+    txt_acquisitions_map: Optional[Dict[int, Union[str, Path]]] = None,
+    parse_txt: bool = False,
+):
+    """Read acquisition image data from MCD file, falling back to the acquisition TXT file if MCD data is corrupted.
+
+    Parameters
+    ----------
+    mcd_parser
+        MCD file parser.
+    acquisition_id
+        Acquisition ID.
+    txt_acquisitions_map
+        Acquisition TXT files by acquisition ID.
+    parse_txt
+        Always use TXT files if present to get acquisition image data.
+    """
+    acquisition = mcd_parser.session.acquisitions.get(acquisition_id)
+    acquisition_data = mcd_parser.get_acquisition_data(acquisition.id)
+    if parse_txt or not acquisition_data.is_valid:
+        if txt_acquisitions_map is not None and acquisition.id in txt_acquisitions_map:
+            logger.warning(f"Using TXT file for acquisition: {acquisition.id}")
+            try:
+                txt_parser = TxtParser(txt_acquisitions_map.get(acquisition.id), acquisition.slide_id)
+                acquisition_data = txt_parser.get_acquisition_data()
+                acquisition.origin = acquisition_data.acquisition.origin
+                acquisition.is_valid = acquisition_data.acquisition.is_valid
+            except:
+                logger.error(f"Acquisition TXT file is also corrupted")
+    return acquisition_data
+
+
+def compress_imc_folder(output_folder: Union[str, Path], remove_folder: bool = True, store_images: bool = False):
+    """Compress IMC folder into a .zip file next to it.
+
+    Parameters
+    ----------
+    output_folder
+        IMC folder.
+    remove_folder
+        Whether to remove the folder after compression.
+    store_images
+        Store OME-TIFF files without zip compression, so that they can be memory-mapped within the archive.
+    """
+    if isinstance(output_folder, str):
+        output_folder = Path(output_folder)
+    with zipfile.ZipFile(
+        output_folder.parent / (output_folder.name + IMC_ZIP_SUFFIX),
+        "w",
+        compression=zipfile.ZIP_DEFLATED,
+        allowZip64=True,
+    ) as imc_zip:
+        for root, d, files in os.walk(str(output_folder)):
+            for fn in files:
+                # Conversion manifest is only relevant for the IMC folder itself
+                if not fn.endswith(MANIFEST_JSON_SUFFIX):
+                    compress_type = zipfile.ZIP_STORED if store_images and fn.endswith(OME_TIFF_SUFFIX) else None
+                    imc_zip.write(os.path.join(root, fn), fn, compress_type=compress_type)
+                if remove_folder:
+                    os.remove(os.path.join(root, fn))
+
+    if remove_folder:
+        os.removedirs(output_folder)
 
 
 if __name__ == "__main__":
@@ -117,7 +354,8 @@ if __name__ == "__main__":
     tic = timeit.default_timer()
 
     with McdParser(
-        "/home/anton/Documents/IMC Workshop 2019/Data/iMC_workshop_2019/20190919_FluidigmBrCa_SE/20190919_FluidigmBrCa_SE.mcd"
+        "/home/anton/Documents/IMC Workshop 2019/Data/iMC_workshop_2019/20190919_FluidigmBrCa_SE/"
+        "20190919_FluidigmBrCa_SE.mcd"
     ) as parser:
         imc_writer = ImcWriter("/home/anton/Downloads/imc_from_mcd", parser)
         imc_writer.write_imc_folder()
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from imctools import __version__
+from imctools.data import Acquisition
+from imctools.data.histogram import ChannelHistogram
+from imctools.io.utils import atomic_output, get_file_checksum
+
+logger = logging.getLogger(__name__)
+
+STATUS_COMPLETE = "complete"
+
+
+class ConversionManifest:
+    """Bookkeeping of an IMC folder conversion.
+
+    Keeps the fingerprint of the conversion source together with the checksum and channel intensity ranges/histograms of
+    every written acquisition, so an interrupted conversion can be resumed without redoing verified acquisitions.
+    """
+
+    def __init__(
+        self, filepath: Union[str, Path], source_fingerprint: Dict[str, Any], source_path: Optional[str] = None
+    ):
+        """
+        Parameters
+        ----------
+        filepath
+            Manifest JSON file path.
+        source_fingerprint
+            Fingerprint of the conversion source (see `imctools.io.utils.get_file_fingerprint`).
+        source_path
+            Path to the conversion source.
+        """
+        if isinstance(filepath, str):
+            filepath = Path(filepath)
+        self.filepath = filepath
+        self.source_fingerprint = source_fingerprint
+        self.source_path = source_path
+        self.acquisitions: Dict[str, Dict[str, Any]] = dict()
+
+    @staticmethod
+    def open(filepath: Union[str, Path], source_fingerprint: Dict[str, Any], source_path: Optional[str] = None):
+        """Load an existing manifest, or start an empty one if it is missing or belongs to a different source.
+
+        Parameters
+        ----------
+        filepath
+            Manifest JSON file path.
+        source_fingerprint
+            Fingerprint of the conversion source.
+        source_path
+            Path to the conversion source.
+        """
+        manifest = ConversionManifest(filepath, source_fingerprint, source_path=source_path)
+        if manifest.filepath.exists():
+            try:
+                with open(manifest.filepath, "r") as f:
+                    data = json.load(f)
+            except ValueError:
+                logger.warning(f"Ignoring unreadable conversion manifest: {manifest.filepath}")
+                return manifest
+            if data.get("source") == source_fingerprint:
+                manifest.acquisitions = data.get("acquisitions", dict())
+            else:
+                logger.info(f"Source has changed since last conversion, ignoring manifest: {manifest.filepath}")
+        return manifest
+
+    @staticmethod
+    def load(filepath: Union[str, Path]):
+        """Load an existing manifest as is.
+
+        Parameters
+        ----------
+        filepath
+            Manifest JSON file path.
+        """
+        with open(filepath, "r") as f:
+            data = json.load(f)
+        manifest = ConversionManifest(filepath, data.get("source"), source_path=data.get("source_path"))
+        manifest.acquisitions = data.get("acquisitions", dict())
+        return manifest
+
+    def is_complete(self, acquisition_id: int, output_path: Union[str, Path]):
+        """Whether acquisition output was completely written and is still intact.
+
+        Parameters
+        ----------
+        acquisition_id
+            Acquisition ID.
+        output_path
+            Acquisition output file path.
+        """
+        entry = self.acquisitions.get(str(acquisition_id))
+        if entry is None or entry.get("status") != STATUS_COMPLETE:
+            return False
+        if not os.path.exists(output_path) or os.path.getsize(output_path) != entry.get("size"):
+            return False
+        return get_file_checksum(output_path) == entry.get("checksum")
+
+    def restore(self, acquisition: Acquisition):
+        """Restore acquisition attributes computed during a previous conversion.
+
+        Parameters
+        ----------
+        acquisition
+            Acquisition to update.
+        """
+        entry = self.acquisitions[str(acquisition.id)]
+        acquisition.origin = entry.get("origin", acquisition.origin)
+        acquisition.is_valid = True
+        for ch in acquisition.channels.values():
+            intensities = entry["channels"].get(ch.name)
+            if intensities is not None:
+                ch.min_intensity, ch.max_intensity = intensities
+            histogram = entry.get("histograms", dict()).get(ch.name)
+            if histogram is not None:
+                ch.histogram = ChannelHistogram.from_dict(histogram)
+
+    def mark_complete(self, acquisition: Acquisition, output_path: Union[str, Path]):
+        """Record a successfully written acquisition and persist the manifest.
+
+        Parameters
+        ----------
+        acquisition
+            Written acquisition.
+        output_path
+            Acquisition output file path.
+        """
+        self.add_entry(acquisition.id, ConversionManifest.create_entry(acquisition, output_path))
+
+    def add_entry(self, acquisition_id: int, entry: Dict[str, Any]):
+        """Record an acquisition entry (e.g. created by a worker process) and persist the manifest.
+
+        Parameters
+        ----------
+        acquisition_id
+            Acquisition ID.
+        entry
+            Manifest entry created with `ConversionManifest.create_entry`.
+        """
+        self.acquisitions[str(acquisition_id)] = entry
+        self.save()
+
+    @staticmethod
+    def create_entry(acquisition: Acquisition, output_path: Union[str, Path]):
+        """Create manifest entry of a successfully written acquisition.
+
+        Parameters
+        ----------
+        acquisition
+            Written acquisition.
+        output_path
+            Acquisition output file path.
+        """
+        return {
+            "status": STATUS_COMPLETE,
+            "filename": os.path.basename(output_path),
+            "size": os.path.getsize(output_path),
+            "checksum": get_file_checksum(output_path),
+            "origin": acquisition.origin,
+            "channels": {ch.name: [ch.min_intensity, ch.max_intensity] for ch in acquisition.channels.values()},
+            "histograms": {
+                ch.name: ch.histogram.__getstate__() for ch in acquisition.channels.values() if ch.histogram is not None
+            },
+            "completed": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def save(self):
+        """Save manifest atomically."""
+        data = {
+            "imctools_version": __version__,
+            "source": self.source_fingerprint,
+            "source_path": self.source_path,
+            "acquisitions": self.acquisitions,
+        }
+        with atomic_output(self.filepath) as tmp_path:
+            with open(tmp_path, "wt") as f:
+                json.dump(data, f, indent=2)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(filepath={self.filepath})"
@@ -1,19 +1,27 @@
+import hashlib
 import logging
 import mmap
 import os
 from pathlib import Path
-from typing import BinaryIO, Optional, Union
+from typing import BinaryIO, Optional, Sequence, Set, Tuple, Union
 
 import numpy as np
 
 import imctools.io.mcd.constants as const
 from imctools.data import AblationImageType, Acquisition
-from imctools.data.acquisitiondata import AcquisitionData
+from imctools.data.acquisitiondata import AcquisitionData, AcquisitionStack, ImageSource, stack_acquisitions, to_dataset
+from imctools.io.cache import AcquisitionCache, bin_image_stack
 from imctools.io.mcd.mcdxmlparser import McdXmlParser
-from imctools.io.utils import reshape_long_2_cyx
+from imctools.io.utils import atomic_output, reshape_long_2_cyx
 
 logger = logging.getLogger(__name__)
 
+# Target size of the blocks of MCD file rows read by lazily loaded acquisitions
+_LAZY_CHUNK_BYTES = 32 * 1024 * 1024
+
+# Channel-major cache folder created next to MCD files
+CHANNEL_CACHE_FOLDER = ".imctools_cache"
+
 
 class McdParser:
     """Raw MCD file parser.
@@ -22,55 +30,192 @@ class McdParser:
     """
 
     def __init__(
-        self, filepath: Union[str, Path], file_handle: BinaryIO = None, xml_metadata_filepath: Union[str, Path] = None
+        self,
+        filepath: Union[str, Path],
+        file_handle: BinaryIO = None,
+        xml_metadata_filepath: Union[str, Path] = None,
+        follow: bool = False,
+        cache: Optional[AcquisitionCache] = None,
+        channel_cache: Union[bool, str, Path] = False,
     ):
+        """
+        Parameters
+        ----------
+        filepath
+            Path to MCD file.
+        file_handle
+            Already opened MCD file handle.
+        xml_metadata_filepath
+            Path to MCD XML schema file, for MCD files with corrupted metadata.
+        follow
+            Follow an MCD file that is still being acquired: a missing MCD XML is not an error, and metadata can be
+            updated with the `refresh` method.
+        cache
+            Cache of decoded acquisition image data (can be shared by several parsers).
+        channel_cache
+            Store acquisitions channel by channel in .npy files on first access and read image data from them, so
+            reading a single channel is a contiguous read. True stores them in a folder next to the MCD file, a path in
+            the given cache folder. Not used when following an MCD file that is still being acquired. Image data are
+            then returned as read-only memory maps of the cache files; if the cache can't be written (e.g. read-only
+            share), image data are read from the MCD file instead.
+        """
+        self._cache = cache
         if file_handle is None:
             self._fh = open(filepath, mode="rb")
         else:
             self._fh = file_handle
+        self._channel_cache_dir: Optional[Path] = None
+        if channel_cache and not follow:
+            if channel_cache is True:
+                channel_cache = Path(self.mcd_filename).parent / CHANNEL_CACHE_FOLDER
+            self._channel_cache_dir = Path(channel_cache)
 
         if xml_metadata_filepath is None:
             self._meta_fh = self._fh
         else:
             self._meta_fh = open(xml_metadata_filepath, mode="rb")
 
-        encoding = "utf-8" if xml_metadata_filepath is not None else "utf-16-le"
-        mcd_xml = self._get_mcd_xml(encoding=encoding)
-        self._xml_parser = McdXmlParser(mcd_xml, self._fh.name)
+        self._encoding = "utf-8" if xml_metadata_filepath is not None else "utf-16-le"
+        self._mcd_xml_offset = 0
+        self._file_size = os.fstat(self._fh.fileno()).st_size
+        self._completed_acquisition_ids: Set[int] = set()
+        self._xml_parser: Optional[McdXmlParser] = None
+        try:
+            mcd_xml = self._get_mcd_xml(encoding=self._encoding)
+            self._xml_parser = McdXmlParser(mcd_xml, self._fh.name)
+        except ValueError:
+            if not follow:
+                raise
+            logger.info(f"MCD XML not available yet: {self.mcd_filename}")
 
     @property
     def origin(self):
-        return self._xml_parser.origin
+        return "mcd"
 
     @property
     def session(self):
-        return self._xml_parser.session
+        return self._xml_parser.session if self._xml_parser is not None else None
 
     def get_mcd_xml(self):
         """Original (raw) metadata from MCD file in XML format."""
-        return self._xml_parser.get_mcd_xml()
+        return self._xml_parser.get_mcd_xml() if self._xml_parser is not None else None
+
+    def refresh(self):
+        """Update metadata of an MCD file that is still being acquired and return IDs of newly completed acquisitions.
+
+        Only the part of the file written since the previously found MCD XML is searched for updated metadata, and the
+        session is only re-parsed if the MCD XML has changed. Every completed acquisition is reported only once.
+        """
+        file_size = os.fstat(self._fh.fileno()).st_size
+        if file_size != self._file_size:
+            self._file_size = file_size
+            try:
+                mcd_xml = self._get_mcd_xml(encoding=self._encoding, search_start=self._mcd_xml_offset)
+            except ValueError:
+                mcd_xml = None
+            if mcd_xml is not None and mcd_xml != self.get_mcd_xml():
+                session_id = self.session.id if self.session is not None else None
+                self._xml_parser = McdXmlParser(mcd_xml, self._fh.name, session_id=session_id)
+
+        completed_ids = []
+        if self.session is not None:
+            for acquisition in self.session.acquisitions.values():
+                if acquisition.id in self._completed_acquisition_ids:
+                    continue
+                if self._is_acquisition_data_complete(acquisition):
+                    self._completed_acquisition_ids.add(acquisition.id)
+                    completed_ids.append(acquisition.id)
+        return completed_ids
+
+    def _is_acquisition_data_complete(self, acquisition: Acquisition):
+        """Whether acquisition data is completely written to the MCD file."""
+        try:
+            start_offset = int(acquisition.metadata.get(const.DATA_START_OFFSET))
+            end_offset = int(acquisition.metadata.get(const.DATA_END_OFFSET))
+        except (TypeError, ValueError):
+            return False
+        return start_offset < end_offset < self._file_size
 
     @property
     def mcd_filename(self):
         """Name of the open MCD file"""
         return self._fh.name
 
-    def get_acquisition_data(self, acquisition_id: int):
-        """Returns AcquisitionData object with binary image data for given acquisition ID"""
+    def get_acquisition_data(self, acquisition_id: int, lazy: bool = False):
+        """Returns AcquisitionData object with binary image data for given acquisition ID
+
+        Parameters
+        ----------
+        acquisition_id
+            Acquisition ID.
+        lazy
+            Read image data from the MCD file only when accessed, and then only the requested channels.
+        """
         acquisition = self.session.acquisitions.get(acquisition_id)
         if acquisition is None:
             return None
+        if lazy:
+            if self._channel_cache_dir is not None:
+                image_data = self._get_channel_cache_data(acquisition)
+                if image_data is not None:
+                    return AcquisitionData(acquisition, image_data)
+            source = self._get_acquisition_image_source(acquisition)
+            if source is not None:
+                return AcquisitionData(acquisition, None, source=source)
         try:
-            data = self._get_acquisition_raw_data(acquisition)
-            image_data = reshape_long_2_cyx(data, is_sorted=True)
-            # Drop first three channels X, Y, Z
-            image_data = image_data[3:]
+            if self._cache is not None:
+                key = AcquisitionCache.create_key(self.mcd_filename, acquisition.id)
+                image_data = self._cache.get_or_load(key, lambda: self._read_image_data(acquisition))
+            else:
+                image_data = self._read_image_data(acquisition)
         except:
             image_data = None
             acquisition.is_valid = False
             logger.warning(f"Error reading MCD acquisition: {acquisition_id}")
         return AcquisitionData(acquisition, image_data)
 
+    def get_image_stack(self, acquisition_id: int, names: Optional[Sequence[str]] = None, binning: int = 1):
+        """Returns acquisition image stack (channel, y, x) of selected channels, None for invalid acquisitions.
+
+        Stacks are cached (as read-only arrays) if the parser has a cache.
+
+        Parameters
+        ----------
+        acquisition_id
+            Acquisition ID.
+        names
+            Channel names (all channels if None).
+        binning
+            Average image data over binning x binning pixel blocks.
+        """
+        if names is None and binning == 1:
+            return self.get_acquisition_data(acquisition_id).image_data
+
+        def load():
+            acquisition_data = self.get_acquisition_data(acquisition_id, lazy=True)
+            if acquisition_data is None or not acquisition_data.is_valid:
+                return None
+            if names is None:
+                return bin_image_stack(acquisition_data.image_data, binning)
+            return bin_image_stack(acquisition_data.get_image_stack_by_names(names), binning)
+
+        if self._cache is None:
+            return load()
+        return self._cache.get_or_load(
+            AcquisitionCache.create_key(self.mcd_filename, acquisition_id, names, binning), load
+        )
+
+    def _read_image_data(self, acquisition: Acquisition):
+        """Read and reshape image data of the acquisition."""
+        if self._channel_cache_dir is not None:
+            image_data = self._get_channel_cache_data(acquisition)
+            if image_data is not None:
+                return image_data
+        data = self._get_acquisition_raw_data(acquisition)
+        image_data = reshape_long_2_cyx(data, is_sorted=True)
+        # Drop first three channels X, Y, Z
+        return image_data[3:]
+
     def _get_acquisition_raw_data(self, acquisition: Acquisition):
         """Gets non-reshaped image data from the acquisition.
 
@@ -95,6 +240,98 @@ class McdParser:
         )
         return data
 
+    def _get_channel_cache_data(self, acquisition: Acquisition):
+        """Memory-mapped channel-major (channel, y, x) image data, stored in the channel cache on first access.
+
+        Returns None for acquisitions that can't be read lazily, which are not cached, and if the cache can't be written
+        (the channel cache is then disabled).
+        """
+        source = self._get_acquisition_image_source(acquisition)
+        if source is None:
+            return None
+        stat = os.stat(self.mcd_filename)
+        fingerprint = f"{os.path.abspath(self.mcd_filename)}:{stat.st_size}:{stat.st_mtime_ns}"
+        folder_name = f"{Path(self.mcd_filename).stem}_{hashlib.sha1(fingerprint.encode()).hexdigest()[:12]}"
+        filepath = self._channel_cache_dir / folder_name / f"{acquisition.metaname}.npy"
+        if filepath.exists():
+            image_data = np.load(filepath, mmap_mode="r")
+            if image_data.shape == source.shape and image_data.dtype == source.dtype:
+                return image_data
+        try:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            # Streaming transpose: one pass over blocks of MCD file rows, written plane by plane
+            with atomic_output(filepath) as tmp_path:
+                image_data = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=source.dtype, shape=source.shape)
+                rows = source.chunks[1]
+                for start_row in range(0, source.shape[1], rows):
+                    image_data[:, start_row : start_row + rows] = source[:, start_row : start_row + rows]
+                image_data.flush()
+                del image_data
+        except OSError as e:
+            logger.warning(f"Cannot write channel cache {self._channel_cache_dir}, reading the MCD file instead: {e}")
+            self._channel_cache_dir = None
+            return None
+        return np.load(filepath, mmap_mode="r")
+
+    def _get_acquisition_image_source(self, acquisition: Acquisition):
+        """Lazily readable image data of the acquisition, None if its layout can't be verified without reading it."""
+        try:
+            data = self._get_acquisition_raw_data(acquisition)
+        except (TypeError, ValueError):
+            return None
+        width = acquisition.max_x
+        if data is None or not width or data.shape[0] < width:
+            return None
+        # Pixels are stored row by row: the first image row ends at X = width - 1, the next one starts at X = 0
+        if data[width - 1, 0] != width - 1 or (data.shape[0] > width and data[width, 0] != 0):
+            return None
+        return McdImageSource(self.mcd_filename, data.offset, acquisition.n_channels, width, data.shape[0] // width)
+
+    def get_acquisitions_stack(
+        self,
+        acquisition_ids: Sequence[int],
+        channels: Optional[Sequence[str]] = None,
+        pad_to: Optional[Tuple[int, int]] = None,
+        fill: float = 0,
+        n_workers: Optional[int] = None,
+    ) -> AcquisitionStack:
+        """Returns image data of several acquisitions as one (acquisition, channel, y, x) array with aligned channels.
+
+        Channels are aligned by name, label or mass, missing channels are flagged in the mask of the returned stack.
+        Image data are read in parallel directly into the preallocated array.
+
+        Parameters
+        ----------
+        acquisition_ids
+            Acquisition IDs.
+        channels
+            Channel names, labels or masses, by default all channels (by mass) in order of appearance.
+        pad_to
+            Image size (y, x) of the stack, by default the maximum size of the acquisitions.
+        fill
+            Value of padding pixels and missing channels.
+        n_workers
+            Number of reader threads (defaults to the number of CPUs).
+        """
+        acquisitions = []
+        for acquisition_id in acquisition_ids:
+            acquisition_data = self.get_acquisition_data(acquisition_id, lazy=True)
+            if acquisition_data is None:
+                raise ValueError(f"Acquisition not found: {acquisition_id}")
+            acquisitions.append(acquisition_data)
+        return stack_acquisitions(acquisitions, channels, pad_to, fill, n_workers=n_workers)
+
+    def to_dataset(self, lazy: bool = True):
+        """Get all valid acquisitions as xarray Dataset with a harmonized channel coordinate
+
+        Parameters
+        ----------
+        lazy
+            Whether to load the image data lazily with dask.
+        """
+        acquisitions = [self.get_acquisition_data(a, lazy=lazy) for a in self.session.acquisitions.keys()]
+        return to_dataset([a for a in acquisitions if a.is_valid], lazy=lazy)
+
     def get_slide_image(self, slide_id: int):
         """Get slide image as numpy array"""
         image_offset_fix = 161
@@ -261,14 +498,21 @@ class McdParser:
         self.close()
         self._fh = open(filename, mode="rb")
 
-    def _get_mcd_xml(self, start_str: str = "<MCDSchema", stop_str: str = "</MCDSchema>", encoding: str = "utf-16-le"):
+    def _get_mcd_xml(
+        self,
+        start_str: str = "<MCDSchema",
+        stop_str: str = "</MCDSchema>",
+        encoding: str = "utf-16-le",
+        search_start: int = 0,
+    ):
         with mmap.mmap(self._meta_fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
             # MCD format documentation recommends searching from end for "<MCDSchema"
-            start_offset = mm.rfind(start_str.encode(encoding))
+            start_offset = mm.rfind(start_str.encode(encoding), search_start)
             if start_offset == -1:
                 raise ValueError(f"Invalid file {self.mcd_filename}: MCD XML start tag not found.")
+            self._mcd_xml_offset = start_offset
             mm.seek(start_offset)
-            stop_offset = mm.rfind(stop_str.encode(encoding))
+            stop_offset = mm.rfind(stop_str.encode(encoding), start_offset)
             if stop_offset == -1:
                 raise ValueError(f"Invalid file {self.mcd_filename}: MCD XML stop tag not found.")
             else:
@@ -294,6 +538,50 @@ class McdParser:
         self.close()
 
 
+class McdImageSource(ImageSource):
+    """Acquisition image data read lazily from the pixel-interleaved rows of an MCD file."""
+
+    def __init__(self, filename: str, offset: int, n_channels: int, width: int, height: int):
+        """
+        Parameters
+        ----------
+        filename
+            MCD file path.
+        offset
+            Acquisition data start offset.
+        n_channels
+            Number of acquisition channels (without X, Y, Z).
+        width
+            Image width.
+        height
+            Number of complete image rows.
+        """
+        self.filename = filename
+        self.offset = offset
+        # Taking into account 3 channels X, Y, Z!
+        self._n_columns = n_channels + 3
+        self.shape = (n_channels, height, width)
+        self.dtype = np.dtype(np.float32)
+        rows = max(1, _LAZY_CHUNK_BYTES // (width * self._n_columns * self.dtype.itemsize))
+        self.chunks = (n_channels, min(rows, height), width)
+
+    def _read(self, channels, start_row, stop_row):
+        width = self.shape[2]
+        row_size = width * self._n_columns * self.dtype.itemsize
+        data = np.memmap(
+            self.filename,
+            dtype=self.dtype,
+            mode="r",
+            offset=self.offset + start_row * row_size,
+            shape=((stop_row - start_row) * width, self._n_columns),
+        )
+        data = data[:, [c + 3 for c in channels]]
+        return data.reshape(stop_row - start_row, width, len(channels)).transpose(2, 0, 1)
+
+    def __dask_tokenize__(self):
+        return self.filename, os.path.getmtime(self.filename), self.offset, self.shape
+
+
 if __name__ == "__main__":
     import timeit
 
@@ -1,6 +1,7 @@
 import os
 import uuid
 from datetime import datetime, timezone
+from typing import Optional
 
 import xmltodict
 from dateutil.parser import parse
@@ -14,7 +15,7 @@ from imctools.io.utils import sort_acquisition_channels
 class McdXmlParser:
     """Converts MCD XML structure into IMC session format."""
 
-    def __init__(self, mcd_xml: str, source_path: str, process_namespaces=False):
+    def __init__(self, mcd_xml: str, source_path: str, process_namespaces=False, session_id: Optional[str] = None):
         """
         Parameters
         ----------
@@ -24,6 +25,8 @@ class McdXmlParser:
             Path to original source .mcd file.
         process_namespaces
             Whether to process XML namespaces
+        session_id
+            Session ID to use instead of a newly generated one (e.g. when re-parsing a growing MCD file).
         """
         self._mcd_xml = mcd_xml
 
@@ -51,7 +54,8 @@ class McdXmlParser:
         session_name = os.path.split(session_name)[1].rstrip("_schema.xml")
         session_name = os.path.splitext(session_name)[0]
 
-        session_id = str(uuid.uuid4())
+        if session_id is None:
+            session_id = str(uuid.uuid4())
         session = Session(
             session_id,
             session_name,
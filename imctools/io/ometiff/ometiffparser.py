@@ -1,11 +1,21 @@
+import os
+import threading
 import xml.etree.ElementTree as ET
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Union
+from typing import Iterator, Optional, Tuple, Union
 
+import numpy as np
 import tifffile
 
 from imctools.data import Acquisition, Channel
-from imctools.data.acquisitiondata import AcquisitionData
+from imctools.data.acquisitiondata import AcquisitionData, ImageSource
+from imctools.io.utils import get_zip_member_offset
+
+# Default number of open TIFF files kept by a TIFF file pool
+DEFAULT_MAX_TIFF_FILES = 8
 
 
 class OmeTiffParser:
@@ -14,12 +24,31 @@ class OmeTiffParser:
     Allows to get a single IMC acquisition from a single OME-TIFF file.
     """
 
-    def __init__(self, filepath: Union[str, Path], slide_id: int = 0, channel_id_offset: int = 0):
+    def __init__(
+        self,
+        filepath: Union[str, Path],
+        slide_id: int = 0,
+        channel_id_offset: int = 0,
+        calculate_intensity_range: bool = True,
+    ):
+        """
+        Parameters
+        ----------
+        filepath
+            OME-TIFF file path.
+        slide_id
+            Slide ID assigned to the acquisition.
+        channel_id_offset
+            ID of the first channel.
+        calculate_intensity_range
+            Whether to calculate channels intensity range (requires a full pass over the image data).
+        """
         if isinstance(filepath, str):
             filepath = Path(filepath)
         self._filepath = filepath
         self._slide_id = slide_id
         self._channel_id_offset = channel_id_offset
+        self._calculate_intensity_range = calculate_intensity_range
         self._acquisition_data = self._parse_acquisition(filepath)
 
     @property
@@ -85,11 +114,11 @@ class OmeTiffParser:
             acquisition.channels[channel.id] = channel
 
         acquisition_data = AcquisitionData(acquisition, image_data)
-        # Calculate channels intensity range
-        for ch in acquisition.channels.values():
-            img = acquisition_data.get_image_by_name(ch.name)
-            ch.min_intensity = round(float(img.min()), 4)
-            ch.max_intensity = round(float(img.max()), 4)
+        if self._calculate_intensity_range:
+            for ch in acquisition.channels.values():
+                img = acquisition_data.get_image_by_name(ch.name)
+                ch.min_intensity = round(float(img.min()), 4)
+                ch.max_intensity = round(float(img.max()), 4)
 
         return acquisition_data
 
@@ -122,7 +151,7 @@ class OmeTiffParser:
     @staticmethod
     def _read_file(filepath: Path):
         with tifffile.TiffFile(filepath) as tif:
-            data = tif.asarray(out="memmap")
+            data = read_tiff_data(tif)
             try:
                 ome_xml = tif.pages[0].tags["ImageDescription"].value
             except:
@@ -136,6 +165,207 @@ class OmeTiffParser:
         pass
 
 
+class TiffFilePool:
+    """Small LRU pool of open TIFF files, so repeated reads of the same files don't re-parse their structure.
+
+    Files are identified by path, size and modification time (modified files are re-opened). An open file is used by one
+    thread at a time.
+    """
+
+    def __init__(self, max_files: int = DEFAULT_MAX_TIFF_FILES):
+        """
+        Parameters
+        ----------
+        max_files
+            Maximum number of open files.
+        """
+        self.max_files = max_files
+        self._files: "OrderedDict[tuple, Tuple[tifffile.TiffFile, threading.Lock]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, filepath: Union[str, Path], member: Optional[str] = None) -> Iterator[tifffile.TiffFile]:
+        """Open TIFF file from the pool (or add it to the pool) for exclusive use within the context.
+
+        Parameters
+        ----------
+        filepath
+            TIFF file path (zip archive path if member is set).
+        member
+            Name of the TIFF file within a zip archive.
+        """
+        stat = os.stat(filepath)
+        key = (os.path.abspath(filepath), member, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is not None:
+                self._files.move_to_end(key)
+        if entry is None:
+            entry = (open_tiff(filepath, member), threading.Lock())
+            with self._lock:
+                if key in self._files:
+                    entry[0].close()
+                    entry = self._files[key]
+                else:
+                    self._files[key] = entry
+                    self._evict()
+        tif, lock = entry
+        with lock:
+            if _is_closed(tif):
+                # Evicted by another thread meanwhile, use a private handle
+                with open_tiff(filepath, member) as tif:
+                    yield tif
+            else:
+                yield tif
+
+    def _evict(self):
+        while len(self._files) > self.max_files:
+            _, (tif, lock) = self._files.popitem(last=False)
+            with lock:
+                tif.close()
+
+    def close(self):
+        """Close all open files."""
+        with self._lock:
+            while len(self._files) > 0:
+                _, (tif, lock) = self._files.popitem(last=False)
+                with lock:
+                    tif.close()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(max_files={self.max_files})"
+
+
+class OmeTiffImageSource(ImageSource):
+    """Acquisition image data read lazily from OME-TIFF file pages (one page per channel).
+
+    Uncompressed, contiguously stored image data is memory-mapped, otherwise only the pages of requested channels are
+    decoded. OME-TIFF files can also be read from zip archives, in place.
+    """
+
+    def __init__(self, filepath: Union[str, Path], pool: Optional[TiffFilePool] = None, member: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        filepath
+            OME-TIFF file path (zip archive path if member is set).
+        pool
+            Pool of open TIFF files to read from (files are opened for every read otherwise).
+        member
+            Name of the OME-TIFF file within a zip archive.
+        """
+        self.filepath = str(filepath)
+        self.member = member
+        self._pool = pool
+        offset = get_zip_member_offset(filepath, member) if member is not None else 0
+        with self._open() as tif:
+            page = tif.pages[0]
+            self.shape = (len(tif.pages),) + tuple(page.shape[-2:])
+            self.dtype = np.dtype(page.dtype)
+            self._memmap = get_tiff_memmap(tif, offset) if offset is not None else None
+        self.chunks = (1,) + self.shape[1:]
+
+    def _open(self):
+        if self._pool is not None:
+            return self._pool.open(self.filepath, self.member)
+        return open_tiff(self.filepath, self.member)
+
+    def _read(self, channels, start_row, stop_row):
+        if self._memmap is not None:
+            return np.asarray(self._memmap.reshape(self.shape)[channels, start_row:stop_row])
+        with self._open() as tif:
+            return np.stack([tif.pages[c].asarray()[start_row:stop_row] for c in channels])
+
+    def __dask_tokenize__(self):
+        return self.filepath, self.member, os.path.getmtime(self.filepath)
+
+
+def open_tiff(filepath: Union[str, Path], member: Optional[str] = None) -> tifffile.TiffFile:
+    """Open TIFF file, or TIFF file within a zip archive without extracting it.
+
+    Members stored without compression are opened at their offset within the archive file, compressed members are
+    decompressed while reading.
+
+    Parameters
+    ----------
+    filepath
+        TIFF file path (zip archive path if member is set).
+    member
+        Name of the TIFF file within the zip archive.
+    """
+    if member is None:
+        return tifffile.TiffFile(str(filepath))
+    offset = get_zip_member_offset(filepath, member)
+    if offset is None:
+        return _ArchivedTiffFile(filepath, member)
+    with zipfile.ZipFile(filepath) as zf:
+        size = zf.getinfo(member).file_size
+    return tifffile.TiffFile(str(filepath), offset=offset, size=size)
+
+
+def get_tiff_memmap(tif: tifffile.TiffFile, offset: int = 0) -> Optional[np.memmap]:
+    """Read-only memory map of the image data of the first TIFF series, None if it isn't stored uncompressed and
+    contiguously.
+
+    Parameters
+    ----------
+    tif
+        Open TIFF file.
+    offset
+        Offset of the TIFF file within its file on disk (e.g. of a zip archive member stored without compression).
+    """
+    if not tif.filehandle.is_file:
+        return None
+    series = tif.series[0]
+    # tifffile >= 2021.10 renamed the data offset of series
+    data_offset = series.dataoffset if hasattr(series, "dataoffset") else series.offset
+    if data_offset is None:
+        return None
+    dtype = np.dtype(series.dtype).newbyteorder(tif.byteorder)
+    return np.memmap(tif.filehandle.path, dtype=dtype, mode="r", offset=offset + data_offset, shape=series.shape)
+
+
+def read_tiff_data(tif: tifffile.TiffFile, offset: int = 0) -> np.ndarray:
+    """Image data of the first TIFF series: memory-mapped if stored uncompressed and contiguously, decoded otherwise.
+
+    Parameters
+    ----------
+    tif
+        Open TIFF file.
+    offset
+        Offset of the TIFF file within its file on disk, see `get_tiff_memmap`.
+    """
+    data = get_tiff_memmap(tif, offset)
+    if data is None:
+        data = tif.series[0].asarray()
+    return data
+
+
+class _ArchivedTiffFile(tifffile.TiffFile):
+    """TIFF file read through a (seekable) decompressing stream of a zip archive member."""
+
+    def __init__(self, filepath: Union[str, Path], member: str):
+        self._archive = zipfile.ZipFile(filepath)
+        self._stream = self._archive.open(member)
+        super().__init__(self._stream, name=member)
+
+    @property
+    def closed(self):
+        return self._stream.closed
+
+    def close(self):
+        super().close()
+        self._stream.close()
+        self._archive.close()
+
+
+def _is_closed(tif: tifffile.TiffFile) -> bool:
+    return tif.filehandle.closed or getattr(tif, "closed", False)
+
+
 if __name__ == "__main__":
     import timeit
 
@@ -0,0 +1,167 @@
+import logging
+import math
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Sequence, Union
+
+import imagecodecs
+import numpy as np
+
+from imctools.data import Acquisition
+from imctools.io.cache import bin_image_stack
+from imctools.io.utils import THUMBNAIL_PNG_SUFFIX, atomic_output
+
+logger = logging.getLogger(__name__)
+
+# Default size of the longer thumbnail side (in pixels)
+DEFAULT_THUMBNAIL_SIZE = 256
+
+
+class ThumbnailSettings(NamedTuple):
+    """Thumbnail generation settings.
+
+    Every acquisition gets an overview thumbnail (average of all channels) and one RGB thumbnail per composite, which
+    maps channel names or labels to the red, green and blue color channels (None leaves a color channel empty).
+    """
+
+    size: int = DEFAULT_THUMBNAIL_SIZE
+    lower_percentile: float = 1.0
+    upper_percentile: float = 99.0
+    composites: Optional[Dict[str, Sequence[Optional[str]]]] = None
+
+
+def get_thumbnail_binning(height: int, width: int, size: int) -> int:
+    """Binning factor reducing the longer image side to at most `size` pixels"""
+    return max(1, math.ceil(max(height, width) / size))
+
+
+def normalize_image(img: np.ndarray, lower_percentile: float = 1.0, upper_percentile: float = 99.0) -> np.ndarray:
+    """Clip image at intensity percentiles and scale it to 8-bit range.
+
+    Parameters
+    ----------
+    img
+        Input image.
+    lower_percentile
+        Percentile mapped to black (0-100).
+    upper_percentile
+        Percentile mapped to white (0-100).
+    """
+    lower, upper = np.nanpercentile(img, (lower_percentile, upper_percentile))
+    if not upper > lower:
+        upper = lower + 1
+    img = np.clip((img - lower) / (upper - lower), 0, 1)
+    return np.rint(np.nan_to_num(img) * 255).astype(np.uint8)
+
+
+def render_acquisition_thumbnails(
+    acquisition: Acquisition, image_stack: np.ndarray, settings: ThumbnailSettings
+) -> Dict[str, np.ndarray]:
+    """Render 8-bit thumbnails of acquisition image data, by composite name ("" for the overview).
+
+    Parameters
+    ----------
+    acquisition
+        Acquisition of the image data.
+    image_stack
+        Acquisition image data in (channel, y, x) layout, binned to thumbnail size.
+    settings
+        Thumbnail settings.
+    """
+    normalized = dict()
+
+    def get_channel(index: int):
+        if index not in normalized:
+            normalized[index] = normalize_image(
+                image_stack[index], settings.lower_percentile, settings.upper_percentile
+            )
+        return normalized[index]
+
+    result = dict()
+    if image_stack.shape[0] == 0:
+        return result
+    overview = np.mean([get_channel(i) for i in range(image_stack.shape[0])], axis=0)
+    result[""] = normalize_image(overview, 0, 100)
+
+    channel_table = acquisition.channel_table
+    for name, colors in (settings.composites or dict()).items():
+        rgb = np.zeros(image_stack.shape[1:] + (3,), dtype=np.uint8)
+        for i, channel in enumerate(colors[:3]):
+            if channel is None:
+                continue
+            index = channel_table.name_index.get(channel, channel_table.label_index.get(channel))
+            if index is None:
+                logger.warning(f"Unknown channel {channel} in composite {name} of acquisition {acquisition.metaname}")
+                continue
+            rgb[..., i] = get_channel(index)
+        result[name] = rgb
+    return result
+
+
+def save_acquisition_thumbnails(
+    acquisition: Acquisition,
+    image_stack: np.ndarray,
+    output_folder: Union[str, Path],
+    settings: ThumbnailSettings,
+    binning: Optional[int] = None,
+):
+    """Save acquisition thumbnails as PNG files.
+
+    Parameters
+    ----------
+    acquisition
+        Acquisition of the image data.
+    image_stack
+        Acquisition image data in (channel, y, x) layout.
+    output_folder
+        Output folder.
+    settings
+        Thumbnail settings.
+    binning
+        Binning factor that was already applied to the image data (None if the image data still has to be binned).
+    """
+    if isinstance(output_folder, str):
+        output_folder = Path(output_folder)
+    if binning is None:
+        binning = get_thumbnail_binning(image_stack.shape[1], image_stack.shape[2], settings.size)
+        image_stack = bin_image_stack(image_stack, binning)
+    for name, img in render_acquisition_thumbnails(acquisition, image_stack, settings).items():
+        filename = acquisition.metaname + (f"_{name}" if name != "" else "") + THUMBNAIL_PNG_SUFFIX
+        _save_png(img, output_folder / filename)
+
+
+def save_image_thumbnail(buf: bytes, filepath: Union[str, Path], size: int = DEFAULT_THUMBNAIL_SIZE) -> bool:
+    """Decode an encoded image (e.g. panorama or ablation image) and save it downscaled as PNG file.
+
+    Returns False if the image can't be decoded.
+
+    Parameters
+    ----------
+    buf
+        Encoded image (PNG, JPEG, etc.).
+    filepath
+        Output PNG file path.
+    size
+        Size of the longer thumbnail side (in pixels).
+    """
+    try:
+        img = imagecodecs.imread(buf)
+    except Exception as e:
+        logger.warning(f"Cannot decode image for thumbnail {filepath}: {e}")
+        return False
+    if img.dtype == np.uint16:
+        img = img / 257
+    elif img.dtype != np.uint8:
+        img = normalize_image(img, 0, 100)
+    if img.ndim == 2:
+        img = img[..., np.newaxis]
+    binning = get_thumbnail_binning(img.shape[0], img.shape[1], size)
+    img = np.moveaxis(bin_image_stack(np.moveaxis(img, -1, 0), binning), 0, -1)
+    img = np.rint(img).astype(np.uint8)
+    _save_png(img[..., 0] if img.shape[-1] == 1 else img, filepath)
+    return True
+
+
+def _save_png(img: np.ndarray, filepath: Union[str, Path]):
+    with atomic_output(filepath) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            f.write(imagecodecs.png_encode(img))
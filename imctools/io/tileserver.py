@@ -0,0 +1,500 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+from urllib.parse import unquote, urlparse
+
+import imagecodecs
+import numpy as np
+
+from imctools.io.cache import DEFAULT_CACHE_SIZE, AcquisitionCache
+from imctools.io.imc.imcparser import ImcParser
+from imctools.io.mcd.mcdparser import McdParser
+from imctools.io.thumbnails import normalize_image
+from imctools.io.utils import MCD_FILENDING, OME_TIFF_SUFFIX, get_file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+
+# Default memory budget of the encoded tile cache (in bytes)
+DEFAULT_TILE_CACHE_SIZE = 256 * 1024 * 1024
+
+_DZI_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="png" Overlap="0" TileSize="{tile_size}">'
+    '<Size Width="{width}" Height="{height}"/></Image>'
+)
+
+# Deep zoom requests: /<kind>/<id>[/<channel>].dzi and /<kind>/<id>[/<channel>]_files/<level>/<col>_<row>.png
+_DZI_PATTERN = re.compile(r"^/(?P<image>(?:slides|panoramas)/\d+|acquisitions/\d+/[^/]+)\.dzi$")
+_TILE_PATTERN = re.compile(
+    r"^/(?P<image>(?:slides|panoramas)/\d+|acquisitions/\d+/[^/]+)_files/(?P<level>\d+)/(?P<col>\d+)_(?P<row>\d+)\.png$"
+)
+
+
+class TileCache:
+    """Bounded LRU cache of encoded tiles, kept in memory or in a folder on disk."""
+
+    def __init__(self, max_bytes: int = DEFAULT_TILE_CACHE_SIZE, folder: Optional[Union[str, Path]] = None):
+        """
+        Parameters
+        ----------
+        max_bytes
+            Cache size budget (in bytes).
+        folder
+            Cache folder, tiles are kept in memory if None.
+        """
+        if isinstance(folder, str):
+            folder = Path(folder)
+        self.max_bytes = max_bytes
+        self.folder = folder
+        # Tile data (memory cache) or tile file sizes (disk cache), by key
+        self._entries: "OrderedDict[str, Union[bytes, int]]" = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        if folder is not None:
+            folder.mkdir(parents=True, exist_ok=True)
+            for f in sorted(folder.glob("*.png"), key=lambda f: f.stat().st_mtime):
+                self._entries[f.stem] = f.stat().st_size
+                self._nbytes += f.stat().st_size
+            self._evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached tile, None if not cached.
+
+        Parameters
+        ----------
+        key
+            Tile key (hexadecimal digest).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        if self.folder is None:
+            return entry
+        try:
+            return (self.folder / f"{key}.png").read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        """Cache a tile, evicting least recently used tiles beyond the budget.
+
+        Parameters
+        ----------
+        key
+            Tile key (hexadecimal digest).
+        data
+            Encoded tile.
+        """
+        if self.folder is not None:
+            tmp_path = self.folder / f".{key}.{threading.get_ident()}.tmp"
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, self.folder / f"{key}.png")
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= len(previous) if isinstance(previous, bytes) else previous
+            self._entries[key] = data if self.folder is None else len(data)
+            self._nbytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._nbytes > self.max_bytes and len(self._entries) > 0:
+            key, entry = self._entries.popitem(last=False)
+            if self.folder is None:
+                self._nbytes -= len(entry)
+            else:
+                self._nbytes -= entry
+                try:
+                    os.remove(self.folder / f"{key}.png")
+                except FileNotFoundError:
+                    pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(max_bytes={self.max_bytes}, folder={self.folder})"
+
+
+class TileSource:
+    """Image served as deep zoom tile pyramid, rendered to 8-bit from its full resolution image on demand."""
+
+    def __init__(self, filepath: Path, key: Tuple, load: Callable[[], np.ndarray], cache: AcquisitionCache):
+        """
+        Parameters
+        ----------
+        filepath
+            Source file, its fingerprint identifies the rendered tiles.
+        key
+            Source key (unique per server).
+        load
+            Function loading the full resolution 8-bit image in (y, x) or (y, x, rgb) layout.
+        cache
+            Cache of downscaled pyramid levels.
+        """
+        self.filepath = filepath
+        self.key = key
+        self._load = load
+        self._cache = cache
+        self._shape: Optional[Tuple[int, int]] = None
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Full resolution image height and width"""
+        if self._shape is None:
+            self._shape = self.get_level_image(1).shape[:2]
+        return self._shape
+
+    @property
+    def max_level(self):
+        """Deep zoom level of the full resolution image"""
+        return math.ceil(math.log2(max(max(self.shape), 1)))
+
+    @property
+    def fingerprint(self):
+        """Digest of the source file fingerprint, changes whenever the source file is modified"""
+        data = json.dumps([str(self.filepath), get_file_fingerprint(self.filepath), *self.key])
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def get_level_image(self, factor: int) -> np.ndarray:
+        """Image downscaled by the given factor (incomplete blocks at image borders are averaged as well)."""
+        key = AcquisitionCache.create_key(self.filepath, self.key[1], [str(k) for k in self.key], factor)
+
+        def load():
+            if factor == 1:
+                return np.array(self._load())
+            return _downscale(self.get_level_image(1), factor)
+
+        return self._cache.get_or_load(key, load)
+
+    def get_tile(self, level: int, col: int, row: int) -> Optional[np.ndarray]:
+        """Tile image, None for tiles outside of the pyramid"""
+        if level > self.max_level:
+            return None
+        img = self.get_level_image(2 ** (self.max_level - level))
+        y, x = row * TILE_SIZE, col * TILE_SIZE
+        if y >= img.shape[0] or x >= img.shape[1]:
+            return None
+        return img[y : y + TILE_SIZE, x : x + TILE_SIZE]
+
+
+class TileServer:
+    """Deep zoom tile server of slides, panoramas and acquisition channels of an IMC folder or MCD file.
+
+    Endpoints:
+        `/` lists the served images with their deep zoom descriptor (DZI) URLs as JSON;
+        `/slides/<id>.dzi`, `/panoramas/<id>.dzi` and `/acquisitions/<id>/<channel>.dzi` are DZI descriptors;
+        `<descriptor URL without .dzi>_files/<level>/<col>_<row>.png` are PNG tiles.
+    Tiles have ETags derived from the source file fingerprints, so clients revalidate them cheaply.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        cache: Optional[AcquisitionCache] = None,
+        tile_cache: Optional[TileCache] = None,
+    ):
+        """
+        Parameters
+        ----------
+        path
+            IMC folder, `_imc.zip` archive or MCD file.
+        cache
+            Cache of decoded image data and pyramid levels.
+        tile_cache
+            Cache of encoded tiles.
+        """
+        if isinstance(path, str):
+            path = Path(path)
+        self.path = path
+        self.cache = cache if cache is not None else AcquisitionCache(DEFAULT_CACHE_SIZE)
+        self.tile_cache = tile_cache if tile_cache is not None else TileCache()
+        if path.suffix.lower() == MCD_FILENDING:
+            self.parser = McdParser(path, cache=self.cache)
+        else:
+            self.parser = ImcParser(path, cache=self.cache)
+        self._sources: Dict[str, TileSource] = dict()
+        self._sources_lock = threading.Lock()
+        # McdParser reads from a single shared file handle, ImcParser guards its files itself (per file)
+        self._parser_lock = threading.Lock() if isinstance(self.parser, McdParser) else nullcontext()
+
+    @property
+    def session(self):
+        return self.parser.session
+
+    def get_index(self):
+        """Served images and their DZI descriptor URLs"""
+        session = self.session
+        return {
+            "session": session.name,
+            "slides": [
+                {"id": s.id, "description": s.description, "dzi": f"/slides/{s.id}.dzi"}
+                for s in session.slides.values()
+            ],
+            "panoramas": [
+                {"id": p.id, "slide_id": p.slide_id, "description": p.description, "dzi": f"/panoramas/{p.id}.dzi"}
+                for p in session.panoramas.values()
+            ],
+            "acquisitions": [
+                {
+                    "id": a.id,
+                    "slide_id": a.slide_id,
+                    "description": a.description,
+                    "channels": {name: f"/acquisitions/{a.id}/{name}.dzi" for name in a.channel_names},
+                }
+                for a in session.acquisitions.values()
+                if a.is_valid
+            ],
+        }
+
+    def get_source(self, image: str) -> Optional[TileSource]:
+        """Tile source of an image path (e.g. "acquisitions/1/Ir191"), None for unknown images."""
+        with self._sources_lock:
+            source = self._sources.get(image)
+        if source is None:
+            # Created without holding the lock (images are decoded), the first source created for an image wins
+            source = self._create_source(image)
+            if source is not None:
+                with self._sources_lock:
+                    source = self._sources.setdefault(image, source)
+        return source
+
+    def get_descriptor(self, image: str) -> Optional[str]:
+        """DZI descriptor of an image, None for unknown or unreadable images."""
+        source = self.get_source(image)
+        if source is None:
+            return None
+        height, width = source.shape
+        return _DZI_XML.format(tile_size=TILE_SIZE, width=width, height=height)
+
+    def get_tile(self, image: str, level: int, col: int, row: int) -> Optional[Tuple[bytes, str]]:
+        """Encoded PNG tile and its ETag, None for unknown images or tiles.
+
+        Parameters
+        ----------
+        image
+            Image path (e.g. "acquisitions/1/Ir191").
+        level
+            Deep zoom level.
+        col
+            Tile column.
+        row
+            Tile row.
+        """
+        source = self.get_source(image)
+        if source is None:
+            return None
+        key = hashlib.sha1(f"{source.fingerprint}/{level}/{col}/{row}".encode()).hexdigest()
+        etag = f'"{key}"'
+        data = self.tile_cache.get(key)
+        if data is None:
+            tile = source.get_tile(level, col, row)
+            if tile is None:
+                return None
+            data = imagecodecs.png_encode(np.ascontiguousarray(tile))
+            self.tile_cache.put(key, data)
+        return data, etag
+
+    def _create_source(self, image: str):
+        kind, id, *channel = image.split("/")
+        id = int(id)
+        session = self.session
+        if kind == "acquisitions":
+            acquisition = session.acquisitions.get(id)
+            if acquisition is None or not acquisition.is_valid:
+                return None
+            if channel[0] not in acquisition.channel_table.name_index:
+                return None
+            return TileSource(
+                self._get_acquisition_filepath(acquisition),
+                (kind, id, channel[0]),
+                lambda: self._render_channel(acquisition, channel[0]),
+                self.cache,
+            )
+        entity = session.slides.get(id) if kind == "slides" else session.panoramas.get(id)
+        if entity is None:
+            return None
+        if isinstance(self.parser, McdParser):
+            filepath = self.path
+            with self._parser_lock:
+                buf = self.parser.get_slide_image(id) if kind == "slides" else self.parser.get_panorama_image(id)
+        else:
+            suffix = "_slide" if kind == "slides" else "_pano"
+            filename = next(iter(self.parser.list_files(f"{entity.metaname}{suffix}.*")), None)
+            if filename is None:
+                return None
+            filepath = self.path if self.parser.is_archive else self.path / filename
+            buf = self.parser.read_file(filename)
+        if buf is None:
+            return None
+        try:
+            img = imagecodecs.imread(buf)
+        except Exception as e:
+            logger.warning(f"Cannot decode image {image}: {e}")
+            return None
+        if img.dtype != np.uint8:
+            img = normalize_image(img, 0, 100)
+        if img.ndim == 3 and img.shape[-1] == 4:
+            img = img[..., :3]
+        return TileSource(filepath, (kind, id), lambda: img, self.cache)
+
+    def _get_acquisition_filepath(self, acquisition):
+        if isinstance(self.parser, McdParser) or self.parser.is_archive:
+            return self.path
+        return self.path / (acquisition.metaname + OME_TIFF_SUFFIX)
+
+    def _render_channel(self, acquisition, channel_name: str):
+        """Channel image clipped to its contrast limits (from the channel histogram if available)"""
+        with self._parser_lock:
+            img = self.parser.get_image_stack(acquisition.id, [channel_name])[0]
+        channel_table = acquisition.channel_table
+        channel = acquisition.channels[int(channel_table.ids[channel_table.name_index[channel_name]])]
+        if channel.histogram is None:
+            return normalize_image(img)
+        lower, upper = channel.histogram.get_contrast_limits()
+        if not upper > lower:
+            upper = lower + 1
+        return np.rint(np.clip((img - lower) / (upper - lower), 0, 1) * 255).astype(np.uint8)
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8000, n_workers: Optional[int] = None):
+        """Serve tiles over HTTP until interrupted.
+
+        Parameters
+        ----------
+        host
+            Host address to listen on.
+        port
+            Port to listen on.
+        n_workers
+            Number of request handling threads (defaults to the number of CPUs).
+        """
+        with create_http_server(self, host, port, n_workers) as httpd:
+            logger.info(f"Serving {self.path} at http://{host}:{httpd.server_address[1]}/")
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+    def close(self):
+        self.parser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """HTTP server handling requests on a fixed-size thread pool."""
+
+    def __init__(self, server_address, handler_class, tile_server: TileServer, n_workers: Optional[int] = None):
+        super().__init__(server_address, handler_class)
+        self.tile_server = tile_server
+        self._executor = ThreadPoolExecutor(n_workers if n_workers is not None else os.cpu_count() or 1)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+    """Deep zoom tile request handler."""
+
+    server: ThreadPoolHTTPServer
+
+    def do_GET(self):
+        tile_server = self.server.tile_server
+        path = unquote(urlparse(self.path).path)
+        if path in ("/", "/index.json"):
+            return self._send(json.dumps(tile_server.get_index()).encode(), "application/json")
+        m = _DZI_PATTERN.match(path)
+        if m is not None:
+            descriptor = tile_server.get_descriptor(m.group("image"))
+            if descriptor is None:
+                return self.send_error(HTTPStatus.NOT_FOUND)
+            return self._send(descriptor.encode(), "application/xml")
+        m = _TILE_PATTERN.match(path)
+        if m is not None:
+            level, col, row = int(m.group("level")), int(m.group("col")), int(m.group("row"))
+            tile = tile_server.get_tile(m.group("image"), level, col, row)
+            if tile is None:
+                return self.send_error(HTTPStatus.NOT_FOUND)
+            data, etag = tile
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            return self._send(data, "image/png", etag)
+        self.send_error(HTTPStatus.NOT_FOUND)
+
+    def _send(self, data: bytes, content_type: str, etag: Optional[str] = None):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def create_http_server(
+    tile_server: TileServer, host: str = "127.0.0.1", port: int = 8000, n_workers: Optional[int] = None
+):
+    """Create HTTP server of a tile server (port 0 picks a free port).
+
+    Parameters
+    ----------
+    tile_server
+        Tile server.
+    host
+        Host address to listen on.
+    port
+        Port to listen on.
+    n_workers
+        Number of request handling threads (defaults to the number of CPUs).
+    """
+    return ThreadPoolHTTPServer((host, port), TileRequestHandler, tile_server, n_workers)
+
+
+def _downscale(img: np.ndarray, factor: int) -> np.ndarray:
+    """Average image over factor x factor pixel blocks, padding incomplete border blocks with edge values"""
+    height, width = img.shape[:2]
+    pad_y, pad_x = -height % factor, -width % factor
+    if pad_y > 0 or pad_x > 0:
+        img = np.pad(img, ((0, pad_y), (0, pad_x)) + ((0, 0),) * (img.ndim - 2), mode="edge")
+    h, w = img.shape[0] // factor, img.shape[1] // factor
+    img = img.reshape((h, factor, w, factor) + img.shape[2:]).mean(axis=(1, 3))
+    return np.rint(img).astype(np.uint8)
@@ -1,18 +1,37 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
 import xml.etree.ElementTree as ET
-from typing import TYPE_CHECKING, Optional, Sequence
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, Optional, Sequence, Union
 
 import numpy as np
 import xtiff
+from dateutil.parser import parse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 if TYPE_CHECKING:
     from imctools.data import Session
 
 SESSION_JSON_SUFFIX = "_session.json"
+SESSION_METADATA_JSON_SUFFIX = "_session_metadata.json"
 SCHEMA_XML_SUFFIX = "_schema.xml"
 OME_TIFF_SUFFIX = "_ac.ome.tiff"
 META_CSV_SUFFIX = "_meta.csv"
+MANIFEST_JSON_SUFFIX = "_manifest.json"
+THUMBNAIL_PNG_SUFFIX = "_thumbnail.png"
 
 MCD_FILENDING = ".mcd"
 ZIP_FILENDING = ".zip"
@@ -118,3 +137,211 @@ def sort_acquisition_channels(session: Session):
         for c in ac_channels:
             ordered_dict[c.id] = c
         a.channels = ordered_dict
+
+
+def get_file_fingerprint(filepath: Union[str, Path]) -> Dict[str, Union[str, int]]:
+    """Cheap fingerprint of a file (name, size and modification time) used to detect changed sources.
+
+    Parameters
+    ----------
+    filepath
+        Input file path.
+    """
+    stat = os.stat(filepath)
+    return {"name": os.path.basename(filepath), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def get_file_checksum(filepath: Union[str, Path], block_size: int = 1 << 20) -> str:
+    """SHA-256 checksum of the file content.
+
+    Parameters
+    ----------
+    filepath
+        Input file path.
+    block_size
+        Size of the blocks read from the file.
+    """
+    sha256 = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+@contextmanager
+def atomic_output(filepath: Union[str, Path]) -> Iterator[Path]:
+    """Context manager yielding a temporary path that is renamed to `filepath` on success.
+
+    The temporary file keeps the original file name (writers like xtiff derive metadata from it) and lives in a hidden
+    folder next to the target, so the final rename never crosses a filesystem boundary. On error the partial output is
+    removed and `filepath` is left untouched.
+
+    Parameters
+    ----------
+    filepath
+        Final output file path.
+    """
+    if isinstance(filepath, str):
+        filepath = Path(filepath)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=filepath.parent)
+    try:
+        tmp_path = Path(tmp_dir) / filepath.name
+        yield tmp_path
+        os.replace(tmp_path, filepath)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def link_or_copy_file(src: Union[str, Path], dst: Union[str, Path]) -> str:
+    """Place a file at `dst` as cheaply as possible: hardlink, reflink, in-kernel copy or regular copy.
+
+    Hardlinks and reflinks only work within the same filesystem. `os.copy_file_range` (Linux, Python 3.8+) keeps data
+    in the kernel and lets filesystems that support it share extents or copy server-side. Other cases fall back to a
+    regular copy. An existing `dst` file is replaced. Returns the method used ("hardlink", "reflink",
+    "copy_file_range" or "copy").
+
+    Parameters
+    ----------
+    src
+        Source file path.
+    dst
+        Destination file path.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    for method, copy_func in (("reflink", _reflink_file), ("copy_file_range", _copy_file_range)):
+        try:
+            copy_func(src, dst)
+            shutil.copystat(src, dst)
+            return method
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+# Linux FICLONE ioctl request number (btrfs, XFS, OCFS2, ...)
+_FICLONE = 0x40049409
+
+
+def _reflink_file(src: Union[str, Path], dst: Union[str, Path]):
+    """Clone file content with the FICLONE ioctl, raises OSError if not supported."""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("Reflinks are not supported on this platform")
+    with open(src, "rb") as fsrc:
+        try:
+            with open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            if os.path.exists(dst):
+                os.remove(dst)
+            raise
+
+
+def _copy_file_range(src: Union[str, Path], dst: Union[str, Path]):
+    """Copy file content in the kernel with copy_file_range, raises OSError if not supported."""
+    if not hasattr(os, "copy_file_range"):
+        raise OSError("copy_file_range is not supported on this platform")
+    with open(src, "rb") as fsrc:
+        try:
+            with open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        raise OSError("copy_file_range stopped before end of file")
+                    remaining -= copied
+        except OSError:
+            if os.path.exists(dst):
+                os.remove(dst)
+            raise
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse timestamp string, using the fast ISO 8601 parser when possible.
+
+    Parameters
+    ----------
+    value
+        Timestamp string.
+    """
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        # E.g. 7-digit fractional seconds or 'Z' suffix
+        return parse(value)
+
+
+def load_json(filepath: Union[str, Path], archive: Optional[Union[str, Path]] = None) -> Any:
+    """Load JSON file, using orjson if it is installed.
+
+    Parameters
+    ----------
+    filepath
+        Input JSON file path (member name if read from a zip archive).
+    archive
+        Zip archive containing the JSON file.
+    """
+    if archive is not None:
+        with zipfile.ZipFile(archive) as zf:
+            data = zf.read(Path(filepath).as_posix())
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+    if orjson is not None:
+        with open(filepath, "rb") as f:
+            return orjson.loads(f.read())
+    with open(filepath, "r") as f:
+        return json.load(f)
+
+
+def save_json(data: Any, filepath: Union[str, Path], default: Optional[Callable[[Any], Any]] = None):
+    """Save data to a compact JSON file atomically, using orjson if it is installed.
+
+    Parameters
+    ----------
+    data
+        Data to serialize.
+    filepath
+        Output JSON file path.
+    default
+        Function converting objects that can't be serialized otherwise.
+    """
+    with atomic_output(filepath) as tmp_path:
+        if orjson is not None:
+            with open(tmp_path, "wb") as f:
+                f.write(orjson.dumps(data, default=default, option=orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(tmp_path, "wt") as f:
+                json.dump(data, f, separators=(",", ":"), default=default)
+
+
+def get_zip_member_offset(filepath: Union[str, Path], member: str) -> Optional[int]:
+    """Offset of the data of a zip archive member stored without compression, None for compressed members.
+
+    Parameters
+    ----------
+    filepath
+        Zip archive path.
+    member
+        Archive member name.
+    """
+    with zipfile.ZipFile(filepath) as zf:
+        info = zf.getinfo(member)
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+    with open(filepath, "rb") as f:
+        f.seek(info.header_offset)
+        header = f.read(30)
+    # Local file header: signature, ..., file name length and extra field length, followed by name, extra field and data
+    signature, name_length, extra_length = struct.unpack("<I22xHH", header)
+    if signature != 0x04034B50:
+        raise ValueError(f"Invalid zip local file header of {member} in {filepath}")
+    return info.header_offset + 30 + name_length + extra_length
@@ -0,0 +1,49 @@
+import copy
+import pickle
+
+import pytest
+
+from imctools.data import Acquisition, Channel
+
+
+def _create_acquisition(channels):
+    acquisition = Acquisition(0, 1, "mcd", "test.mcd", 10, 10, metadata={"Description": "ROI 1"})
+    for i, (name, label) in enumerate(channels):
+        channel = Channel(acquisition.id, 100 + i, i, name, label, metadata={"Name": name})
+        channel.acquisition = acquisition
+        acquisition.channels[channel.id] = channel
+    return acquisition
+
+
+class TestAcquisition:
+    def test_channel_table(self):
+        acquisition = _create_acquisition([("Ir191", "DNA1"), ("Ir193", "DNA2"), ("Pr141", "CD45")])
+        assert acquisition.channel_names == ["Ir191", "Ir193", "Pr141"]
+        assert acquisition.channel_masses == ["191", "193", "141"]
+        assert acquisition.channel_table.masses.tolist() == [191, 193, 141]
+        assert acquisition.get_name_indices(["Pr141", "Ir191"]) == [2, 0]
+        assert acquisition.get_label_indices(["DNA2"]) == [1]
+        assert acquisition.get_mass_indices(["193"]) == [1]
+
+        acquisition.channels[101].name = "Ir192"
+        assert acquisition.get_name_indices(["Ir192"]) == [1]
+        del acquisition.channels[100]
+        assert acquisition.channel_labels == ["DNA2", "CD45"]
+        assert acquisition.channel_table.ids.tolist() == [101, 102]
+
+    def test_duplicate_masses(self):
+        acquisition = _create_acquisition([("In115", "CD3"), ("Sn115", "CD4"), ("Pr141", "CD45")])
+        # The last channel wins for duplicate keys
+        assert acquisition.get_mass_indices(["115"]) == [1]
+
+    @pytest.mark.parametrize("copy_function", [lambda x: pickle.loads(pickle.dumps(x)), copy.copy, copy.deepcopy])
+    def test_copy(self, copy_function):
+        acquisition = _create_acquisition([("Ir191", "DNA1"), ("Pr141", "CD45")])
+        result = copy_function(acquisition)
+        assert result.channel_names == ["Ir191", "Pr141"] and result.get_label_indices(["CD45"]) == [1]
+        assert result.metadata == {"Description": "ROI 1"}
+        assert all(channel.acquisition is result for channel in result.channels.values())
+
+        channel = copy_function(acquisition.channels[101])
+        assert channel.name == "Pr141" and channel.label == "CD45" and channel.metadata == {"Name": "Pr141"}
+        assert channel.acquisition is None
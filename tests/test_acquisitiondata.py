@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+import tifffile
+
+from imctools.data import Acquisition, Channel, Session, Slide
+from imctools.data.acquisitiondata import AcquisitionData, ImageSource, stack_acquisitions, to_dataset
+
+
+class ArrayImageSource(ImageSource):
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.shape = data.shape
+        self.dtype = data.dtype
+        self.chunks = (1,) + data.shape[1:]
+        self.reads = []
+
+    def _read(self, channels, start_row, stop_row):
+        self.reads.append((channels, start_row, stop_row))
+        return self.data[channels, start_row:stop_row]
+
+
+def _create_acquisition_data(id: int, channel_names, lazy: bool = True):
+    session = Session("session", "session", "2.1", None)
+    slide = Slide(session.id, 0)
+    slide.session = session
+    acquisition = Acquisition(slide.id, id, "mcd", "test.mcd", 5, 4)
+    acquisition.slide = slide
+    for i, name in enumerate(channel_names):
+        channel = Channel(acquisition.id, i, i, name, name)
+        channel.acquisition = acquisition
+        acquisition.channels[channel.id] = channel
+    data = np.arange(len(channel_names) * 4 * 5, dtype=np.float32).reshape(len(channel_names), 4, 5)
+    if lazy:
+        return AcquisitionData(acquisition, None, source=ArrayImageSource(data)), data
+    return AcquisitionData(acquisition, data), data
+
+
+class TestAcquisitionData:
+    def test_lazy_image_data(self):
+        acquisition_data, data = _create_acquisition_data(1, ["Ir191", "Ir193", "Pr141"])
+        source = acquisition_data._source
+        assert np.array_equal(acquisition_data.get_image_by_name("Pr141"), data[2])
+        assert source.reads == [([2], 0, 4)]
+        assert np.array_equal(source[0, 1:3, ::2], data[0, 1:3, ::2])
+        assert np.array_equal(source[..., -1], data[..., -1])
+        assert np.array_equal(acquisition_data.image_data, data)
+
+    def test_to_dataset(self):
+        pytest.importorskip("xarray")
+        pytest.importorskip("dask")
+        acquisition_data1, data1 = _create_acquisition_data(1, ["Ir191", "Pr141"])
+        acquisition_data2, data2 = _create_acquisition_data(2, ["Ir191", "Ir193"], lazy=False)
+        dataset = to_dataset([acquisition_data1, acquisition_data2])
+        assert list(dataset.channel.values) == ["Ir191", "Pr141", "Ir193"]
+        assert acquisition_data1._source.reads == []
+        ac1 = dataset["session_s0_a1"].values
+        assert np.array_equal(ac1[:2], data1) and np.isnan(ac1[2]).all()
+        assert np.array_equal(dataset["session_s0_a2"].sel(channel="Ir193").values, data2[1])
+
+    def test_stack_acquisitions(self):
+        acquisition_data1, data1 = _create_acquisition_data(1, ["Ir191", "Pr141"])
+        acquisition_data2, data2 = _create_acquisition_data(2, ["141Pr", "Ir193"], lazy=False)
+        data, mask, channels = stack_acquisitions([acquisition_data1, acquisition_data2], pad_to=(6, 5), fill=-1)
+        assert channels == ["Ir191", "Pr141", "Ir193"]
+        assert data.shape == (2, 3, 6, 5)
+        assert mask.tolist() == [[False, False, True], [True, False, False]]
+        assert np.array_equal(data[0, :2, :4], data1) and np.all(data[0, 2] == -1) and np.all(data[:, :, 4:] == -1)
+        assert np.array_equal(data[1, 1:, :4], data2)
+        assert acquisition_data1._source.reads == [([0], 0, 4), ([1], 0, 4)]
+        with pytest.raises(ValueError):
+            stack_acquisitions([acquisition_data1], pad_to=(2, 2))
+
+    @pytest.mark.parametrize("n_writers", [2, 4])
+    def test_save_tiffs_in_parallel(self, tmp_path, n_writers):
+        acquisition_data, _ = _create_acquisition_data(1, ["Ir191", "Ir193", "Pr141", "Yb172"], lazy=False)
+        (tmp_path / "serial").mkdir()
+        (tmp_path / "parallel").mkdir()
+        acquisition_data.save_tiffs(tmp_path / "serial", basename="ac_", n_writers=1)
+        acquisition_data.save_tiffs(tmp_path / "parallel", basename="ac_", n_writers=n_writers)
+        filenames = sorted(f.name for f in (tmp_path / "serial").iterdir())
+        assert len(filenames) == 4
+        assert sorted(f.name for f in (tmp_path / "parallel").iterdir()) == filenames
+        for filename in filenames:
+            assert (tmp_path / "parallel" / filename).read_bytes() == (tmp_path / "serial" / filename).read_bytes()
+
+    def test_save_tiffs_failure(self, tmp_path, monkeypatch):
+        acquisition_data, data = _create_acquisition_data(1, ["Ir191", "Pr141", "Yb172"], lazy=False)
+        imwrite = tifffile.imwrite
+
+        def failing_imwrite(filename, *args, **kwargs):
+            if "Pr141" in str(filename):
+                with open(filename, "wb") as f:
+                    f.write(b"partial")
+                raise OSError("No space left on device")
+            imwrite(filename, *args, **kwargs)
+
+        monkeypatch.setattr(tifffile, "imwrite", failing_imwrite)
+        with pytest.raises(OSError):
+            acquisition_data.save_tiffs(tmp_path, basename="ac_", n_writers=1)
+        # Files written before the failure are complete, the failed one and the temporary folder are gone
+        assert [f.name for f in tmp_path.iterdir()] == ["ac_Ir191_Ir191.tiff"]
+        assert np.array_equal(tifffile.imread(str(tmp_path / "ac_Ir191_Ir191.tiff")), data[0])
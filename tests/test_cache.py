@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from imctools.io.cache import AcquisitionCache, bin_image_stack
+
+
+class TestAcquisitionCache:
+    def test_lru_eviction(self):
+        cache = AcquisitionCache(max_bytes=2 * 4 * 100)
+        for key in ("a", "b"):
+            cache.put(key, np.zeros(100, dtype=np.float32))
+        assert cache.get("a") is not None
+        cache.put("c", np.zeros(100, dtype=np.float32))
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+        stats = cache.stats
+        assert (stats.hits, stats.misses, stats.evictions, stats.entries) == (2, 1, 1, 2)
+        assert stats.nbytes == 2 * 4 * 100
+
+    def test_read_only_entries(self):
+        cache = AcquisitionCache()
+        cached = cache.get_or_load("a", lambda: np.arange(10, dtype=np.float32))
+        with pytest.raises(ValueError):
+            cached[0] = 1
+        data = np.arange(10, dtype=np.float32)
+        cache.put("b", data)
+        data[0] = 1
+        assert cache.get("b")[0] == 0
+
+    @pytest.mark.parametrize("max_bytes", [1024, 0])
+    def test_concurrent_misses(self, max_bytes):
+        cache = AcquisitionCache(max_bytes=max_bytes)
+        n_loads = 0
+        lock = threading.Lock()
+
+        def load():
+            nonlocal n_loads
+            with lock:
+                n_loads += 1
+            time.sleep(0.1)
+            return np.arange(10, dtype=np.float32)
+
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda _: cache.get_or_load("a", load), range(4)))
+        assert n_loads == 1
+        assert all(np.array_equal(result, np.arange(10)) for result in results)
+
+
+def test_bin_image_stack():
+    data = np.arange(2 * 5 * 4, dtype=np.float32).reshape(2, 5, 4)
+    binned = bin_image_stack(data, 2)
+    assert binned.shape == (2, 2, 2)
+    assert binned[1, 0, 1] == data[1, :2, 2:].mean()
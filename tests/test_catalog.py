@@ -0,0 +1,69 @@
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from imctools.data import Acquisition, Channel, Session, Slide
+from imctools.io.imc.catalog import Catalog
+
+
+def _save_session(folder: Path, name: str, start_timestamp: datetime, channels):
+    session = Session(name, name, "2.1", datetime.now(timezone.utc))
+    slide = Slide(session.id, 0)
+    slide.session = session
+    session.slides[slide.id] = slide
+    acquisition = Acquisition(slide.id, 1, "mcd", "test.mcd", 10, 10, start_timestamp=start_timestamp)
+    acquisition.ablation_frequency = 200.0
+    acquisition.slide = slide
+    slide.acquisitions[acquisition.id] = acquisition
+    session.acquisitions[acquisition.id] = acquisition
+    for i, (channel_name, label) in enumerate(channels):
+        channel = Channel(acquisition.id, i, i, channel_name, label)
+        channel.acquisition = acquisition
+        acquisition.channels[channel.id] = channel
+        session.channels[channel.id] = channel
+    (folder / name).mkdir(parents=True)
+    session.save(folder / name / f"{name}_session.json")
+
+
+class TestCatalog:
+    def test_update_and_find(self, tmp_path: Path):
+        root = tmp_path / "root"
+        march = datetime(2021, 3, 5, 10, tzinfo=timezone.utc)
+        _save_session(root, "session1", march, [("Ir191", "DNA1"), ("Pr141", "CD45")])
+        _save_session(root, "session2", datetime(2021, 4, 1, tzinfo=timezone.utc), [("Ir191", "DNA1")])
+
+        with Catalog(tmp_path / "catalog.sqlite") as catalog:
+            assert catalog.update(root, n_workers=1) == (2, 0, 0)
+            assert catalog.update(root, n_workers=1) == (0, 0, 2)
+
+            assert len(catalog.find_acquisitions(channels=["Ir191"])) == 2
+            acquisitions = catalog.find_acquisitions(channels=["Ir191", "CD45"], ablation_frequency=200.0)
+            assert [a.session_name for a in acquisitions] == ["session1"]
+            assert acquisitions[0].start_timestamp == march
+            acquisitions = catalog.find_acquisitions(
+                start=datetime(2021, 3, 1, tzinfo=timezone.utc), end=datetime(2021, 4, 1, tzinfo=timezone.utc)
+            )
+            assert [a.session_name for a in acquisitions] == ["session1"]
+
+            for f in (root / "session2").iterdir():
+                f.unlink()
+            (root / "session2").rmdir()
+            assert catalog.update(root, n_workers=1) == (0, 1, 1)
+            assert [row["name"] for row in catalog.get_sessions()] == ["session1"]
+
+    @pytest.mark.parametrize("n_workers", [1, 2])
+    def test_skip_corrupt_session(self, tmp_path: Path, n_workers: int):
+        root = tmp_path / "root"
+        for name in ("session1", "session2", "session3"):
+            _save_session(root, name, datetime(2021, 3, 5, tzinfo=timezone.utc), [("Ir191", "DNA1")])
+        (root / "session2" / "session2_session.json").write_text('{"id": "session2", "acquisitions": [')
+
+        with Catalog(tmp_path / "catalog.sqlite") as catalog:
+            assert catalog.update(root, n_workers=n_workers) == (2, 0, 0)
+            assert [row["name"] for row in catalog.get_sessions()] == ["session1", "session3"]
+            # Skipped sessions are read again by the next update
+            shutil.rmtree(root / "session2")
+            _save_session(root, "session2", datetime(2021, 3, 5, tzinfo=timezone.utc), [])
+            assert catalog.update(root, n_workers=n_workers) == (1, 0, 2)
@@ -0,0 +1,42 @@
+import numpy as np
+
+from imctools.data import Channel
+from imctools.data.histogram import LOG_HISTOGRAM_ACCURACY, ChannelHistogram
+
+
+class TestChannelHistogram:
+    def test_from_image(self):
+        rng = np.random.default_rng(0)
+        img = rng.lognormal(3, 1, (100, 200)).astype(np.float32)
+        img[:5] = 0
+        histogram = ChannelHistogram.from_image(img)
+        assert histogram.count == img.size
+        assert histogram.bins.sum() == img.size
+        assert histogram.zero_count == 5 * 200
+        assert histogram.log_bins.sum() == img.size - histogram.zero_count
+        assert histogram.get_percentile(99) == round(float(np.percentile(img, 99)), 4)
+        assert histogram.get_contrast_limits(1, 99)[1] == histogram.get_percentile(99)
+
+    def test_merge(self):
+        rng = np.random.default_rng(1)
+        a = rng.lognormal(3, 1, (100, 100)).astype(np.float32)
+        b = rng.lognormal(4, 1, (50, 80)).astype(np.float32)
+        b[0] = 0
+        merged = ChannelHistogram.merge([ChannelHistogram.from_image(a), ChannelHistogram.from_image(b)])
+        full = ChannelHistogram.from_image(np.concatenate([a.ravel(), b.ravel()]))
+        assert merged.count == full.count
+        assert merged.bins.sum() == full.count
+        assert merged.log_offset == full.log_offset
+        assert np.array_equal(merged.log_bins, full.log_bins)
+        assert merged.zero_count == full.zero_count
+        for q in (25, 50, 95):
+            expected = full.get_percentile(q)
+            assert abs(merged.get_percentile(q) - expected) <= 2 * LOG_HISTOGRAM_ACCURACY * expected
+
+    def test_channel_state(self):
+        channel = Channel(1, 1, 0, "Ir191", histogram=ChannelHistogram.from_image(np.arange(100)))
+        restored = Channel.from_dict(channel.__getstate__())
+        assert restored.histogram.count == 100
+        assert np.array_equal(restored.histogram.bins, channel.histogram.bins)
+        assert restored.histogram.get_percentile(50) == channel.histogram.get_percentile(50)
+        assert "histogram" not in channel.get_csv_dict()
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from imctools.converters.hotfolder import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_RUNNING,
+    JobQueue,
+    watch_inbox_to_imcfolders,
+)
+from imctools.data import Session
+
+
+class TestJobQueue:
+    def test_job_lifecycle(self, tmp_path):
+        queue_path = tmp_path / 'queue.sqlite'
+        with JobQueue(queue_path) as queue:
+            assert queue.enqueue('inbox/a', 'fp1') is True
+            assert queue.enqueue('inbox/a', 'fp1') is False
+            job = queue.next_pending()
+            queue.start(job['id'])
+            assert queue.next_pending() is None
+            assert queue.fail(job['id'], 'error', 1.0, max_retries=1, retry_delay=0) == STATUS_PENDING
+            job = queue.next_pending()
+            queue.start(job['id'])
+            assert queue.fail(job['id'], 'error', 1.0, max_retries=1, retry_delay=0) == STATUS_FAILED
+            assert queue.next_pending() is None
+
+            assert queue.enqueue('inbox/a', 'fp2') is True
+            job = queue.next_pending()
+            queue.start(job['id'])
+
+        # Running jobs are resumed and finished jobs are not reprocessed after a restart
+        with JobQueue(queue_path) as queue:
+            assert queue.recover() == 1
+            job = queue.next_pending()
+            queue.start(job['id'])
+            queue.finish(job['id'], 2.5)
+            assert queue.enqueue('inbox/a', 'fp2') is False
+            jobs = queue.get_jobs(STATUS_DONE)
+            assert len(jobs) == 1
+            assert jobs[0]['attempts'] == 2
+            assert jobs[0]['duration'] == 2.5
+
+    def test_source_changed_while_running(self, tmp_path):
+        with JobQueue(tmp_path / "queue.sqlite") as queue:
+            queue.enqueue("inbox/a", "fp1")
+            job = queue.next_pending()
+            queue.start(job["id"])
+            assert queue.enqueue("inbox/a", "fp2") is True
+            # The running job is not dispatched again before it ends
+            assert queue.next_pending() is None
+            assert queue.finish(job["id"], 1.0) == STATUS_PENDING
+            job = queue.next_pending()
+            assert job["fingerprint"] == "fp2" and job["attempts"] == 0
+            queue.start(job["id"])
+            assert queue.finish(job["id"], 1.0) == STATUS_DONE
+
+
+def test_watch_inbox_to_imcfolders(tmp_path, write_mcd):
+    inbox = tmp_path / "inbox"
+    (inbox / "raw").mkdir(parents=True)
+    mcd_file = inbox / "raw" / "session.mcd"
+    write_mcd(mcd_file, 1)
+    output_folder = tmp_path / "output"
+    watcher = threading.Thread(
+        target=watch_inbox_to_imcfolders,
+        args=(inbox, output_folder),
+        kwargs={"n_workers": 1, "settle_time": 0, "interval": 0.01, "idle_timeout": 2},
+    )
+    watcher.start()
+    try:
+        # Grow the MCD file as soon as its first version is being (or has been) converted
+        while not (output_folder / ".imctools_queue.sqlite").exists():
+            time.sleep(0.01)
+        with JobQueue(output_folder / ".imctools_queue.sqlite") as queue:
+            while len(queue.get_jobs(STATUS_RUNNING)) + len(queue.get_jobs(STATUS_DONE)) == 0:
+                time.sleep(0.01)
+        write_mcd(mcd_file, 3)
+    finally:
+        watcher.join()
+
+    with JobQueue(output_folder / ".imctools_queue.sqlite") as queue:
+        jobs = queue.get_jobs()
+        assert [job["status"] for job in jobs] == [STATUS_DONE]
+    session = Session.load(output_folder / "session" / "session_session.json")
+    assert list(session.acquisitions.keys()) == [1, 2, 3]
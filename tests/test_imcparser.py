@@ -1,6 +1,15 @@
+import shutil
+import zipfile
 from pathlib import Path
 
+import numpy as np
+import pytest
+
+from imctools.converters import mcdfolder_to_imcfolder
+from imctools.data import Session
 from imctools.io.imc.imcparser import ImcParser
+from imctools.io.imc.imcwriter import compress_imc_folder
+from imctools.io.ometiff.ometiffparser import TiffFilePool
 
 
 class TestImcParser:
@@ -22,3 +31,52 @@ class TestImcParser:
         ac_data = parser.get_acquisition_data(1)
         img = ac_data.get_image_by_name('Ag107')
         assert img.shape == (60, 60)
+
+
+@pytest.fixture
+def imc_folder(tmp_path: Path, write_mcd):
+    (tmp_path / "raw").mkdir()
+    write_mcd(tmp_path / "raw" / "session.mcd", 2)
+    mcdfolder_to_imcfolder(tmp_path / "raw", tmp_path / "imc")
+    return tmp_path / "imc" / "session"
+
+
+class TestImcArchive:
+    @pytest.mark.parametrize("store_images", [True, False])
+    def test_read_imc_zip(self, tmp_path: Path, imc_folder: Path, store_images: bool):
+        compress_imc_folder(imc_folder, remove_folder=False, store_images=store_images)
+        archive = tmp_path / "archive_imc.zip"
+        shutil.move(str(imc_folder.parent / "session_imc.zip"), archive)
+        with zipfile.ZipFile(archive) as zf:
+            compress_type = zf.getinfo("session_s0_a1_ac.ome.tiff").compress_type
+        assert compress_type == (zipfile.ZIP_STORED if store_images else zipfile.ZIP_DEFLATED)
+
+        # Raw metadata is only read from the archive when accessed
+        session = Session.load("session_session.json", archive=archive)
+        expected_session = Session.load(imc_folder / "session_session.json")
+        assert session._metadata is None
+        assert session.metadata == expected_session.metadata
+        assert session.acquisitions[1].metadata == expected_session.acquisitions[1].metadata
+
+        with ImcParser(imc_folder) as expected_parser, ImcParser(archive) as parser:
+            assert parser.is_archive and not expected_parser.is_archive
+            assert parser.session.acquisitions[2].metadata == expected_session.acquisitions[2].metadata
+            assert parser.get_mcd_xml() == (imc_folder / "session_schema.xml").read_text()
+            assert parser.list_files("*_pano.*") == expected_parser.list_files("*_pano.*") == ["session_s0_p1_pano.png"]
+            assert parser.read_file("session_s0_p1_pano.png") == (imc_folder / "session_s0_p1_pano.png").read_bytes()
+            for acquisition_id in (1, 2):
+                expected = expected_parser.get_acquisition_data(acquisition_id).image_data
+                assert np.array_equal(parser.get_acquisition_data(acquisition_id).image_data, expected)
+                lazy_data = parser.get_acquisition_data(acquisition_id, lazy=True)
+                assert np.array_equal(lazy_data.get_image_by_name("Pr141"), expected[1])
+            assert len(parser._tiff_pool) > 0
+        assert len(parser._tiff_pool) == 0
+
+    def test_close_shared_tiff_pool(self, tmp_path: Path, imc_folder: Path):
+        compress_imc_folder(imc_folder, remove_folder=False)
+        tiff_pool = TiffFilePool()
+        with ImcParser(imc_folder.parent / "session_imc.zip", tiff_pool=tiff_pool) as parser:
+            parser.get_acquisition_data(1, lazy=True).get_image_by_name("Ir191")
+        # Files of a shared pool stay open for other parsers
+        assert len(tiff_pool) == 1
+        tiff_pool.close()
@@ -0,0 +1,23 @@
+from pathlib import Path
+
+from imctools.io.imc.imcwriter import ImcWriter
+from imctools.io.mcd.mcdparser import McdParser
+from imctools.io.utils import MANIFEST_JSON_SUFFIX, OME_TIFF_SUFFIX
+
+
+class TestImcWriter:
+    def test_resume_imc_folder(self, raw_path: Path, tmp_path: Path):
+        mcd_file_path = raw_path / '20210305_NE_mockData1' / '20210305_NE_mockData1.mcd'
+        with McdParser(mcd_file_path) as parser:
+            ImcWriter(tmp_path, parser).write_imc_folder(create_zip=False)
+        output_folder = tmp_path / '20210305_NE_mockData1'
+        assert (output_folder / ('20210305_NE_mockData1' + MANIFEST_JSON_SUFFIX)).exists()
+
+        ome_tiff_file = output_folder / ('20210305_NE_mockData1_s0_a1' + OME_TIFF_SUFFIX)
+        ome_tiff_file.unlink()
+        with McdParser(mcd_file_path) as parser:
+            ImcWriter(tmp_path, parser).write_imc_folder(create_zip=False)
+            # Intensities of skipped acquisitions are restored from the manifest
+            channel = next(iter(parser.session.acquisitions[2].channels.values()))
+            assert channel.max_intensity is not None
+        assert ome_tiff_file.exists()
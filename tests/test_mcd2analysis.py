@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import numpy as np
+import tifffile
+
+from imctools.converters import (
+    mcdfolder_to_analysisfolder,
+    mcdfolder_to_imcfolder,
+    omefolder_to_analysisfolder,
+    omefolder_to_histocatfolder,
+)
+
+
+def _read_files(folder: Path):
+    """Content of all TIFF and CSV files in a folder tree by relative path"""
+    result = dict()
+    for f in sorted(folder.rglob("*")):
+        if f.suffix == ".tiff":
+            result[str(f.relative_to(folder))] = tifffile.imread(str(f))
+        elif f.suffix == ".csv":
+            result[str(f.relative_to(folder))] = f.read_text()
+    return result
+
+
+class TestMcdFolderToAnalysisFolder:
+    def test_same_output_as_ometiff_pipeline(self, tmp_path: Path, write_mcd):
+        raw_folder = tmp_path / "raw"
+        raw_folder.mkdir()
+        write_mcd(raw_folder / "session.mcd", 2)
+        panel_csv_file = tmp_path / "panel.csv"
+        panel_csv_file.write_text("Metal Tag,ilastik,full\nAg107,0,1\nPr141,1,1\nIr191,1,1\n")
+        analysis_stacks = (("ilastik", "_ilastik"), ("full", "_full"))
+
+        mcdfolder_to_imcfolder(raw_folder, tmp_path / "imc")
+        omefolder_to_analysisfolder(
+            tmp_path / "imc", tmp_path / "analysis", panel_csv_file, analysis_stacks, n_workers=1
+        )
+        omefolder_to_histocatfolder(tmp_path / "imc" / "session", tmp_path / "histocat", n_workers=1)
+
+        mcdfolder_to_analysisfolder(
+            raw_folder,
+            tmp_path / "fused" / "analysis",
+            panel_csv_file,
+            analysis_stacks,
+            histocat_folder=tmp_path / "fused" / "histocat",
+            imc_folder=tmp_path / "fused" / "imc",
+        )
+
+        for folder in ("analysis", "histocat"):
+            expected = _read_files(tmp_path / folder)
+            result = _read_files(tmp_path / "fused" / folder)
+            assert len(expected) > 0 and list(result.keys()) == list(expected.keys())
+            for name, content in expected.items():
+                if isinstance(content, np.ndarray):
+                    assert result[name].dtype == content.dtype and np.array_equal(result[name], content), name
+                else:
+                    assert result[name] == content, name
+        assert (tmp_path / "fused" / "imc" / "session" / "session_session.json").exists()
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pytest
+
+from imctools.converters.mcdfolder2imcfolder import (
+    BatchConversionSummary,
+    follow_mcdfile_to_imcfolder,
+    mcdfolder_to_imcfolder,
+    merge_imcfolder_shards,
+    select_shard,
+)
+from imctools.data import Session
+
+
+class TestBatchConversionSummary:
+    def test_failed_acquisitions(self):
+        summary = BatchConversionSummary()
+        summary.add_failure("a.mcd", "acquisition 1: error")
+        summary.add_failure("a.mcd", "acquisition 2: error")
+        summary.add_failure("b.zip", "error")
+        assert summary.failed == {"a.mcd": ["acquisition 1: error", "acquisition 2: error"], "b.zip": ["error"]}
+        assert "failed files: 2" in str(summary)
+        assert "Failed: a.mcd (acquisition 2: error)" in str(summary)
+
+
+def test_select_shard():
+    sizes = {i: (i * 7919) % 100 for i in range(1, 21)}
+    shards = [select_shard(sizes, i, 3) for i in range(3)]
+    assert shards == [select_shard(dict(reversed(list(sizes.items()))), i, 3) for i in range(3)]
+    assert sorted(key for shard in shards for key in shard) == sorted(sizes.keys())
+    loads = [sum(sizes[key] for key in shard) for shard in shards]
+    assert max(loads) - min(loads) <= max(sizes.values())
+    with pytest.raises(ValueError):
+        select_shard(sizes, 3, 3)
+
+
+class TestMergeImcFolderShards:
+    def _convert(self, tmp_path: Path, write_mcd, shards):
+        raw_folder = tmp_path / "raw"
+        raw_folder.mkdir(exist_ok=True)
+        write_mcd(raw_folder / "session.mcd", 3)
+        for shard in shards:
+            mcdfolder_to_imcfolder(raw_folder, tmp_path / "sharded", shard=shard)
+        return raw_folder
+
+    def test_merge(self, tmp_path: Path, write_mcd):
+        raw_folder = self._convert(tmp_path, write_mcd, [(i, 2) for i in range(2)])
+        assert not (tmp_path / "sharded" / "session" / "session_session.json").exists()
+        merge_imcfolder_shards(tmp_path / "sharded")
+        assert len(list((tmp_path / "sharded" / "session").glob("*_shard*"))) == 0
+
+        mcdfolder_to_imcfolder(raw_folder, tmp_path / "unsharded")
+        expected = Session.load(tmp_path / "unsharded" / "session" / "session_session.json")
+        session = Session.load(tmp_path / "sharded" / "session" / "session_session.json")
+        assert list(session.acquisitions.keys()) == [1, 2, 3]
+        for acquisition in session.acquisitions.values():
+            expected_acquisition = expected.acquisitions[acquisition.id]
+            assert acquisition.is_valid
+            assert acquisition.channel_names == expected_acquisition.channel_names
+            for channel in acquisition.channels.values():
+                expected_channel = expected.channels[channel.id]
+                assert channel.min_intensity == expected_channel.min_intensity
+                assert channel.max_intensity == expected_channel.max_intensity
+                assert channel.histogram is not None
+                assert channel.histogram.__getstate__() == expected_channel.histogram.__getstate__()
+
+    def test_missing_shard(self, tmp_path: Path, write_mcd):
+        self._convert(tmp_path, write_mcd, [(0, 3), (2, 3)])
+        with pytest.raises(ValueError, match="Missing shards"):
+            merge_imcfolder_shards(tmp_path / "sharded")
+
+    def test_inconsistent_shards(self, tmp_path: Path, write_mcd):
+        self._convert(tmp_path, write_mcd, [(0, 2), (1, 2), (1, 3)])
+        with pytest.raises(ValueError, match="Inconsistent shard counts"):
+            merge_imcfolder_shards(tmp_path / "sharded")
+
+
+def test_follow_mcdfile_to_imcfolder(tmp_path: Path, write_mcd):
+    mcd_file = tmp_path / "session.mcd"
+    imc_folder = tmp_path / "output" / "session"
+    written = dict()
+    for n_acquisitions in (1, 2, 3):
+        write_mcd(mcd_file, n_acquisitions)
+        follow_mcdfile_to_imcfolder(mcd_file, tmp_path / "output", interval=0.01, idle_timeout=0.05)
+
+        session_file = imc_folder / "session_session.json"
+        session = Session.load(session_file)
+        assert list(session.acquisitions.keys()) == list(range(1, n_acquisitions + 1))
+        assert all(acquisition.is_valid for acquisition in session.acquisitions.values())
+        assert "ROI_" + str(n_acquisitions) in (imc_folder / "session_schema.xml").read_text()
+        # Acquisitions are written exactly once
+        ome_tiff_files = {f.name: f.stat().st_mtime_ns for f in imc_folder.glob("*.ome.tiff")}
+        assert len(ome_tiff_files) == n_acquisitions
+        assert all(ome_tiff_files[name] == mtime for name, mtime in written.items())
+        written = ome_tiff_files
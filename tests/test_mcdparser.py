@@ -1,7 +1,11 @@
+import os
+import shutil
 import pytest
 from pathlib import Path
 
-from imctools.io.mcd.mcdparser import McdParser
+import numpy as np
+
+from imctools.io.mcd.mcdparser import CHANNEL_CACHE_FOLDER, McdParser
 
 
 class TestMcdParser:
@@ -20,3 +24,57 @@ class TestMcdParser:
         assert ac_data.channel_names == ['Ag107', 'Pr141', 'Sm147', 'Eu153', 'Yb172']
         assert ac_data.channel_labels == ['107Ag', 'Cytoker_651((3356))Pr141', 'Laminin_681((851))Sm147', 'YBX1_2987((3532))Eu153', 'H3K27Ac_1977((2242))Yb172']
         assert ac_data.channel_masses == ['107', '141', '147', '153', '172']
+
+    def test_refresh_completed_acquisitions(self, raw_path: Path):
+        mcd_file_path = raw_path / '20210305_NE_mockData1' / '20210305_NE_mockData1.mcd'
+        with McdParser(mcd_file_path, follow=True) as parser:
+            assert parser.refresh() == [1, 2, 3]
+            assert parser.refresh() == []
+
+    def test_refresh_growing_file(self, tmp_path: Path, write_mcd):
+        mcd_file_path = tmp_path / 'session.mcd'
+        write_mcd(mcd_file_path, 1)
+        with McdParser(mcd_file_path, follow=True) as parser:
+            assert parser.refresh() == [1]
+            for n_acquisitions in (2, 3):
+                # New acquisition data is appended before the trailing MCD XML is rewritten
+                images = write_mcd(mcd_file_path, n_acquisitions)
+                with open(mcd_file_path, 'r+b') as f:
+                    f.truncate(mcd_file_path.stat().st_size - 100)
+                assert parser.refresh() == []
+                write_mcd(mcd_file_path, n_acquisitions)
+                assert parser.refresh() == [n_acquisitions]
+                assert list(parser.session.acquisitions.keys()) == list(range(1, n_acquisitions + 1))
+                ac_data = parser.get_acquisition_data(n_acquisitions)
+                assert np.array_equal(ac_data.image_data, images[n_acquisitions])
+            assert parser.refresh() == []
+
+    def test_channel_cache(self, raw_path: Path, tmp_path: Path):
+        mcd_file_path = tmp_path / '20210305_NE_mockData1.mcd'
+        shutil.copyfile(raw_path / '20210305_NE_mockData1' / '20210305_NE_mockData1.mcd', mcd_file_path)
+        cache_folder = tmp_path / 'cache'
+        with McdParser(mcd_file_path) as parser:
+            expected = parser._read_image_data(parser.session.acquisitions[1])
+        with McdParser(mcd_file_path, channel_cache=cache_folder) as parser:
+            image_data = parser.get_acquisition_data(1).image_data
+            cache_files = list(cache_folder.glob('*/*.npy'))
+            assert [f.name for f in cache_files] == ['20210305_NE_mockData1_s0_a1.npy']
+            assert isinstance(image_data, np.memmap) and not image_data.flags.writeable
+            assert np.array_equal(image_data, expected)
+            mtime = cache_files[0].stat().st_mtime_ns
+            assert np.array_equal(parser.get_acquisition_data(1, lazy=True).image_data, expected)
+            assert cache_files[0].stat().st_mtime_ns == mtime
+
+        os.utime(mcd_file_path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+        with McdParser(mcd_file_path, channel_cache=cache_folder) as parser:
+            assert np.array_equal(parser.get_acquisition_data(1).image_data, expected)
+        assert len(list(cache_folder.iterdir())) == 2
+
+    def test_unwritable_channel_cache(self, raw_path: Path, tmp_path: Path):
+        mcd_file_path = raw_path / '20210305_NE_mockData1' / '20210305_NE_mockData1.mcd'
+        (tmp_path / 'file').touch()
+        with McdParser(mcd_file_path, channel_cache=tmp_path / 'file' / 'cache') as parser:
+            image_data = parser.get_acquisition_data(1).image_data
+            assert image_data.shape == (5, 60, 60) and not isinstance(image_data, np.memmap)
+        with McdParser(None, file_handle=open(mcd_file_path, 'rb'), channel_cache=True) as parser:
+            assert parser._channel_cache_dir == mcd_file_path.parent / CHANNEL_CACHE_FOLDER
@@ -0,0 +1,85 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import tifffile
+
+from imctools.converters import mcdfolder_to_imcfolder
+from imctools.data.acquisitiondata import measure_acquisitions
+from imctools.data.measurements import measure_objects
+from imctools.io.imc.imcparser import ImcParser
+
+
+class TestMeasurements:
+    def test_measure_objects(self):
+        rng = np.random.default_rng(0)
+        image_data = rng.random((2, 30, 20)).astype(np.float32)
+        mask = rng.integers(0, 10, (30, 20))
+        mask[mask == 4] = 0
+        stats = ("mean", "sum", "min", "max", "std")
+        table = measure_objects(image_data, mask, ["a", "b"], stats=stats)
+        assert table["object"].tolist() == [1, 2, 3, 5, 6, 7, 8, 9]
+        for row in table.itertuples():
+            object_mask = mask == row.object
+            ys, xs = np.nonzero(object_mask)
+            assert row.area == len(ys)
+            assert row.centroid_y == pytest.approx(ys.mean()) and row.centroid_x == pytest.approx(xs.mean())
+            assert row.mean_b == pytest.approx(image_data[1][object_mask].mean())
+            assert row.sum_a == pytest.approx(image_data[0][object_mask].sum(), rel=1e-6)
+            assert row.min_a == image_data[0][object_mask].min() and row.max_b == image_data[1][object_mask].max()
+            assert row.std_a == pytest.approx(image_data[0][object_mask].std(), rel=1e-5)
+        chunked = measure_objects(image_data, mask, ["b"], channel_indices=[1], stats=stats, chunk_rows=7)
+        assert np.allclose(chunked["max_b"], table["max_b"]) and np.allclose(chunked["mean_b"], table["mean_b"])
+        with pytest.raises(ValueError):
+            measure_objects(image_data, mask[:10], ["a", "b"])
+
+
+class TestAcquisitionMeasurements:
+    @pytest.fixture
+    def imc_folder(self, tmp_path: Path, write_mcd):
+        (tmp_path / "raw").mkdir()
+        write_mcd(tmp_path / "raw" / "session.mcd", 2)
+        mcdfolder_to_imcfolder(tmp_path / "raw", tmp_path / "imc")
+        return tmp_path / "imc" / "session"
+
+    @staticmethod
+    def _create_mask(shape, seed: int):
+        mask = np.random.default_rng(seed).integers(0, 6, shape).astype(np.uint16)
+        mask[0] = 0
+        return mask
+
+    def test_measure_lazy_acquisition(self, tmp_path: Path, imc_folder: Path):
+        stats = ("mean", "min", "max", "std")
+        with ImcParser(imc_folder) as parser:
+            acquisition_data = parser.get_acquisition_data(1, lazy=True)
+            image_data = parser.get_acquisition_data(1).image_data
+            mask = self._create_mask(image_data.shape[1:], 0)
+            tifffile.imwrite(str(tmp_path / "session_s0_a1_ac_mask.tiff"), mask[np.newaxis])
+
+            table = acquisition_data.measure_objects(mask, channels=["Ir191", "Pr141"], stats=stats, chunk_rows=3)
+            assert acquisition_data._image_data is None
+            expected = measure_objects(image_data, mask, ["Ir191", "Pr141"], [2, 1], stats=stats)
+            pd.testing.assert_frame_equal(table, expected)
+            table = acquisition_data.measure_objects(tmp_path / "session_s0_a1_ac_mask.tiff", stats=stats)
+            expected = measure_objects(image_data, mask, ["Ag107", "Pr141", "Ir191"], stats=stats)
+            pd.testing.assert_frame_equal(table, expected)
+
+    def test_measure_acquisitions(self, tmp_path: Path, imc_folder: Path):
+        with ImcParser(imc_folder) as parser:
+            acquisitions = [parser.get_acquisition_data(i, lazy=True) for i in (1, 2)]
+            shapes = [(a.acquisition.max_y, a.acquisition.max_x) for a in acquisitions]
+            masks = [self._create_mask(shape, i) for i, shape in enumerate(shapes)]
+            tifffile.imwrite(str(tmp_path / "mask.tiff"), masks[1])
+            table = measure_acquisitions(
+                acquisitions, [masks[0], tmp_path / "mask.tiff"], channels=["Pr141"], n_workers=2
+            )
+            expected = []
+            for acquisition_data, mask in zip(acquisitions, masks):
+                expected_table = acquisition_data.measure_objects(mask, channels=["Pr141"])
+                expected_table.insert(0, "acquisition_id", acquisition_data.acquisition.id)
+                expected.append(expected_table)
+        assert table["acquisition_id"].unique().tolist() == [1, 2]
+        pd.testing.assert_frame_equal(table, pd.concat(expected, ignore_index=True))
+        with pytest.raises(ValueError):
+            measure_acquisitions(acquisitions, masks[:1])
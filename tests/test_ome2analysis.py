@@ -0,0 +1,40 @@
+from pathlib import Path
+
+import numpy as np
+import tifffile
+
+from imctools.converters import mcdfolder_to_imcfolder, omefile_2_analysisfolder, omefolder_to_analysisfolder
+
+
+class TestOmeFolderToAnalysisFolder:
+    def test_stacks_from_single_read(self, tmp_path: Path, write_mcd):
+        (tmp_path / "raw").mkdir()
+        write_mcd(tmp_path / "raw" / "session.mcd", 2)
+        mcdfolder_to_imcfolder(tmp_path / "raw", tmp_path / "imc")
+        panel_csv_file = tmp_path / "panel.csv"
+        panel_csv_file.write_text("Metal Tag,ilastik,full,nuclei\nIr191,1,1,1\nAg107,0,1,0\nPr141,1,1,0\n")
+        analysis_stacks = [("ilastik", "_ilastik"), ("full", "_full"), ("nuclei", "_nuclei")]
+
+        omefolder_to_analysisfolder(
+            tmp_path / "imc", tmp_path / "analysis", panel_csv_file, analysis_stacks, n_workers=2
+        )
+
+        # Stacks written one at a time, reading the OME-TIFF file for each of them
+        ome_tiff_files = sorted((tmp_path / "imc" / "session").glob("*.ome.tiff"))
+        assert len(ome_tiff_files) == 2
+        for ome_tiff_file in ome_tiff_files:
+            for column, suffix in analysis_stacks:
+                basename = ome_tiff_file.name[: -len(".ome.tiff")] + suffix
+                omefile_2_analysisfolder(
+                    ome_tiff_file, tmp_path / "expected", basename, panel_csv_file, usedcolumn=column, dtype=np.uint16
+                )
+
+        expected_files = sorted(f.name for f in (tmp_path / "expected").iterdir())
+        assert sorted(f.name for f in (tmp_path / "analysis").iterdir()) == expected_files
+        for name in expected_files:
+            if name.endswith(".tiff"):
+                expected = tifffile.imread(str(tmp_path / "expected" / name))
+                result = tifffile.imread(str(tmp_path / "analysis" / name))
+                assert result.dtype == expected.dtype and np.array_equal(result, expected)
+            else:
+                assert (tmp_path / "analysis" / name).read_text() == (tmp_path / "expected" / name).read_text()
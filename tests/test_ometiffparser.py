@@ -1,7 +1,11 @@
 import pytest
+import zipfile
 from pathlib import Path
 
-from imctools.io.ometiff.ometiffparser import OmeTiffParser
+import numpy as np
+import tifffile
+
+from imctools.io.ometiff.ometiffparser import OmeTiffImageSource, OmeTiffParser, TiffFilePool, read_tiff_data
 
 
 class TestOmeTiffParser:
@@ -20,3 +24,39 @@ class TestOmeTiffParser:
         assert ac_data.channel_names == ['Ag107', 'Pr141', 'Sm147', 'Eu153', 'Yb172']
         assert ac_data.channel_labels == ['107Ag', 'Cytoker_651((3356))Pr141', 'Laminin_681((851))Sm147', 'YBX1_2987((3532))Eu153', 'H3K27Ac_1977((2242))Yb172']
         assert ac_data.channel_masses == ['107', '141', '147', '153', '172']
+
+
+class TestOmeTiffImageSource:
+    def test_read_uncompressed_and_compressed(self, tmp_path: Path):
+        data = np.random.default_rng(0).random((3, 20, 30)).astype(np.float32)
+        tifffile.imwrite(tmp_path / "plain.tiff", data, photometric="minisblack")
+        tifffile.imwrite(tmp_path / "zlib.tiff", data, photometric="minisblack", compression="zlib")
+
+        pool = TiffFilePool(max_files=1)
+        plain = OmeTiffImageSource(tmp_path / "plain.tiff", pool)
+        compressed = OmeTiffImageSource(tmp_path / "zlib.tiff", pool)
+        assert np.array_equal(plain[[0, 2], 5:10], data[[0, 2], 5:10])
+        assert np.array_equal(compressed[[1], :, 3:7], data[[1], :, 3:7])
+        assert len(pool) == 1
+
+        with pool.open(tmp_path / "plain.tiff") as tif:
+            image_data = read_tiff_data(tif)
+        assert isinstance(image_data, np.memmap) and not image_data.flags.writeable
+        with pool.open(tmp_path / "zlib.tiff") as tif:
+            assert not isinstance(read_tiff_data(tif), np.memmap)
+        pool.close()
+        assert len(pool) == 0
+
+    def test_read_from_zip_archive(self, tmp_path: Path):
+        data = np.random.default_rng(0).random((3, 20, 30)).astype(np.float32)
+        tifffile.imwrite(tmp_path / "image.tiff", data, photometric="minisblack")
+        with zipfile.ZipFile(tmp_path / "images.zip", "w") as zf:
+            zf.writestr("readme.txt", "padding before the images")
+            zf.write(tmp_path / "image.tiff", "stored.tiff", compress_type=zipfile.ZIP_STORED)
+            zf.write(tmp_path / "image.tiff", "deflated.tiff", compress_type=zipfile.ZIP_DEFLATED)
+
+        stored = OmeTiffImageSource(tmp_path / "images.zip", member="stored.tiff")
+        deflated = OmeTiffImageSource(tmp_path / "images.zip", member="deflated.tiff")
+        assert isinstance(stored._memmap, np.memmap) and deflated._memmap is None
+        assert np.array_equal(stored[[0, 2], 5:10], data[[0, 2], 5:10])
+        assert np.array_equal(deflated[[2, 1], :, 3:7], data[[2, 1], :, 3:7])
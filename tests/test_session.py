@@ -1,6 +1,11 @@
+import copy
+import pickle
+from datetime import datetime
 from pathlib import Path
 
-from imctools.data import Session
+import pytest
+
+from imctools.data import Acquisition, Channel, Panorama, Session, Slide
 
 
 class TestSession:
@@ -13,3 +18,54 @@ class TestSession:
         assert list(session.slides.keys()) == [0]
         assert list(session.acquisitions.keys()) == [1, 2, 3]
         assert list(session.panoramas.keys()) == [1, 2]
+
+    def test_save_compact_session(self, analysis_ometiff_path: Path, tmp_path: Path):
+        session_file_path = analysis_ometiff_path / '20210305_NE_mockData1' / '20210305_NE_mockData1_session.json'
+        session = Session.load(session_file_path)
+        session.save(tmp_path / 'test_session.json')
+        assert (tmp_path / 'test_session_metadata.json').exists()
+        compact_session = Session.load(tmp_path / 'test_session.json')
+        assert compact_session.id == session.id
+        assert list(compact_session.channels.keys()) == list(session.channels.keys())
+        assert compact_session.metadata == session.metadata
+        for acquisition in compact_session.acquisitions.values():
+            assert acquisition.metadata == session.acquisitions[acquisition.id].metadata
+            assert acquisition.start_timestamp == session.acquisitions[acquisition.id].start_timestamp
+
+    @pytest.mark.parametrize("copy_function", [lambda x: pickle.loads(pickle.dumps(x)), copy.copy, copy.deepcopy])
+    def test_copy_session(self, copy_function):
+        session = Session("id", "session", "2.1", datetime(2021, 3, 5, 12, 0), metadata={"MCDSchema": {}})
+        slide = Slide(session.id, 0, metadata={"Description": "Slide"})
+        slide.session = session
+        session.slides[slide.id] = slide
+        acquisition = Acquisition(slide.id, 1, "mcd", "test.mcd", 10, 10, metadata={"Description": "ROI 1"})
+        acquisition.slide = slide
+        slide.acquisitions[acquisition.id] = acquisition
+        session.acquisitions[acquisition.id] = acquisition
+        for i, name in enumerate(["Ir191", "Pr141"]):
+            channel = Channel(acquisition.id, i, i, name, metadata={"Name": name})
+            channel.acquisition = acquisition
+            acquisition.channels[channel.id] = channel
+            session.channels[channel.id] = channel
+
+        result = copy_function(session)
+        assert result.created == session.created and result.metadata == session.metadata
+        result_acquisition = result.acquisitions[1]
+        assert result_acquisition.slide is result.slides[0] and result.slides[0].session is result
+        assert result_acquisition.metadata == {"Description": "ROI 1"}
+        assert result_acquisition.channel_names == ["Ir191", "Pr141"]
+        assert result.channels[1].acquisition is result_acquisition
+        assert result.channels[1].metadata == {"Name": "Pr141"}
+
+    def test_missing_entity_metadata(self):
+        session = Session("id", "session", "2.1", datetime(2021, 3, 5, 12, 0), metadata={"MCDSchema": {}})
+        slide = Slide(session.id, 0)
+        slide.session = session
+        panorama = Panorama(slide.id, 1, "Imported", "Panorama", 0, 1, 1, 1, 1, 0, 0, 0, 0)
+        panorama.slide = slide
+        acquisition = Acquisition(slide.id, 1, "mcd", "test.mcd", 10, 10)
+        acquisition.slide = slide
+        channel = Channel(acquisition.id, 1, 0, "Ir191")
+        channel.acquisition = acquisition
+        for entity in (slide, panorama, acquisition, channel):
+            assert entity.metadata == dict()
@@ -0,0 +1,37 @@
+from imctools.data import Acquisition, Panorama, Slide
+
+
+def _add_acquisition(slide: Slide, id: int, x: float, y: float, size: float):
+    acquisition = Acquisition(
+        slide.id,
+        id,
+        "mcd",
+        "test.mcd",
+        10,
+        10,
+        roi_start_x_pos_um=x,
+        roi_start_y_pos_um=y + size,
+        roi_end_x_pos_um=x + size,
+        roi_end_y_pos_um=y,
+    )
+    acquisition.slide = slide
+    slide.acquisitions[acquisition.id] = acquisition
+
+
+class TestSpatialIndex:
+    def test_slide_queries(self):
+        slide = Slide("session", 0)
+        _add_acquisition(slide, 1, 1000, 1000, 500)
+        _add_acquisition(slide, 2, 5000, 1000, 500)
+        _add_acquisition(slide, 3, 20000, 10000, 1000)
+        slide.panoramas[1] = Panorama(0, 1, "Imported", "Panorama", 4000, 0, 8000, 0, 8000, 3000, 4000, 3000, 0)
+
+        assert [a.id for a in slide.find_intersecting(1200, 1200, 1300, 1300)] == [1]
+        intersecting = slide.find_intersecting(5200, 1200, 5300, 1300)
+        assert [type(e).__name__ for e in intersecting] == ["Acquisition", "Panorama"]
+        assert slide.find_intersecting(10000, 5000, 11000, 6000) == []
+        nearest = slide.find_nearest(19000, 9000, k=2)
+        assert [(type(e).__name__, e.id) for e in nearest] == [("Acquisition", 3), ("Panorama", 1)]
+
+        _add_acquisition(slide, 4, 10000, 5000, 500)
+        assert [a.id for a in slide.find_intersecting(10000, 5000, 11000, 6000)] == [4]
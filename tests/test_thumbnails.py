@@ -0,0 +1,43 @@
+import imagecodecs
+import numpy as np
+
+from imctools.data import Acquisition, Channel
+from imctools.io.thumbnails import (
+    ThumbnailSettings,
+    get_thumbnail_binning,
+    normalize_image,
+    render_acquisition_thumbnails,
+    save_image_thumbnail,
+)
+
+
+class TestThumbnails:
+    def test_normalize_image(self):
+        img = np.arange(101, dtype=np.float32)
+        result = normalize_image(img, 10, 90)
+        assert result.dtype == np.uint8
+        assert result[10] == 0 and result[90] == 255
+        assert normalize_image(np.zeros((2, 2))).max() == 0
+
+    def test_render_acquisition_thumbnails(self):
+        acquisition = Acquisition(0, 1, "mcd", "test.mcd", 4, 3)
+        for i, (name, label) in enumerate([("Pr141", "CD45_Pr141"), ("Ir191", "DNA_Ir191")]):
+            channel = Channel(acquisition.id, i + 1, i, name, label)
+            channel.acquisition = acquisition
+            acquisition.channels[channel.id] = channel
+        image_stack = np.random.default_rng(0).random((2, 3, 4)).astype(np.float32)
+        settings = ThumbnailSettings(composites={"rgb": ("CD45_Pr141", None, "Ir191")})
+        thumbnails = render_acquisition_thumbnails(acquisition, image_stack, settings)
+        assert thumbnails[""].shape == (3, 4)
+        assert thumbnails["rgb"].shape == (3, 4, 3)
+        assert np.array_equal(thumbnails["rgb"][..., 0], normalize_image(image_stack[0]))
+        assert thumbnails["rgb"][..., 1].max() == 0
+        assert np.array_equal(thumbnails["rgb"][..., 2], normalize_image(image_stack[1]))
+
+    def test_save_image_thumbnail(self, tmp_path):
+        img = np.random.default_rng(0).integers(0, 255, (300, 500, 3), dtype=np.uint8)
+        filepath = tmp_path / "pano_thumbnail.png"
+        assert save_image_thumbnail(imagecodecs.png_encode(img), filepath, size=100)
+        assert imagecodecs.imread(str(filepath)).shape == (60, 100, 3)
+        assert get_thumbnail_binning(300, 500, 100) == 5
+        assert not save_image_thumbnail(b"not an image", tmp_path / "invalid_thumbnail.png")
@@ -0,0 +1,31 @@
+import numpy as np
+
+from imctools.io.tileserver import TileCache, _downscale
+
+
+class TestTileServer:
+    def test_memory_tile_cache(self):
+        cache = TileCache(max_bytes=10)
+        cache.put("a", b"12345")
+        cache.put("b", b"12345")
+        assert cache.get("a") == b"12345"
+        cache.put("c", b"12345")
+        assert cache.get("b") is None
+        assert cache.get("a") == b"12345" and cache.get("c") == b"12345"
+
+    def test_disk_tile_cache(self, tmp_path):
+        cache = TileCache(max_bytes=10, folder=tmp_path)
+        cache.put("a", b"12345")
+        cache.put("b", b"12345")
+        cache.put("c", b"12345")
+        assert cache.get("a") is None
+        assert sorted(f.name for f in tmp_path.iterdir()) == ["b.png", "c.png"]
+        reopened = TileCache(max_bytes=10, folder=tmp_path)
+        assert len(reopened) == 2 and reopened.get("c") == b"12345"
+
+    def test_downscale(self):
+        img = np.arange(15, dtype=np.uint8).reshape(3, 5)
+        result = _downscale(img, 2)
+        assert result.shape == (2, 3)
+        assert result[0, 0] == 3 and result[1, 2] == 14
+        assert _downscale(np.zeros((4, 4, 3), dtype=np.uint8), 4).shape == (1, 1, 3)
@@ -1,6 +1,6 @@
 import numpy as np
 
-from imctools.io.utils import reshape_long_2_cyx
+from imctools.io.utils import atomic_output, link_or_copy_file, reshape_long_2_cyx
 
 
 def test_reshape_long_2_cxy(nrow=10, ncol=20):
@@ -19,3 +19,31 @@ def test_reshape_long_2_cxy(nrow=10, ncol=20):
                                   np.asarray([[float(i * ncol + j) for j in range(ncol)] for i in range(nrow)]))
     np.testing.assert_array_equal(np.asarray(img[3]),
                                   np.asarray([[float(1) for j in range(ncol)] for i in range(nrow)]))
+
+
+def test_atomic_output(tmp_path):
+    """Tests that failed writes leave no partial output behind"""
+    filepath = tmp_path / 'test.txt'
+    with atomic_output(filepath) as tmp_filepath:
+        assert tmp_filepath.name == filepath.name
+        tmp_filepath.write_text('content')
+    assert filepath.read_text() == 'content'
+
+    try:
+        with atomic_output(filepath) as tmp_filepath:
+            tmp_filepath.write_text('partial')
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+    assert filepath.read_text() == 'content'
+    assert list(tmp_path.iterdir()) == [filepath]
+
+
+def test_link_or_copy_file(tmp_path):
+    """Tests that linked/copied files have the source content and replace existing files"""
+    src = tmp_path / 'src.txt'
+    src.write_text('content')
+    dst = tmp_path / 'dst.txt'
+    dst.write_text('old')
+    assert link_or_copy_file(src, dst) in ('hardlink', 'reflink', 'copy')
+    assert dst.read_text() == 'content'
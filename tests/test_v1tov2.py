@@ -0,0 +1,79 @@
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+import tifffile
+
+from imctools.converters import mcdfolder_to_imcfolder, v1_to_v2
+from imctools.converters.v1tov2 import _get_intensity_ranges
+from imctools.data import Session
+from imctools.io.ometiff.ometiffparser import OmeTiffParser
+
+
+@pytest.fixture
+def v1_folder(tmp_path: Path, write_mcd):
+    """IMC v1 folder (acquisition file names with panorama and ROI IDs), created from a converted IMC folder"""
+    (tmp_path / "raw").mkdir()
+    write_mcd(tmp_path / "raw" / "session.mcd", 2)
+    mcdfolder_to_imcfolder(tmp_path / "raw", tmp_path / "imc")
+    v1_folder = tmp_path / "v1"
+    v1_folder.mkdir()
+    for f in (tmp_path / "imc" / "session").iterdir():
+        if f.name.endswith(("_schema.xml", "_pano.png")):
+            shutil.copy2(f, v1_folder / f.name)
+        elif f.name.endswith("_ac.ome.tiff"):
+            shutil.copy2(f, v1_folder / re.sub(r"_a(\d+)_ac", r"_p1_r\1_a\1_ac", f.name))
+    return v1_folder
+
+
+def _read_files(folder: Path):
+    """Content of transferred files by file name (without the session files created by the conversion)"""
+    session_suffixes = ("_session.json", "_session_metadata.json")
+    return {f.name: f.read_bytes() for f in folder.iterdir() if not f.name.endswith(session_suffixes)}
+
+
+class TestV1ToV2:
+    def test_transfer_modes(self, tmp_path: Path, v1_folder: Path):
+        v1_files = _read_files(v1_folder)
+        v1_to_v2(v1_folder, tmp_path / "copy", n_workers=1)
+        expected = _read_files(tmp_path / "copy")
+        assert sorted(expected.keys()) == [
+            "session_s0_a1_ac.ome.tiff",
+            "session_s0_a2_ac.ome.tiff",
+            "session_s0_p1_pano.png",
+            "session_schema.xml",
+        ]
+        assert _read_files(v1_folder) == v1_files
+
+        v1_to_v2(v1_folder, tmp_path / "link", transfer_mode="link", n_workers=1)
+        assert _read_files(tmp_path / "link") == expected
+        assert _read_files(v1_folder) == v1_files
+
+        v1_to_v2(v1_folder, tmp_path / "move", transfer_mode="move", n_workers=1)
+        assert _read_files(tmp_path / "move") == expected
+        assert len(list(v1_folder.iterdir())) == 0
+        expected_session = Session.load(tmp_path / "copy" / "session_session.json")
+        session = Session.load(tmp_path / "move" / "session_session.json")
+        for channel in session.channels.values():
+            assert channel.min_intensity == expected_session.channels[channel.id].min_intensity
+            assert channel.max_intensity == expected_session.channels[channel.id].max_intensity
+
+    def test_streamed_intensity_ranges(self, tmp_path: Path, v1_folder: Path):
+        expected = dict()
+        for f in v1_folder.glob("*.ome.tiff"):
+            acquisition_id, intensity_ranges = _get_intensity_ranges(f)
+            assert acquisition_id == OmeTiffParser.extract_acquisition_id(f)
+            stack = tifffile.imread(str(f))
+            channel_names = OmeTiffParser(f).get_acquisition_data().channel_names
+            assert list(intensity_ranges.keys()) == channel_names
+            for i, name in enumerate(channel_names):
+                assert intensity_ranges[name] == (round(float(np.min(stack[i])), 4), round(float(np.max(stack[i])), 4))
+            expected[acquisition_id] = intensity_ranges
+
+        v1_to_v2(v1_folder, tmp_path / "v2", n_workers=2)
+        session = Session.load(tmp_path / "v2" / "session_session.json")
+        for acquisition in session.acquisitions.values():
+            intensity_ranges = {c.name: (c.min_intensity, c.max_intensity) for c in acquisition.channels.values()}
+            assert {name: intensity_ranges[name] for name in expected[acquisition.id]} == expected[acquisition.id]